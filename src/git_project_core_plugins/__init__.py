@@ -76,6 +76,11 @@ commands.
 
   Run a pre-configured commandm, passing ``<args>`` to it.
 
+* ``git <project> server start``
+
+  Keep git-project loaded in a background process so that commands run through
+  ``git-project-client`` start quickly.
+
 * ``git <project> worktree``
 
   Create and manage worktrees for the project.  This plugin gives ``git
@@ -366,10 +371,30 @@ Summary:
   git <project> add run <name> <command>
   git <project> run --make-alias <name>
   git <project> run <name>
+  git <project> run [--jobs N] <name> <name>...
+  git <project> run --incremental <name>
+  git <project> run --cache <name>
+  git <project> run --all-worktrees [--jobs N] <name>
+  git <project> run --stats <name>
+  git <project> run --perf-log <name> [<range>]
+  git <project> run --bench [--warmup W] [--runs N] [--worktree NAME]... <name>...
+  git <project> run --log <file> --tail N <name>
+  git <project> run --profile <name>
+  git <project> run --watch <name>
+  git <project> run --matrix <name> -- <value>,<value> x <value>,<value>
 
 Full shell substitution is supported, as well as config {key} substitution,
 where the text ``{key}`` is replaced by key's value.
 
+A command that contains no shell syntax (no quotes, variables, globs,
+redirections, pipes or the like) and names a program on the PATH is executed
+directly rather than through the shell, which saves starting a shell for
+short commands that run often.  To always use the shell, for example for a
+command that relies on the shell's startup files, set the run's
+``shell`` key:
+
+  git <project> config build.lint.shell true
+
 The add run command associates a command string with a name.  The run
 command itself invokes the command string via a shell.  With --make-alias,
 the run comand instead registers an alternative name for ``run.``  For
@@ -415,21 +440,219 @@ nested inside the project may override the global project config key value.
 For example the worktree plugin adds a ``worktree`` scope.  The worktree may
 contain key values that override similar keys in the project config.
 
+Several names may be given to run more than one command:
+
+  git <project> build --jobs 3 debug release check
+
+Leading arguments that name registered commands are all run, the rest are
+passed as options to each of them.  With --jobs N, up to N commands run at
+once and each line of output is prefixed with the name of the command that
+produced it.  The exit status is that of the first command (in command-line
+order) that failed, or zero if all succeeded.  Without --jobs, commands run
+one after another, stopping at the first failure.
+
+A run may depend on other runs via its ``depends`` key, which holds either
+a run name of the same alias or <alias>.<name>:
+
+  git <project> config --add build.check.depends build.release
+  git <project> config --add build.release.depends configure.release
+  git <project> build --jobs 4 check
+
+Invoking a run first runs everything it depends on, directly or
+indirectly.  Runs whose dependencies have completed are started together,
+up to the --jobs limit, and a run is not started if anything it depends on
+failed.  Dependency cycles are reported before anything runs.  When all is
+done, the chain of dependent runs that took the longest (the critical path)
+is printed.  Without --jobs, a graph of runs is run as with --jobs auto if
+any of its runs could run at the same time, and one run at a time
+otherwise.
+
+With --jobs auto, the number of commands run at once follows the machine.
+At most as many run as there are CPUs this process may be scheduled on,
+further limited by any CPU quota of its cgroup.  Before each command
+starts, the load average left by other processes is subtracted from that,
+and no command starts while the kernel reports memory pressure above 10%.
+One command is always allowed to run so that work never stalls.
+
+With --matrix, the options after the run names describe a set of
+combinations rather than a single set of options.  Values separated by
+commas form a group, groups are separated by ``x`` and the run is executed
+once for each combination of one value from each group:
+
+  git <project> build --matrix release -- asan,ubsan x clang,gcc
+
+runs release four times, with options ``asan clang``, ``asan gcc``, ``ubsan
+clang`` and ``ubsan gcc``.  Each combination gets its own {options},
+{option_names} and {option_key}, so a builddir such as
+{path}/build{option_keysep}{option_key} is distinct for each.  Runs are
+named <name>:<option_key> in output and everything a run depends on is run
+once per combination.  Unless --jobs is given, combinations run as with
+--jobs auto.
+
+With --incremental, a run is skipped if nothing it could depend on has
+changed since it last succeeded in the current worktree.  A run's
+fingerprint covers the tree of HEAD, the names and timestamps of all
+modified and untracked files and the fully-substituted command.  Fingerprints
+are recorded in the project's state directory, separately for each
+worktree, each time a run succeeds.  A run that depends on another run
+which was not skipped is never skipped.
+
+With --cache, the outputs of a run are kept in a cache shared by all
+worktrees.  A run's outputs are the artifacts registered for it:
+
+  git <project> artifact add build.release "{builddir}"
+
+When the workarea is clean and the cache holds outputs produced from the
+same tree by the same command, they are copied into place instead of
+running the command.  Paths under the worktree and the output paths
+themselves are ignored when comparing commands, so a new worktree of an
+already-built commit gets its outputs from the cache on its first run.  The
+cache is limited to the size in the project's ``outputcachesize`` key
+(10G by default), evicting the least-recently-used outputs first.
+
+With --all-worktrees, the command runs in each registered worktree.  Each
+worktree's command is substituted with that worktree's scope, so {path},
+{worktree}, {branch} and any keys the worktree overrides refer to it, and
+runs with the worktree as its current directory.  Up to --jobs worktrees
+run at once.  A failure in one worktree does not stop the others.  A table
+of each worktree's exit status and run time is printed at the end.
+
+Every run that executes is recorded in a history file in the project's
+state directory (under the git common directory, not in the git config):
+its wall time, user and system CPU time, peak memory, exit status,
+worktree and commit.  With --stats, the run is not executed; instead the
+percentiles of its recorded times and memory, the trend of recent runs
+against earlier ones and its latest runs are shown:
+
+  git <project> build --stats all
+
+A run's peak memory counts the memory of git-project itself, which the run
+inherits before it starts its command, so the memory line also shows that
+floor.  A peak at or below the floor says nothing about the run.
+
+A run whose ``track`` key is true also records its measurements with the
+commit it ran on, in git notes under refs/notes/<project>/perf.  Each time
+it succeeds, its wall time is added to the note of the commit at HEAD,
+along with any metrics the command printed as lines of the form:
+
+  git-project-metric: <name>=<number>
+
+Runs in a workarea with uncommitted changes are marked as dirty.  Because
+the notes are an ordinary ref, they can be pushed and fetched to share
+measurements.  A tracked run's output is read through a pipe to find its
+metrics.  With --perf-log, the run is not executed; instead its median
+wall time and metrics for each commit in a revision range (the latest 50
+commits by default) are tabulated, oldest first, with the change from the
+median of the commits before it.  A commit where the run became slower by
+more than the project's ``perfthreshold`` key (10 percent by default) is
+flagged as a regression:
+
+  git <project> config build.all.track true
+  git <project> build --perf-log all v1.0..HEAD
+
+With --bench, the run's substituted command is timed instead of run once.
+It is run W times (--warmup, zero by default) to warm caches and then N
+times (--runs, ten by default) with its output discarded.  The mean,
+standard deviation, median, minimum and maximum wall and CPU times are
+printed, along with any runs far slower or faster than the rest, which
+usually means something else was using the machine.  Several names are
+timed one after the other and compared with the fastest; anything they
+depend on is not run.  With --worktree, the command is substituted for and
+timed in each named worktree, comparing the same run across worktrees:
+
+  git <project> build --bench --runs 5 debug release
+  git <project> build --bench --worktree main --worktree topic check
+
+With --profile, each run's command is wrapped in its ``profiler`` key, or
+the project's if the run has none, in which {cmd} is replaced by the
+command.  Counters the profiler prints in the format of perf stat -x or
+/usr/bin/time -v are stored in the run's history record, and --stats shows
+their medians, so that runs can be compared across worktrees and over time:
+
+  git <project> config profiler "perf stat -x, {cmd}"
+  git <project> config build.all.profiler "/usr/bin/time -v {cmd}"
+  git <project> build --profile all
+
+With --log FILE, each run's output is copied to FILE as it streams to the
+terminal.  When FILE grows beyond the project's ``logsize`` key (100M by
+default) it is renamed to FILE.1, older logs shift to FILE.2 and FILE.3,
+and a new FILE is started.  With --tail N, the last N lines of each run's
+output are kept and, if the run fails, printed after it and saved in its
+history record:
+
+  git <project> build --log build.log --tail 50 all
+
+With --watch, the run is started and then started again each time files
+in the current worktree change, until interrupted.  Changes are noticed via
+inotify where available and by polling file timestamps otherwise.  Files
+that git ignores, such as build directories, and the --log file do not
+count as changes.  Changes arriving close together are gathered into one
+restart, and a run still in progress is stopped, along with everything it
+started, before the next one begins:
+
+  git <project> build --watch debug
+
 See also:
 
   config
   worktree
 
+server
+------
+The server command keeps git-project loaded in a background process so that
+commands start quickly.
+
+Summary:
+
+  git <project> server start [--idle-timeout SECONDS]
+  git <project> server stop
+  git <project> server status
+
+Most of the time taken by a quick command such as ``worktree config`` goes
+to starting Python, importing pygit2 and the plugins and reading the git
+config.  The server does that once and then runs commands sent by
+git-project-client, a small program that forwards its command line,
+current directory, environment and standard input, output and error to
+the server.  To use it, link git-<project> to git-project-client instead
+of git-project and start the server:
+
+  ln -s $(which git-project-client) ~/bin/git-<project>
+  git <project> server start
+
+When no server is running for the repository, git-project-client runs
+the command itself, so the link is always safe to use.  The server
+listens on a socket in the git common directory and only accepts commands
+from its own user.  Each command runs in a process forked from the
+server, so that it starts with everything already loaded and a long
+command such as ``run --watch`` does not hold up others.  The server
+reloads the repository and config when a git config file, HEAD or any
+ref changes.  An interrupt or termination of the client is passed on to
+the command, not to the server.
+
+With --idle-timeout, the server exits after that many seconds without a
+command (one hour by default, zero to never exit).  The server's output
+goes to server.log in the project's state directory.
+
+See also:
+
+  run
+  worktree
+
 worktree
 --------
 The worktree command manages worktrees and connects them to projects.
 
 Summary:
 
-  git <project> worktree add [-b <branch>] <name-or-path> [<committish>]
+  git <project> worktree add [-b <branch>] [--seed-builddir] <name-or-path> [<committish>]
   git <project> worktree rm <name-or-path>
   git <project> worktree config <key> [<value>]
   git <project> worktree config [--unset] <key> [<value>]
+  git <project> worktree status
+  git <project> worktree du [--refresh]
+  git <project> worktree gc
+  git <project> worktree pool [--size N]
+  git <project> worktree cache [--trim]
 
 ``worktree add`` creates a new git worktree named via <name-or-path> with
 <committish> checked out.  If we pass -b <branch> we'll get a new branch at
@@ -488,6 +711,76 @@ substituted instead of 16.  If we are outside the worktree (for example a
 worktree without a buildwidth configured), then {buildwidth} will be
 substituted with 16.
 
+``worktree status`` shows a line for each registered worktree: its
+branch, whether tracked files have uncommitted changes, how many commits
+it is ahead of and behind its upstream branch, the size of its build
+directory and the result of the last run in it.  Worktrees are inspected
+in parallel and each line is printed as soon as its worktree has been
+inspected, so the order varies.
+
+``worktree du`` shows the disk space used by each worktree's checkout, its
+builddir, prefix and installdir and the artifacts associated with it,
+largest first, followed by the space used by artifacts associated with
+anything else.  A directory's space does not include the other directories
+shown that are inside it, such as a builddir inside the checkout, so nothing
+is counted twice.  Directories are read in parallel.  The space used by the
+files directly in each directory is cached in the project's state directory
+along with the directory's modification time, and a directory whose
+modification time has not changed is not read again, so measuring again
+after a build only reads the directories the build changed.  Files rewritten
+in place do not change their directory's modification time; --refresh reads
+every directory again.
+
+``worktree rm`` moves the worktree's directory and its builddir, prefix
+and installdir, if the worktree sets them, into a trash directory on the
+same filesystem, which is instant however large they are, and deletes
+them in a background process.  ``worktree gc`` deletes whatever is still
+in the trash, for example after the background process was interrupted,
+and reports anything that could not be deleted.  It also trims the shared
+cache directory described below.
+
+A new worktree starts with an empty build directory, so its first build
+rebuilds everything.  With --seed-builddir, worktree add instead copies
+the build directory, the substitution of the builddir key, of the
+worktree whose commit is closest to the new one, counting the commits
+reachable from one but not the other.  Files are copied as reflinks on
+filesystems that support them, which takes almost no time or space, and
+copied normally elsewhere.  This helps build systems whose build
+directories do not record their own location and that decide what to
+rebuild from file contents or, with a compiler cache, cache hits rather
+than timestamps alone:
+
+  git <project> worktree add --seed-builddir topic
+
+Checking out a large repository can take a long time.  ``worktree pool
+--size N`` keeps N detached worktrees checked out in advance, at the commit
+of the repository's HEAD, under the project's state directory.  worktree
+add then moves one of them into place and checks out the requested branch,
+which only updates the files that differ, and refills the pool in the
+background.  When no pooled worktree is ready, or the new worktree is on
+another filesystem, worktree add checks out a new one as usual.  Without
+--size, ``worktree pool`` lists the ready worktrees.  --size 0 empties the
+pool:
+
+  git <project> worktree pool --size 2
+  git <project> worktree add topic
+
+Build caches such as compiler caches are most useful when all worktrees
+share them, since worktrees usually build much the same sources.  The
+{cachedir} substitution names a cache directory shared by every worktree
+of the project, by default in the project's state directory under the git
+common directory.  Setting the project's cachedir key moves it elsewhere.
+Unlike build and install directories, the cache directory is not removed
+along with a worktree:
+
+  git <project> add build release "CCACHE_DIR={cachedir} {make}"
+
+``worktree cache`` shows the size of the cache directory and its quota,
+the project's cachesize key (10G by default).  With --trim, the
+least-recently-used files are removed until the cache fits its quota.
+``worktree gc`` trims the cache too.  The cache directory is created the
+first time a run's command names it.
+
 See also:
 
   artifact
@@ -495,12 +788,33 @@ See also:
   run
 """
 
-from .artifact import Artifact, ArtifactPlugin
-from .branch import BranchPlugin
-from .run import RunPlugin
-from .clone import ClonePlugin
-from .common import add_plugin_version_argument
-from .config import ConfigPlugin
-from .help import Help, HelpPlugin
-from .init import InitPlugin
-from .worktree import Worktree, WorktreePlugin
+import importlib
+
+# Plugins are imported when first used rather than with the package, so that
+# git-project-client can start without importing git-project and pygit2.
+_exports = {
+    'Artifact': 'artifact',
+    'ArtifactPlugin': 'artifact',
+    'BranchPlugin': 'branch',
+    'RunPlugin': 'run',
+    'ClonePlugin': 'clone',
+    'add_plugin_version_argument': 'common',
+    'ConfigPlugin': 'config',
+    'Help': 'help',
+    'HelpPlugin': 'help',
+    'InitPlugin': 'init',
+    'ServerPlugin': 'server',
+    'Worktree': 'worktree',
+    'WorktreePlugin': 'worktree',
+}
+
+def __getattr__(name):
+    module = _exports.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_exports))
@@ -29,6 +29,8 @@ from git_project import ConfigObject, SubstitutableConfigObject, Plugin
 from git_project import run_command_with_shell, add_top_level_command
 
 from git_project_core_plugins.common import add_plugin_version_argument
+from git_project_core_plugins.common import get_config_snapshot
+from git_project_core_plugins.common import invalidate_config
 
 import argparse
 import re
@@ -89,6 +91,26 @@ class Artifact(SubstitutableConfigObject):
 
         return super().exists(git, project_section, subsection, ident)
 
+    @classmethod
+    def find(cls, git, project_section, idents):
+        """Return the Artifact for the first of idents that has one, or None.  The
+        config snapshot is consulted first so that objects are only constructed
+        for artifacts that exist.
+
+        git: An object to query the repository and make config changes.
+
+        project_section: git config section of the active project.
+
+        idents: A sequence of subsections under <project>.artifact to check.
+
+        """
+        snapshot = get_config_snapshot(git)
+        for ident in idents:
+            section = f'{project_section}.{cls.subsection()}.{ident}'
+            if snapshot.has_section(section):
+                return cls.get(git, project_section, ident)
+        return None
+
     def __init__(self,
                  git,
                  project_section,
@@ -132,6 +154,7 @@ def command_artifact_add(git, gitproject, project, clargs):
 
     artifact = Artifact.get(git, project.get_section(), ident)
     artifact.add_item('path', path)
+    invalidate_config(git, artifact.get_section())
 
 def command_artifact_rm(git, gitproject, project, clargs):
     """Implement git-project artifact rm."""
@@ -144,6 +167,7 @@ def command_artifact_rm(git, gitproject, project, clargs):
         artifact.rm_item('path', path)
     else:
         artifact.rm_items('path')
+    invalidate_config(git, artifact.get_section())
 
 class ArtifactPlugin(Plugin):
     """
@@ -298,19 +322,10 @@ the final git config section that will hold the artifact path.
 
         def artifact_rm(self):
             # See if there is any artifact associated with this ConfigObject.
-            artifact = None
-            if Artifact.exists(self._git,
-                               self._project_section,
-                               self._subsection + '.' + self._ident):
-                artifact = Artifact.get(self._git,
-                                        self._project_section,
-                                        self._subsection + '.' + self._ident)
-            elif Artifact.exists(self._git,
-                                 self._project_section,
-                                 self._subsection):
-                artifact = Artifact.get(self._git,
-                                        self._project_section,
-                                        self._subsection)
+            artifact = Artifact.find(self._git,
+                                     self._project_section,
+                                     (self._subsection + '.' + self._ident,
+                                      self._subsection))
 
             if artifact:
                 for path in artifact.iter_multival('path'):
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Time commands repeatedly and summarize how long they take.
+
+Each command's output is discarded while it is timed.  Wall time is measured
+around the whole process and CPU time is the user and system time of the
+command and everything it waited for.
+
+"""
+
+from git_project import GitProjectException
+
+from git_project_core_plugins.jobs import get_argv
+
+import math
+import os
+import statistics
+import subprocess
+import time
+
+class Benchmark:
+    """A command to time along with the times collected for it."""
+
+    def __init__(self, name, command, cwd=None, direct=True):
+        """Benchmark construction.
+
+        name: A name to identify the command in reports.
+
+        command: The fully-substituted command string.
+
+        cwd: The directory in which to run the command.  None means the current
+             directory.
+
+        direct: Whether the command may be executed without a shell when it
+                contains no shell syntax.
+
+        """
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.direct = direct
+        self.walls = []
+        self.cpus = []
+
+    def _time_once(self):
+        """Run the command once and return its wall time and CPU time.  Raise
+        GitProjectException if it fails.
+
+        """
+        argv = get_argv(self.command) if self.direct else None
+        start = time.monotonic()
+        proc = subprocess.Popen(argv or self.command,
+                                shell=argv is None,
+                                cwd=self.cwd,
+                                stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL,
+                                stderr=subprocess.DEVNULL)
+        _pid, status, usage = os.wait4(proc.pid, 0)
+        wall = time.monotonic() - start
+
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        if proc.returncode != 0:
+            raise GitProjectException(f'{self.name} failed with exit status {proc.returncode}: {self.command}')
+
+        return wall, usage.ru_utime + usage.ru_stime
+
+    def run(self, warmup, runs):
+        """Run the command warmup times without recording anything, then runs times
+        recording its wall and CPU time.
+
+        warmup: The number of untimed runs.
+
+        runs: The number of timed runs.
+
+        """
+        print(f'Benchmarking {self.name}: {self.command}', flush=True)
+        for _ in range(warmup):
+            self._time_once()
+        for _ in range(runs):
+            wall, cpu = self._time_once()
+            self.walls.append(wall)
+            self.cpus.append(cpu)
+
+def get_outliers(values):
+    """Return the values lying more than one and a half interquartile ranges
+    outside the middle half of values.  Too few values have no outliers.
+
+    values: A non-empty list of numbers.
+
+    """
+    if len(values) < 5:
+        return []
+    lower, _median, upper = statistics.quantiles(values, n=4)
+    spread = 1.5 * (upper - lower)
+    return [value for value in values
+            if value < lower - spread or value > upper + spread]
+
+def _format_times(label, values):
+    """Return a line summarizing a list of times."""
+    mean = statistics.mean(values)
+    stdev = statistics.stdev(values) if len(values) > 1 else 0.0
+    return (f'  {label:<5} mean {mean:.3f}s ± {stdev:.3f}s'
+            f'  median {statistics.median(values):.3f}s'
+            f'  min {min(values):.3f}s  max {max(values):.3f}s')
+
+def print_results(benchmarks):
+    """Print the times of each Benchmark and, for more than one, how they compare
+    with the fastest.
+
+    benchmarks: A list of Benchmarks that have run.
+
+    """
+    for benchmark in benchmarks:
+        print(f'{benchmark.name}: {len(benchmark.walls)} runs')
+        print(_format_times('wall', benchmark.walls))
+        print(_format_times('cpu', benchmark.cpus))
+        outliers = get_outliers(benchmark.walls)
+        if outliers:
+            noun = 'outlier' if len(outliers) == 1 else 'outliers'
+            print(f'  {len(outliers)} {noun}: '
+                  + ' '.join(f'{value:.3f}s' for value in outliers)
+                  + ', the system may have been busy')
+
+    if len(benchmarks) < 2:
+        return
+
+    def relative_error(benchmark):
+        mean = statistics.mean(benchmark.walls)
+        stdev = statistics.stdev(benchmark.walls) if len(benchmark.walls) > 1 else 0.0
+        return stdev / mean if mean else 0.0
+
+    fastest = min(benchmarks, key=lambda benchmark: statistics.mean(benchmark.walls))
+    fastest_mean = statistics.mean(fastest.walls)
+    print(f'{fastest.name} ran fastest')
+    for benchmark in benchmarks:
+        if benchmark is fastest:
+            continue
+        ratio = statistics.mean(benchmark.walls) / fastest_mean if fastest_mean else math.inf
+        error = ratio * math.hypot(relative_error(benchmark), relative_error(fastest))
+        print(f'  {ratio:.2f} ± {error:.2f} times faster than {benchmark.name}')
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+"""A content-addressed store for the outputs of runs.
+
+Each entry is a directory named by a key, holding a copy of each output path
+under its index in the list of outputs.  Entries are shared by all worktrees
+of a repository.  The modification time of an entry directory records when it
+was last used and the least-recently-used entries are evicted once the cache
+grows beyond its size limit.
+
+The fingerprints of runs that succeeded, used to skip runs whose inputs have
+not changed, are kept in the same state directory, one file per worktree.
+
+"""
+
+from git_project_core_plugins.common import get_state_dir
+
+import fcntl
+import json
+import os
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+
+# The Linux ioctl that makes a file share the blocks of another.
+_FICLONE = 0x40049409
+
+def get_tree_size(path):
+    """Return the total size in bytes of the files under path, not following
+    symlinks.
+
+    """
+    path = Path(path)
+    if path.is_symlink() or not path.is_dir():
+        return path.lstat().st_size if os.path.lexists(path) else 0
+
+    total = 0
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(dirpath, filename)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+def clone_file(source, destination):
+    """Copy a file like shutil.copy2, as a reflink sharing the source's blocks
+    where the filesystem supports it so that the copy is nearly free.
+
+    """
+    if sys.platform == 'linux' and not os.path.islink(source):
+        try:
+            with open(source, 'rb') as infile, open(destination, 'wb') as outfile:
+                fcntl.ioctl(outfile.fileno(), _FICLONE, infile.fileno())
+            shutil.copystat(source, destination)
+            return destination
+        except OSError:
+            # Not supported by the filesystem or across filesystems.
+            pass
+    return shutil.copy2(source, destination, follow_symlinks=False)
+
+def copy_path(source, destination):
+    """Copy a file, symlink or directory tree, preserving timestamps so that build
+    tools see restored outputs as up to date.
+
+    """
+    source = Path(source)
+    if source.is_dir() and not source.is_symlink():
+        shutil.copytree(source, destination, symlinks=True, copy_function=clone_file)
+    else:
+        clone_file(source, destination)
+
+def remove_path(path):
+    """Remove a file, symlink or directory tree if it exists."""
+    path = Path(path)
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        path.unlink()
+
+def trim_lru(entries, limit):
+    """Remove the least-recently-used paths in entries until their total size is
+    at most limit.  Return the number of bytes removed.
+
+    entries: A list of (path, size, last_used) tuples.
+
+    limit: The number of bytes to keep.
+
+    """
+    total = sum(size for _path, size, _last_used in entries)
+    removed = 0
+    for path, size, _last_used in sorted(entries, key=lambda entry: entry[2]):
+        if total <= limit:
+            break
+        remove_path(path)
+        total -= size
+        removed += size
+    return removed
+
+class OutputCache:
+    """A store of run outputs keyed by their inputs."""
+
+    def __init__(self, git, project, limit):
+        """OutputCache construction.
+
+        git: An object to query the repository.
+
+        project: The currently active Project.
+
+        limit: The maximum size of the cache in bytes.
+
+        """
+        self._root = get_state_dir(git, project) / 'outputs'
+        self._root.mkdir(exist_ok=True)
+        self._limit = limit
+
+    def _entry(self, key):
+        return self._root / key
+
+    def contains(self, key):
+        """Return whether there is a complete entry for key."""
+        return (self._entry(key) / 'meta.json').exists()
+
+    def restore(self, key, outputs):
+        """Replace each output path with its cached copy and mark the entry as
+        recently used.
+
+        key: The key of the entry to restore.
+
+        outputs: The list of output paths, in the order they were stored.
+
+        """
+        entry = self._entry(key)
+        with open(entry / 'meta.json') as metafile:
+            meta = json.load(metafile)
+
+        for index, output in enumerate(outputs):
+            cached = entry / str(index)
+            remove_path(output)
+            if index < meta['count'] and os.path.lexists(cached):
+                Path(output).parent.mkdir(parents=True, exist_ok=True)
+                copy_path(cached, output)
+
+        os.utime(entry)
+
+    def store(self, key, outputs):
+        """Copy the output paths into a new entry for key, then evict old entries if
+        the cache has grown too large.
+
+        key: The key of the entry to create.
+
+        outputs: The list of output paths to copy.  Missing paths are recorded as
+                 missing.
+
+        """
+        entry = self._entry(key)
+        if self.contains(key):
+            os.utime(entry)
+            return
+
+        staging = Path(tempfile.mkdtemp(dir=self._root, prefix='.staging-'))
+        try:
+            size = 0
+            for index, output in enumerate(outputs):
+                if os.path.lexists(output):
+                    copy_path(output, staging / str(index))
+                    size += get_tree_size(staging / str(index))
+
+            with open(staging / 'meta.json', 'w') as metafile:
+                json.dump({'count': len(outputs), 'size': size}, metafile)
+
+            remove_path(entry)
+            staging.rename(entry)
+        finally:
+            remove_path(staging)
+
+        self.trim()
+
+    def trim(self):
+        """Evict least-recently-used entries until the cache fits its limit."""
+        entries = []
+        for entry in self._root.iterdir():
+            if entry.name.startswith('.'):
+                continue
+            try:
+                with open(entry / 'meta.json') as metafile:
+                    size = json.load(metafile)['size']
+            except (OSError, ValueError, KeyError):
+                # An incomplete entry, get rid of it.
+                remove_path(entry)
+                continue
+            entries.append((entry, size, entry.stat().st_mtime))
+
+        trim_lru(entries, self._limit)
+
+class RunFingerprints:
+    """The fingerprints of the runs that last succeeded in one worktree, or in
+    the project outside of any worktree.  They are kept in the project's state
+    directory rather than the git config so that recording them after every
+    run does not change the config.
+
+    """
+
+    def __init__(self, git, project, worktree=None):
+        """RunFingerprints construction.
+
+        git: An object to query the repository.
+
+        project: The currently active Project.
+
+        worktree: The name of the worktree, or None outside of any worktree.
+
+        """
+        name = f'worktree-{worktree}.json' if worktree else 'project.json'
+        self._path = get_state_dir(git, project) / 'fingerprints' / name
+        try:
+            with open(self._path) as fingerprintfile:
+                self._fingerprints = json.load(fingerprintfile)
+        except (OSError, ValueError):
+            self._fingerprints = {}
+
+    def get(self, key):
+        """Return the fingerprint recorded for key, or None."""
+        return self._fingerprints.get(key)
+
+    def set(self, key, fingerprint):
+        """Record the fingerprint for key.  It is written by save."""
+        self._fingerprints[key] = fingerprint
+
+    def save(self):
+        """Write the recorded fingerprints."""
+        self._path.parent.mkdir(exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=self._path.parent, prefix='.fingerprints-')
+        try:
+            with os.fdopen(fd, 'w') as fingerprintfile:
+                json.dump(self._fingerprints, fingerprintfile)
+            os.replace(temp, self._path)
+        finally:
+            Path(temp).unlink(missing_ok=True)
+
+    def remove(self):
+        """Forget every recorded fingerprint."""
+        self._fingerprints = {}
+        self._path.unlink(missing_ok=True)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""A thin client for the git-project server.
+
+Starting Python and importing pygit2 and every plugin takes far longer than
+most commands do.  When a server is running for the repository and project
+(see the server plugin), this client forwards its command line, current
+directory, environment and standard streams to the server, which runs the
+command in its already-loaded process.  Otherwise the client runs the command
+itself, exactly as git-project would.
+
+Link git-<project> to git-project-client instead of git-project to use it.
+This module imports nothing beyond the standard library so that it starts
+quickly.
+
+"""
+
+import array
+import hashlib
+import json
+import os
+from pathlib import Path
+import signal
+import socket
+import struct
+import sys
+import tempfile
+
+# Longest socket path that fits in sockaddr_un on all platforms we support.
+_MAX_SOCKET_PATH = 100
+
+# The request header: the length of the JSON request that follows.
+HEADER = struct.Struct('!I')
+
+def get_project_name(program):
+    """Return the project name implied by the name of the program being run.
+
+    program: The program name, usually sys.argv[0].
+
+    """
+    name = Path(program).name
+    return name[len('git-'):] if name.startswith('git-') else name
+
+def find_git_common_dir(cwd):
+    """Return the common git directory of the repository containing cwd, or None
+    if there is none or the environment tells git where to look.
+
+    cwd: The directory to start searching from.
+
+    """
+    if any(name in os.environ for name in ('GIT_DIR', 'GIT_COMMON_DIR', 'GIT_WORK_TREE')):
+        return None
+
+    directory = Path(cwd).resolve()
+    while True:
+        dotgit = directory / '.git'
+        gitdir = None
+        if dotgit.is_dir():
+            gitdir = dotgit
+        elif dotgit.is_file():
+            try:
+                text = dotgit.read_text().strip()
+            except OSError:
+                return None
+            if text.startswith('gitdir:'):
+                gitdir = (directory / text[len('gitdir:'):].strip()).resolve()
+        if gitdir is not None:
+            try:
+                commondir = (gitdir / 'commondir').read_text().strip()
+            except OSError:
+                return gitdir
+            return (gitdir / commondir).resolve()
+        if directory.parent == directory:
+            return None
+        directory = directory.parent
+
+def get_socket_path(common_dir, project_name):
+    """Return the path of the server socket for a project.
+
+    common_dir: The common git directory of the repository.
+
+    project_name: The name of the project the server runs commands for.
+
+    """
+    path = Path(common_dir) / 'git-project' / f'{project_name}.sock'
+    if len(os.fsencode(path)) <= _MAX_SOCKET_PATH:
+        return path
+
+    # Socket addresses are short, so fall back to a name derived from the
+    # full path.
+    digest = hashlib.sha256(os.fsencode(path)).hexdigest()[:16]
+    return Path(tempfile.gettempdir()) / f'git-project-{os.getuid()}-{digest}.sock'
+
+def get_peer_uid(sock):
+    """Return the user ID of the process at the other end of a Unix socket, or
+    None if the platform does not tell us.
+
+    sock: A connected Unix socket.
+
+    """
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    credentials = sock.getsockopt(socket.SOL_SOCKET,
+                                  socket.SO_PEERCRED,
+                                  struct.calcsize('3i'))
+    _pid, uid, _gid = struct.unpack('3i', credentials)
+    return uid
+
+def connect(socket_path):
+    """Return a socket connected to the server at socket_path, or None if no server
+    owned by us is listening there.
+
+    socket_path: The path of the server socket.
+
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(os.fsencode(socket_path))
+        uid = get_peer_uid(sock)
+        if uid is not None and uid != os.getuid():
+            sock.close()
+            return None
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+def send_request(sock, request, fds=()):
+    """Send a request to the server.
+
+    sock: A connected socket.
+
+    request: A JSON-serializable dictionary.
+
+    fds: File descriptors to pass along with the request.
+
+    """
+    data = json.dumps(request).encode()
+    ancillary = []
+    if fds:
+        ancillary = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+    sock.sendmsg([HEADER.pack(len(data))], ancillary)
+    sock.sendall(data)
+
+def iter_replies(sock):
+    """Iterate over the replies from the server, one dictionary per line.
+
+    sock: A connected socket.
+
+    """
+    with sock.makefile('rb') as replies:
+        for line in replies:
+            yield json.loads(line)
+
+def forward(sock, argv):
+    """Have the server run a command with our directory, environment and standard
+    streams and return its exit status.  Interrupts and termination are passed
+    on to the process group the server runs the command in, which holds the
+    command and whatever it runs but not the server itself.
+
+    sock: A socket connected to the server.
+
+    argv: The command line to run, including the program name.
+
+    """
+    send_request(sock,
+                 {'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)},
+                 (0, 1, 2))
+
+    status = None
+    command_pid = None
+    received = []
+
+    def interrupt(signum, _frame):
+        received.append(signum)
+        if command_pid:
+            try:
+                os.killpg(command_pid, signum)
+            except OSError:
+                pass
+
+    previous = {signum: signal.signal(signum, interrupt)
+                for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        for reply in iter_replies(sock):
+            if 'pid' in reply:
+                command_pid = reply['pid']
+                if received:
+                    # A signal arrived before the command started.
+                    interrupt(received.pop(), None)
+            if 'status' in reply:
+                status = reply['status']
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+        sock.close()
+
+    if status is None:
+        # The command was killed before it could report its status.
+        return 128 + received[-1] if received else 1
+    return status
+
+def main():
+    """Run a git-project command, through the server if one is running."""
+    common_dir = find_git_common_dir(os.getcwd())
+    sock = None
+    if common_dir:
+        socket_path = get_socket_path(common_dir, get_project_name(sys.argv[0]))
+        sock = connect(socket_path)
+
+    if sock is None:
+        from git_project.main import main as git_project_main
+        git_project_main()
+        return
+
+    sys.exit(forward(sock, sys.argv))
@@ -20,7 +20,408 @@
 # You should have received a copy of the GNU Affero General Public License along
 # with git-project. If not, see <https://www.gnu.org/licenses/>.
 
+from git_project import GitProjectException
 from git_project.commandline import add_version_argument
 
+import json
+import os
+from pathlib import Path
+import re
+import sys
+import tempfile
+import weakref
+
 def add_plugin_version_argument(parser):
     add_version_argument(parser, 'git-project-core-plugins')
+
+def get_selected_command():
+    """Return the top-level command named on the command line, or None if parsers
+    for every command should be built.  Every parser is built when help is
+    requested or no command is given so that usage and error messages list
+    all commands.  The command line is only examined when running as a
+    git-<project> command, so that code driving plugins directly, such as
+    tests, always gets every parser.
+
+    """
+    if not sys.argv or not Path(sys.argv[0]).name.startswith('git-'):
+        return None
+
+    args = sys.argv[1:]
+    if '-h' in args or '--help' in args:
+        return None
+
+    for arg in args:
+        if not arg.startswith('-'):
+            return arg
+
+    return None
+
+def is_command_selected(command):
+    """Return whether parsers for the top-level command should be built.
+
+    command: The name of the top-level command.
+
+    """
+    selected = get_selected_command()
+    return selected is None or selected == command
+
+def get_state_dir(git, project):
+    """Return the directory where plugins keep non-config state for the project,
+    creating it if necessary.  It lives in the common git directory so that it
+    is shared by all worktrees.
+
+    git: An object to query the repository.
+
+    project: The currently active Project.
+
+    """
+    path = Path(git.get_git_common_dir()) / 'git-project' / project.get_section()
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def parse_size(value):
+    """Parse a size such as 512, 100K, 20M or 5G into a number of bytes.
+
+    value: The size string to parse.
+
+    """
+    units = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+    text = value.strip().upper().removesuffix('B').removesuffix('I')
+    unit = text[-1:] if text[-1:] in units else ''
+    try:
+        return int(float(text[:len(text) - len(unit)]) * units[unit])
+    except ValueError:
+        raise GitProjectException(f'Invalid size "{value}"')
+
+def format_size(size):
+    """Format a number of bytes for display."""
+    for unit in ('B', 'K', 'M', 'G'):
+        if size < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}T'
+
+class ConfigSnapshot:
+    """A read-mostly index of the git config, mapping each section to a dict from
+    key to the tuple of its values.  Sections are indexed the first time they
+    are asked for and dropped when they are written through the snapshot or
+    passed to invalidate_config, so a snapshot does not serve stale values.
+    Use get_config_snapshot to obtain the snapshot for a Git object.
+
+    """
+
+    def __init__(self, config):
+        """ConfigSnapshot construction.
+
+        config: The Git.Config to index, or None if there is no repository.
+
+        """
+        self._config = config
+        self._sections = {}
+
+    def get_section(self, section):
+        """Return a dict mapping each key in section to a tuple of its values.  The
+        dict is empty if the section does not exist.
+
+        section: The full name of the config section.
+
+        """
+        result = self._sections.get(section)
+        if result is None:
+            result = {}
+            config_section = (self._config.get_section(section)
+                              if self._config else None)
+            if config_section:
+                for key, item in config_section:
+                    result[key.rsplit('.', 1)[-1]] = tuple(item.itervalues())
+            self._sections[section] = result
+        return result
+
+    def iter_subsections(self, section):
+        """Iterate over the names of the sections below section, without the
+        leading section name and separator.
+
+        section: The full name of the parent config section.
+
+        """
+        if not self._config:
+            return
+        prefix = f'{section}.'
+        # Git.Config holds every section in memory but has no way to list them.
+        for name in self._config._sections:
+            if name.startswith(prefix):
+                yield name[len(prefix):]
+
+    def has_section(self, section):
+        """Return whether section has any keys."""
+        return bool(self.get_section(section))
+
+    def has_item(self, section, key):
+        """Return whether key has a value in section."""
+        return key in self.get_section(section)
+
+    def get_item(self, section, key):
+        """Return a value of key in section, or None if it has none."""
+        values = self.get_section(section).get(key)
+        return values[0] if values else None
+
+    def iter_multival(self, section, key):
+        """Iterate over the values of key in section."""
+        yield from self.get_section(section).get(key, ())
+
+    def set_item(self, section, key, value):
+        """Set key in section to value in the git config."""
+        self._config.set_item(section, key, value)
+        self.invalidate(section)
+
+    def add_item(self, section, key, value):
+        """Add value to the values of key in section in the git config."""
+        self._config.add_item(section, key, value)
+        self.invalidate(section)
+
+    def rm_item(self, section, key, pattern):
+        """Remove the values of key in section matching pattern from the git
+        config.
+
+        """
+        self._config.rm_item(section, key, pattern)
+        self.invalidate(section)
+
+    def rm_items(self, section, key):
+        """Remove every value of key in section from the git config."""
+        self._config.rm_items(section, key)
+        self.invalidate(section)
+
+    def rm_section(self, section):
+        """Remove section and all of its keys from the git config."""
+        self._config.rm_section(section)
+        self.invalidate(section)
+
+    def invalidate(self, section=None):
+        """Forget the indexed contents of section, or of every section if section is
+        None, along with any values a StartupCache derived from the config.
+
+        """
+        if section is None:
+            self._sections.clear()
+        else:
+            self._sections.pop(section, None)
+        if self._config is not None:
+            _startup_caches.pop(self._config, None)
+
+# Snapshots are keyed by Git.Config so that reloading the config, which creates
+# a new Git.Config, also starts a new snapshot.
+_config_snapshots = weakref.WeakKeyDictionary()
+
+def get_config_snapshot(git):
+    """Return the ConfigSnapshot for git's config, creating it if necessary.  All
+    callers with the same Git object share one snapshot.  Writes made other
+    than through the snapshot, for example by setting a ConfigObject
+    attribute, must be followed by invalidate_config.
+
+    git: An object to query the repository.
+
+    """
+    if not git.has_repo():
+        return ConfigSnapshot(None)
+
+    config = git.config
+    snapshot = _config_snapshots.get(config)
+    if snapshot is None:
+        snapshot = ConfigSnapshot(config)
+        _config_snapshots[config] = snapshot
+    return snapshot
+
+def invalidate_config(git, section=None):
+    """Tell the ConfigSnapshot and StartupCache for git's config that section, or
+    any section if section is None, was written without going through the
+    snapshot.
+
+    git: An object to query the repository.
+
+    section: The full name of the config section written.
+
+    """
+    if git.has_repo():
+        get_config_snapshot(git).invalidate(section)
+
+# Bump this whenever the meaning of a cached startup value changes.
+_STARTUP_CACHE_VERSION = 1
+
+# Git stops following includes this deep.
+_MAX_INCLUDE_DEPTH = 10
+
+_SECTION_RE = re.compile(r'\s*\[\s*([^\]\s"]+)\s*("(.*)")?\s*\]')
+_INCLUDE_PATH_RE = re.compile(r'\s*path\s*=\s*(.*?)\s*$', re.IGNORECASE)
+
+def get_config_includes(path, depth=0):
+    """Return the files a git config file includes, directly or indirectly, along
+    with the conditions of their includeIf sections.  Conditional includes are
+    returned whether or not their condition holds.
+
+    path: The config file to examine.
+
+    depth: The number of includes followed to reach path.
+
+    """
+    try:
+        text = Path(path).read_text(errors='replace')
+    except OSError:
+        return []
+
+    includes = []
+    condition = None
+    for line in text.splitlines():
+        section = _SECTION_RE.match(line)
+        if section:
+            name = section.group(1).lower()
+            if name == 'include':
+                condition = ''
+            elif name == 'includeif':
+                condition = section.group(3) or ''
+            else:
+                condition = None
+            continue
+
+        include = _INCLUDE_PATH_RE.match(line) if condition is not None else None
+        if not include:
+            continue
+
+        value = include.group(1)
+        if value.startswith('"'):
+            value = value[1:].partition('"')[0]
+        else:
+            value = re.split(r'\s[#;]', value)[0]
+        included = Path(os.path.expanduser(value))
+        if not included.is_absolute():
+            included = Path(path).parent / included
+
+        includes.append((included, condition))
+        if depth + 1 < _MAX_INCLUDE_DEPTH:
+            includes.extend(get_config_includes(included, depth + 1))
+
+    return includes
+
+def _get_file_stamp(path):
+    """Return a value that changes whenever the file at path changes."""
+    try:
+        stat = path.stat()
+        # Git replaces config files on write, so the inode changes even when
+        # the modification time does not.
+        return [str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return [str(path), None, None, None]
+
+def get_config_stamp(git):
+    """Return a value that changes whenever any git config file that could hold
+    project settings changes, including files they include.
+
+    """
+    home = Path.home()
+    xdg_config = Path(os.environ.get('XDG_CONFIG_HOME', home / '.config'))
+    gitdir = Path(git.get_gitdir())
+    paths = [
+        Path(git.get_git_common_dir()) / 'config',
+        gitdir / 'config.worktree',
+        Path(os.environ.get('GIT_CONFIG_GLOBAL', home / '.gitconfig')),
+        xdg_config / 'git' / 'config',
+        Path(os.environ.get('GIT_CONFIG_SYSTEM', '/etc/gitconfig')),
+    ]
+
+    stamp = [_STARTUP_CACHE_VERSION, str(Path(__file__).stat().st_mtime_ns)]
+    on_branch = False
+    for path in paths:
+        stamp.append(_get_file_stamp(path))
+        for included, condition in get_config_includes(path):
+            stamp.append(_get_file_stamp(included))
+            on_branch = on_branch or condition.startswith('onbranch:')
+
+    if on_branch:
+        # Which includes apply depends on the branch checked out.
+        try:
+            stamp.append(['HEAD', (gitdir / 'HEAD').read_text()])
+        except OSError:
+            stamp.append(['HEAD', None])
+
+    # Config given on the command line or in the environment.
+    for name, value in sorted(os.environ.items()):
+        if name.startswith('GIT_CONFIG'):
+            stamp.append([name, value])
+
+    return stamp
+
+class StartupCache:
+    """Values derived from the git config while setting up the command line, kept
+    on disk so that later invocations need not derive them again.  The cache
+    is stamped with the modification times and sizes of the git config files
+    and the files they include and is discarded when the stamp no longer
+    matches.  Use get_startup_cache
+    to obtain the cache for a Git object.
+
+    """
+
+    def __init__(self, path, stamp):
+        """StartupCache construction.
+
+        path: The file holding the cache.
+
+        stamp: The current config stamp.  Cached values are only used if they
+               were saved with the same stamp.
+
+        """
+        self._path = path
+        self._stamp = stamp
+        self._values = {}
+        self._dirty = False
+
+        try:
+            with open(path) as cachefile:
+                contents = json.load(cachefile)
+            if contents.get('stamp') == stamp:
+                self._values = contents['values']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+    def get(self, key):
+        """Return the cached value for key, or None if there is none."""
+        return self._values.get(key)
+
+    def set(self, key, value):
+        """Cache a JSON-serializable value for key."""
+        self._values[key] = value
+        self._dirty = True
+
+    def save(self):
+        """Write the cache to disk if anything was added to it."""
+        if not self._dirty:
+            return
+
+        fd, temp = tempfile.mkstemp(dir=self._path.parent, prefix='.startup-')
+        try:
+            with os.fdopen(fd, 'w') as cachefile:
+                json.dump({'stamp': self._stamp, 'values': self._values},
+                          cachefile)
+            os.replace(temp, self._path)
+        except OSError:
+            # The cache is only an optimization.
+            Path(temp).unlink(missing_ok=True)
+        self._dirty = False
+
+# Map each Git.Config to its StartupCaches by project section.
+_startup_caches = weakref.WeakKeyDictionary()
+
+def get_startup_cache(git, project):
+    """Return the StartupCache for the project, loading it if necessary.
+
+    git: An object to query the repository.
+
+    project: The currently active Project.
+
+    """
+    caches = _startup_caches.setdefault(git.config, {})
+    cache = caches.get(project.get_section())
+    if cache is None:
+        stamp = get_config_stamp(git)
+        cache = StartupCache(get_state_dir(git, project) / 'startup.json', stamp)
+        caches[project.get_section()] = cache
+    return cache
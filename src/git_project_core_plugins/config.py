@@ -33,6 +33,7 @@ from git_project import ConfigObject, RunnableConfigObject
 from git_project import Plugin, Project, GitProjectException
 
 from git_project_core_plugins.common import add_plugin_version_argument
+from git_project_core_plugins.common import is_command_selected
 
 def command_config(git, gitproject, project, clargs):
     """Implement git-project config."""
@@ -160,7 +161,8 @@ class ConfigPlugin(Plugin):
                       parser_manager,
                       plugin_manager):
         """Add arguments for 'git-project config'"""
-        self._add_config_parser(Project, project, parser_manager)
+        if is_command_selected('config'):
+            self._add_config_parser(Project, project, parser_manager)
 
     def modify_arguments(self, git, gitproject, project, parser_manager, plugin_manager):
         """Modify arguments for 'git-project config.'"""
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+"""Disk usage of directory trees, measured incrementally.
+
+Measuring a large build tree means visiting every file in it.  Most of a
+tree is unchanged from one measurement to the next, so the bytes used by the
+files directly in each directory are cached along with the directory's
+modification time and its subdirectories.  A directory whose modification
+time is unchanged has had no entries added, removed or renamed, so its cached
+result is used without reading it.  Files rewritten in place without being
+replaced do not change their directory's modification time; measure without
+the cache to pick up their new sizes.
+
+"""
+
+from git_project_core_plugins.common import get_state_dir
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+import tempfile
+
+class DiskUsage:
+    """A measurer of directory trees with a cache of per-directory results."""
+
+    def __init__(self, path, use_cache=True):
+        """DiskUsage construction.
+
+        path: The file holding the cache.
+
+        use_cache: Whether to use cached results.  New results are cached
+                   either way.
+
+        """
+        self._path = Path(path)
+        self._cache = {}
+        self._visited = {}
+        if use_cache:
+            try:
+                with open(self._path) as cachefile:
+                    self._cache = json.load(cachefile)
+            except (OSError, ValueError):
+                pass
+
+    def _scan(self, path):
+        """Return the disk usage of the files directly in a directory, its
+        subdirectories and the cache entry describing them.
+
+        """
+        stat = os.lstat(path)
+        cached = self._cache.get(path)
+        if cached and cached[0] == stat.st_mtime_ns:
+            return cached[1], [os.path.join(path, name) for name in cached[2]], cached
+
+        used = 0
+        subdirectories = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.name)
+                    else:
+                        used += entry.stat(follow_symlinks=False).st_blocks * 512
+                except FileNotFoundError:
+                    continue
+        entry = [stat.st_mtime_ns, used, subdirectories]
+        return used, [os.path.join(path, name) for name in subdirectories], entry
+
+    def measure(self, paths, workers=None):
+        """Return a dict mapping each of paths to the bytes used by the tree under
+        it, not counting any of the other paths inside it, so that no byte is
+        counted twice.  Directories are read in parallel, one level of every
+        tree at a time.
+
+        paths: The files or directories to measure.  Missing paths use no
+               space.
+
+        workers: The number of threads reading directories, or None for one per
+                 CPU.
+
+        """
+        totals = {os.path.abspath(path): 0 for path in paths}
+
+        frontier = []
+        directories = set()
+        files = []
+        for root in totals:
+            try:
+                stat = os.lstat(root)
+            except FileNotFoundError:
+                continue
+            if os.path.isdir(root) and not os.path.islink(root):
+                frontier.append((root, root))
+                directories.add(root)
+            else:
+                totals[root] = stat.st_blocks * 512
+                files.append(root)
+
+        def scan(item):
+            path, root = item
+            try:
+                return path, root, self._scan(path)
+            except OSError:
+                # Removed or unreadable while being measured.
+                return path, root, (0, [], None)
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            while frontier:
+                next_frontier = []
+                for path, root, (used, subdirectories, entry) in executor.map(scan, frontier):
+                    totals[root] += used
+                    if entry:
+                        self._visited[path] = entry
+                    # Directories measured in their own right are not part of
+                    # the tree containing them.
+                    next_frontier.extend((subdirectory, root)
+                                         for subdirectory in subdirectories
+                                         if subdirectory not in directories)
+                frontier = next_frontier
+
+        # A file is counted by the nearest directory containing it as well.
+        for root in files:
+            parent = os.path.dirname(root)
+            while parent not in directories and os.path.dirname(parent) != parent:
+                parent = os.path.dirname(parent)
+            if parent in directories:
+                totals[parent] -= totals[root]
+
+        return {path: totals[os.path.abspath(path)] for path in paths}
+
+    def save(self):
+        """Write the results of the directories measured so far to the cache,
+        dropping those of directories no longer measured.
+
+        """
+        fd, temp = tempfile.mkstemp(dir=self._path.parent, prefix='.du-')
+        try:
+            with os.fdopen(fd, 'w') as cachefile:
+                json.dump(self._visited, cachefile, separators=(',', ':'))
+            os.replace(temp, self._path)
+        except OSError:
+            # The cache is only an optimization.
+            Path(temp).unlink(missing_ok=True)
+
+def get_disk_usage(git, project, use_cache=True):
+    """Return the DiskUsage of a project, with its cache in the state directory.
+
+    git: An object to query the repository.
+
+    project: The currently active Project.
+
+    use_cache: Whether to use cached results.
+
+    """
+    return DiskUsage(get_state_dir(git, project) / 'du.json', use_cache)
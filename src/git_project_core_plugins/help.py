@@ -34,6 +34,8 @@ from git_project import add_top_level_command, GitProjectException
 from git_project import get_or_add_top_level_command
 
 from git_project_core_plugins.common import add_plugin_version_argument
+from git_project_core_plugins.common import get_config_snapshot
+from git_project_core_plugins.common import is_command_selected
 
 from pydoc import pager
 
@@ -167,18 +169,20 @@ def command_help(git, gitproject, project, clargs):
 def command_add_help(git, gitproject, project, clargs):
     f"""Implement git-project add help"""
     help_section = f'{project.get_section()}.help.{clargs.name}'
+    snapshot = get_config_snapshot(git)
     if clargs.manpage:
-        git.config.add_item(help_section, 'manpage', clargs.text)
+        snapshot.add_item(help_section, 'manpage', clargs.text)
     else:
-        git.config.add_item(help_section, 'short', clargs.text)
+        snapshot.add_item(help_section, 'short', clargs.text)
 
 def command_rm_help(git, gitproject, project, clargs):
     f"""Implement git-project r help"""
     help_section = f'{project.get_section()}.help.{clargs.name}'
+    snapshot = get_config_snapshot(git)
     if clargs.manpage:
-        git.config.rm_items(help_section, 'manpage')
+        snapshot.rm_items(help_section, 'manpage')
     else:
-        git.config.rm_items(help_section, 'short')
+        snapshot.rm_items(help_section, 'short')
 
 class HelpPlugin(Plugin):
     """
@@ -225,70 +229,73 @@ class HelpPlugin(Plugin):
                       parser_manager,
                       plugin_manager):
         """Add arguments for 'git-project help'"""
-        # help
-        help_parser = add_top_level_command(parser_manager,
-                                            'help',
-                                            'help',
-                                            help='Display help')
+        if is_command_selected('help'):
+            # help
+            help_parser = add_top_level_command(parser_manager,
+                                                'help',
+                                                'help',
+                                                help='Display help')
 
-        help_parser.set_defaults(func=command_help)
+            help_parser.set_defaults(func=command_help)
 
-        add_plugin_version_argument(help_parser)
+            add_plugin_version_argument(help_parser)
 
-        help_parser.add_argument('options',
-                                 nargs='*',
-                                 help='Specify help section')
+            help_parser.add_argument('options',
+                                     nargs='*',
+                                     help='Specify help section')
 
-        # add help
-        add_parser = get_or_add_top_level_command(parser_manager,
-                                                  'add',
-                                                  'add',
-                                                  help=f'Add config sections to {project.get_section()}')
+        if is_command_selected('add'):
+            # add help
+            add_parser = get_or_add_top_level_command(parser_manager,
+                                                      'add',
+                                                      'add',
+                                                      help=f'Add config sections to {project.get_section()}')
 
-        add_subparser = parser_manager.get_or_add_subparser(add_parser,
-                                                            'add-command',
-                                                            help='add sections')
+            add_subparser = parser_manager.get_or_add_subparser(add_parser,
+                                                                'add-command',
+                                                                help='add sections')
 
-        add_help_parser = parser_manager.add_parser(add_subparser,
-                                                    'help',
-                                                    'add-help',
-                                                    help=f'Add help to {project.get_section()}')
+            add_help_parser = parser_manager.add_parser(add_subparser,
+                                                        'help',
+                                                        'add-help',
+                                                        help=f'Add help to {project.get_section()}')
 
-        add_help_parser.set_defaults(func=command_add_help)
+            add_help_parser.set_defaults(func=command_add_help)
 
-        add_help_parser.add_argument('--manpage',
-                                     action='store_true',
-                                     help='Add help as manpage')
+            add_help_parser.add_argument('--manpage',
+                                         action='store_true',
+                                         help='Add help as manpage')
 
-        add_help_parser.add_argument('name',
-                                     help='Command name for which to add help')
+            add_help_parser.add_argument('name',
+                                         help='Command name for which to add help')
 
-        add_help_parser.add_argument('text',
-                                     help='Help text')
+            add_help_parser.add_argument('text',
+                                         help='Help text')
 
-        # rm help
-        rm_parser = get_or_add_top_level_command(parser_manager,
-                                                  'rm',
-                                                  'rm',
-                                                  help=f'Remove config sections from {project.get_section()}')
+        if is_command_selected('rm'):
+            # rm help
+            rm_parser = get_or_add_top_level_command(parser_manager,
+                                                      'rm',
+                                                      'rm',
+                                                      help=f'Remove config sections from {project.get_section()}')
 
-        rm_subparser = parser_manager.get_or_add_subparser(rm_parser,
-                                                           'rm-command',
-                                                           help='remove sections')
+            rm_subparser = parser_manager.get_or_add_subparser(rm_parser,
+                                                               'rm-command',
+                                                               help='remove sections')
 
-        rm_help_parser = parser_manager.add_parser(rm_subparser,
-                                                   'help',
-                                                   'rm-help',
-                                                   help=f'Remove help from {project.get_section()}')
+            rm_help_parser = parser_manager.add_parser(rm_subparser,
+                                                       'help',
+                                                       'rm-help',
+                                                       help=f'Remove help from {project.get_section()}')
 
-        rm_help_parser.set_defaults(func=command_rm_help)
+            rm_help_parser.set_defaults(func=command_rm_help)
 
-        rm_help_parser.add_argument('--manpage',
-                                    action='store_true',
-                                    help='Add help as manpage')
+            rm_help_parser.add_argument('--manpage',
+                                        action='store_true',
+                                        help='Add help as manpage')
 
-        rm_help_parser.add_argument('name',
-                                    help='Command name for which to add help')
+            rm_help_parser.add_argument('name',
+                                        help='Command name for which to add help')
 
     def modify_arguments(self,
                          git,
@@ -298,5 +305,9 @@ class HelpPlugin(Plugin):
                          plugin_manager):
         """Register known plugins for 'git-project help.'"""
 
+        # Only the help command consults the registry.
+        if not is_command_selected('help'):
+            return
+
         for plugin in plugin_manager.iterplugins():
             _command_plugin_registry[plugin.name] = plugin
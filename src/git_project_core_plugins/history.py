@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+"""A record of every run that was executed.
+
+Each record is one line of JSON appended to a file in the project's state
+directory, so writers never need to read or rewrite what is already there and
+concurrent invocations do not clobber each other's records.
+
+"""
+
+from git_project_core_plugins.common import format_size, get_state_dir
+
+import json
+import os
+import resource
+import statistics
+import time
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a non-empty list of numbers.
+
+    values: The numbers to examine.
+
+    fraction: The percentile as a fraction between 0 and 1.
+
+    """
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+class RunHistory:
+    """An append-only log of executed runs."""
+
+    def __init__(self, git, project):
+        """RunHistory construction.
+
+        git: An object to query the repository.
+
+        project: The currently active Project.
+
+        """
+        self._path = get_state_dir(git, project) / 'history.jsonl'
+
+    def record(self, job, alias, name, worktree, commit):
+        """Append a record of a Job that has run.
+
+        job: The Job that ran.
+
+        alias: The run alias the job ran, for example ``build''.
+
+        name: The name of the run.
+
+        worktree: The name of the worktree the job ran in, or None.
+
+        commit: The commit checked out where the job ran, or None.
+
+        """
+        entry = {
+            'time': round(time.time(), 3),
+            'alias': alias,
+            'name': name,
+            'worktree': worktree,
+            'commit': commit,
+            'status': job.returncode,
+            'wall': round(job.duration(), 3),
+        }
+        if job.usage:
+            entry['user'] = round(job.usage.ru_utime, 3)
+            entry['sys'] = round(job.usage.ru_stime, 3)
+            # Linux reports kilobytes.  A child's peak includes what it
+            # inherited from this process before it exec'd its command, so
+            # keep our own peak as the floor below which maxrss means nothing.
+            entry['maxrss'] = job.usage.ru_maxrss * 1024
+            own = resource.getrusage(resource.RUSAGE_SELF)
+            entry['baseline'] = own.ru_maxrss * 1024
+        if job.counters:
+            entry['counters'] = job.counters
+        if job.returncode != 0 and job.tail:
+            entry['tail'] = [line.decode(errors='replace').rstrip('\n')
+                             for line in job.tail]
+
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+
+        # A single write to a file opened for appending lands in one piece.
+        fd = os.open(self._path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+    def iter_records(self, alias, name):
+        """Iterate over the records of a run, oldest first.
+
+        alias: The run alias to look for.
+
+        name: The name of the run to look for.
+
+        """
+        try:
+            with open(self._path) as historyfile:
+                for line in historyfile:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A partial line from an interrupted write.
+                        continue
+                    if entry.get('alias') == alias and entry.get('name') == name:
+                        yield entry
+        except FileNotFoundError:
+            return
+
+    def get_latest_by_worktree(self):
+        """Return a dict mapping each worktree name to its latest record."""
+        latest = {}
+        try:
+            with open(self._path) as historyfile:
+                for line in historyfile:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('worktree'):
+                        latest[entry['worktree']] = entry
+        except FileNotFoundError:
+            pass
+        return latest
+
+def print_stats(records, title, recent=10):
+    """Print timing percentiles and a trend for a list of run records.  Peak
+    memory is shown with the floor git-project's own memory puts under it,
+    since a run's peak counts what it inherited before starting its command.
+
+    records: A list of records from RunHistory.iter_records, oldest first.
+
+    title: The name of the run to show in the heading.
+
+    recent: The number of latest records to compare against earlier ones.
+
+    """
+    if not records:
+        print(f'No history for {title}')
+        return
+
+    walls = [entry['wall'] for entry in records]
+    failures = sum(1 for entry in records if entry['status'] != 0)
+
+    print(f'{title}: {len(records)} runs, {failures} failed')
+    print(f'  wall   p50 {percentile(walls, 0.5):.1f}s'
+          f'  p90 {percentile(walls, 0.9):.1f}s'
+          f'  max {max(walls):.1f}s')
+
+    cpus = [entry['user'] + entry['sys'] for entry in records
+            if 'user' in entry]
+    if cpus:
+        print(f'  cpu    p50 {percentile(cpus, 0.5):.1f}s'
+              f'  p90 {percentile(cpus, 0.9):.1f}s'
+              f'  max {max(cpus):.1f}s')
+
+    rss = [entry['maxrss'] for entry in records if 'maxrss' in entry]
+    if rss:
+        # A peak no higher than the baseline may be all inherited from
+        # git-project rather than used by the run itself.
+        baselines = [entry['baseline'] for entry in records if 'baseline' in entry]
+        floor = f'  floor {format_size(max(baselines))}' if baselines else ''
+        print(f'  memory p50 {format_size(percentile(rss, 0.5))}'
+              f'  max {format_size(max(rss))}{floor}')
+
+    counters = {}
+    for entry in records:
+        for counter, value in entry.get('counters', {}).items():
+            counters.setdefault(counter, []).append(value)
+    if counters:
+        print('  counters (p50 of profiled runs):')
+        for counter, values in sorted(counters.items()):
+            print(f'    {counter:<40} {percentile(values, 0.5):>16,.6g}')
+
+    if len(records) > recent:
+        before = statistics.median(walls[:-recent])
+        after = statistics.median(walls[-recent:])
+        change = (after - before) / before * 100 if before else 0.0
+        print(f'  trend  median of last {recent} {after:.1f}s'
+              f' vs {before:.1f}s before ({change:+.0f}%)')
+
+    print('  latest:')
+    for entry in records[-recent:]:
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['time']))
+        commit = (entry.get('commit') or '')[:10]
+        worktree = entry.get('worktree') or '-'
+        print(f'    {when}  {entry["wall"]:>7.1f}s  status {entry["status"]:<4}'
+              f'  {worktree}  {commit}')
@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+"""Run several fully-substituted commands at once.
+
+Commands are run via a shell just as RunnableConfigObject.run does, unless
+they contain no shell syntax at all, in which case they are executed directly
+to save starting a shell.  Each job's output is read line by line and printed
+with a prefix naming the job so that the output of concurrent jobs can be told
+apart.  Jobs may depend on other jobs, in which case a job is not started
+until everything it depends on has completed successfully.
+
+"""
+
+from git_project import GitProjectException
+
+from git_project_core_plugins.perf import parse_counter, parse_metric
+
+import collections
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import graphlib
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+# Characters with a special meaning to the shell.  Quotes and backslashes are
+# included so that splitting a command on whitespace matches the shell.
+_SHELL_CHARACTERS = frozenset('|&;<>()$`\\"\'*?[]#~{}!\n')
+
+# Words the shell handles itself even when a program of the same name exists.
+_SHELL_WORDS = frozenset(['.', 'alias', 'builtin', 'cd', 'command', 'eval',
+                          'exec', 'exit', 'export', 'hash', 'read', 'set',
+                          'source', 'time', 'trap', 'type', 'ulimit', 'umask',
+                          'unset', 'wait'])
+
+def get_argv(command):
+    """Return the argument list to execute command directly, or None if it needs a
+    shell: if it contains any shell syntax, starts with a shell builtin or
+    names a program that is not on the PATH.
+
+    command: The fully-substituted command string.
+
+    """
+    if _SHELL_CHARACTERS.intersection(command):
+        return None
+    argv = command.split()
+    if not argv or argv[0] in _SHELL_WORDS or '=' in argv[0]:
+        # Nothing to run, a builtin or a variable assignment.
+        return None
+    if not shutil.which(argv[0]):
+        return None
+    return argv
+
+class Cancellation:
+    """A means of stopping Jobs from another thread.  Each Job given the same
+    Cancellation runs in its own session so that cancelling it stops the
+    command along with everything the command started.
+
+    """
+
+    def __init__(self):
+        """Cancellation construction."""
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._processes = set()
+
+    def launch(self, args, **kwargs):
+        """Start a process and return its Popen, or None if the Cancellation has
+        already been cancelled.
+
+        args: The program and arguments, or a command string with shell set.
+
+        kwargs: Additional arguments for subprocess.Popen.
+
+        """
+        with self._lock:
+            if self.cancelled:
+                return None
+            proc = subprocess.Popen(args, start_new_session=True, **kwargs)
+            self._processes.add(proc)
+            return proc
+
+    def reap(self, proc):
+        """Wait for a process started by launch to exit and return its wait status
+        and resource usage.
+
+        proc: The Popen returned by launch.
+
+        """
+        # Wait without reaping so that the process ID cannot be reused by the
+        # time cancel signals it.
+        os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+        with self._lock:
+            self._processes.discard(proc)
+            _pid, status, usage = os.wait4(proc.pid, 0)
+        return status, usage
+
+    def cancel(self):
+        """Terminate every running Job and keep new ones from starting."""
+        with self._lock:
+            self.cancelled = True
+            for proc in self._processes:
+                try:
+                    os.killpg(proc.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass
+
+class Job:
+    """A substituted command to run alongside other commands."""
+
+    def __init__(self,
+                 name,
+                 command,
+                 cwd=None,
+                 up_to_date=False,
+                 prefix_output=True,
+                 log=None,
+                 tail=0,
+                 cancellation=None,
+                 direct=True,
+                 track=False,
+                 profiler=None):
+        """Job construction.
+
+        name: A name to identify the job in output.
+
+        command: The fully-substituted command string to pass to the shell.
+
+        cwd: The directory in which to run the command.  None means the current
+             directory.
+
+        up_to_date: Whether the job's inputs are unchanged since it last
+                    succeeded.  Such a job is skipped unless a job it depends
+                    on actually runs.
+
+        prefix_output: Whether to prefix each line of output with the job name.
+                       Otherwise the command writes directly to stdout and
+                       stderr, as RunnableConfigObject.run does.
+
+        log: A RotatingLog that receives a copy of the job's output, or None.
+
+        tail: The number of final lines of output to keep in memory for
+              reporting a failure.
+
+        cancellation: A Cancellation able to stop the job, or None.
+
+        direct: Whether the command may be executed without a shell when it
+                contains no shell syntax.
+
+        track: Whether to collect the metrics the command reports in its output.
+
+        profiler: A command template to wrap around the command, in which {cmd}
+                  is replaced by the command, or None.  The counters the
+                  profiler reports in the output are collected.
+
+        """
+        if profiler:
+            if direct and get_argv(command):
+                wrapped = command
+            else:
+                wrapped = 'sh -c ' + shlex.quote(command)
+            command = profiler.replace('{cmd}', wrapped)
+
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.up_to_date = up_to_date
+        self.prefix_output = prefix_output
+        self.log = log
+        self.tail = collections.deque(maxlen=tail)
+        self.cancellation = cancellation
+        self.direct = direct
+        self.track = track
+        self.metrics = {}
+        self.profiler = profiler
+        self.counters = {}
+        self.skipped = False
+        self.returncode = None
+        self.start_time = None
+        self.end_time = None
+        self.usage = None
+
+    def duration(self):
+        """Return the wall time the job took to run, or zero if it has not run."""
+        if self.start_time is None or self.end_time is None:
+            return 0.0
+        return self.end_time - self.start_time
+
+    def skip(self, output_lock):
+        """Mark the job as successfully completed without running it."""
+        with output_lock:
+            print(f'[{self.name}] up to date', flush=True)
+        self.skipped = True
+        self.returncode = 0
+
+    def run(self, output_lock=None):
+        """Run the job, printing each line of its output prefixed with the job name
+        unless prefix_output is off.  Return the command's exit status.  The
+        resource usage of the command and everything it waited for is left in
+        usage.
+
+        output_lock: A lock serializing writes to stdout among jobs, or None if
+                     the job runs by itself.
+
+        """
+        output_lock = output_lock or threading.Lock()
+        prefix = f'[{self.name}] ' if self.prefix_output else ''
+
+        with output_lock:
+            print(prefix + self.command, flush=True)
+        if self.log:
+            self.log.write(f'{prefix}{self.command}\n'.encode())
+
+        self.start_time = time.monotonic()
+
+        # Output is read through a pipe when it needs a prefix or copies,
+        # otherwise the command writes to the terminal directly.
+        tap = (self.prefix_output or self.log or self.tail.maxlen or
+               self.track or self.profiler)
+        streams = {}
+        if tap:
+            streams = {'stdout': subprocess.PIPE,
+                       'stderr': subprocess.STDOUT}
+        if self.prefix_output:
+            streams['stdin'] = subprocess.DEVNULL
+
+        argv = get_argv(self.command) if self.direct else None
+        args = argv or self.command
+
+        if self.cancellation:
+            proc = self.cancellation.launch(args,
+                                            shell=argv is None,
+                                            cwd=self.cwd,
+                                            **streams)
+            if proc is None:
+                self.returncode = -signal.SIGTERM
+                self.end_time = time.monotonic()
+                return self.returncode
+        else:
+            proc = subprocess.Popen(args,
+                                    shell=argv is None,
+                                    cwd=self.cwd,
+                                    **streams)
+
+        if tap:
+            encoded_prefix = prefix.encode()
+            for line in proc.stdout:
+                if not line.endswith(b'\n'):
+                    line += b'\n'
+                with output_lock:
+                    sys.stdout.write(prefix + line.decode(errors='replace'))
+                    sys.stdout.flush()
+                if self.log:
+                    self.log.write(encoded_prefix + line)
+                self.tail.append(line)
+                if self.track:
+                    metric = parse_metric(line)
+                    if metric:
+                        self.metrics[metric[0]] = metric[1]
+                if self.profiler:
+                    counter = parse_counter(line)
+                    if counter:
+                        self.counters[counter[0]] = counter[1]
+            proc.stdout.close()
+
+        # Reap the shell ourselves to get its resource usage, which includes
+        # the usage of the processes it waited for.
+        if self.cancellation:
+            status, self.usage = self.cancellation.reap(proc)
+        else:
+            _pid, status, self.usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+
+        self.returncode = proc.returncode
+        self.end_time = time.monotonic()
+        return self.returncode
+
+    def print_tail(self):
+        """Print the kept final lines of output to stderr, if any."""
+        if not self.tail:
+            return
+        print(f'Last {len(self.tail)} lines of {self.name}:', file=sys.stderr)
+        for line in self.tail:
+            print('  ' + line.decode(errors='replace').rstrip('\n'),
+                  file=sys.stderr)
+
+def _get_sorter(names, dependencies):
+    """Return a prepared TopologicalSorter over job names, raising
+    GitProjectException if the dependencies contain a cycle.
+
+    """
+    sorter = graphlib.TopologicalSorter()
+    for name in names:
+        sorter.add(name, *dependencies.get(name, ()))
+
+    try:
+        sorter.prepare()
+    except graphlib.CycleError as exception:
+        cycle = ' -> '.join(exception.args[1])
+        raise GitProjectException(f'Dependency cycle: {cycle}')
+
+    return sorter
+
+def get_max_ready(names, dependencies):
+    """Return the largest number of jobs that are ready to start at once when
+    every job takes the same time, raising GitProjectException if the
+    dependencies contain a cycle.
+
+    names: The names of the jobs.
+
+    dependencies: A mapping from job name to the names of jobs it depends on.
+
+    """
+    sorter = _get_sorter(names, dependencies)
+    widest = 0
+    while sorter.is_active():
+        ready = sorter.get_ready()
+        widest = max(widest, len(ready))
+        sorter.done(*ready)
+    return widest
+
+def get_critical_path(jobs, dependencies):
+    """Return the chain of jobs through the dependency graph with the largest total
+    run time, as a list of Jobs ordered from first to last.
+
+    jobs: A sequence of Job objects that have run.
+
+    dependencies: A mapping from job name to the names of jobs it depends on.
+
+    """
+    by_name = {job.name: job for job in jobs}
+    order = graphlib.TopologicalSorter(
+        {job.name: dependencies.get(job.name, ()) for job in jobs}).static_order()
+
+    # For each job, the longest time to finish it and its predecessor on the
+    # longest chain leading to it.
+    finish = {}
+    previous = {}
+    for name in order:
+        if name not in by_name:
+            continue
+        predecessors = [dep for dep in dependencies.get(name, ()) if dep in finish]
+        best = max(predecessors, key=lambda dep: finish[dep], default=None)
+        previous[name] = best
+        finish[name] = (finish[best] if best else 0.0) + by_name[name].duration()
+
+    if not finish:
+        return []
+
+    name = max(finish, key=lambda name: finish[name])
+    path = []
+    while name:
+        path.append(by_name[name])
+        name = previous[name]
+
+    return list(reversed(path))
+
+def print_summary(jobs, title='Job'):
+    """Print a table of each job's exit status and run time.
+
+    jobs: A sequence of Job objects that have been passed to run_jobs.
+
+    title: The heading of the job name column.
+
+    """
+    width = max([len(title)] + [len(job.name) for job in jobs])
+    print(f'{title:<{width}}  {"Status":>7}  {"Time":>8}')
+    for job in jobs:
+        if job.returncode is None:
+            status = 'not run'
+        elif job.skipped:
+            status = 'skipped'
+        else:
+            status = str(job.returncode)
+        print(f'{job.name:<{width}}  {status:>7}  {job.duration():>7.1f}s')
+
+# How often to look at the load again while jobs wait for it to drop.
+_LOAD_POLL_SECONDS = 1.0
+
+def run_jobs(jobs, max_jobs, dependencies=None, keep_going=False, scheduler=None):
+    """Run jobs concurrently, at most max_jobs at a time.  A job does not start
+    until all the jobs it depends on have succeeded.  Once a job fails no new
+    jobs are started unless keep_going is set.  Return an aggregate exit
+    status: zero if every job succeeded, otherwise the status of the first
+    failing job in the order given.
+
+    jobs: A sequence of Job objects.
+
+    max_jobs: The maximum number of jobs to run at once.  Ignored if scheduler
+              is given.
+
+    dependencies: A mapping from job name to the names of jobs it depends on.
+                  Every job is checked for cycles before any job starts.
+
+    keep_going: Whether to keep starting jobs that do not depend on a failed
+                job after a failure.
+
+    scheduler: An object whose can_launch(running) method decides whether
+               another job may start while running jobs are running, and
+               whose max_jobs attribute bounds the number of jobs at once.
+               Ready jobs wait, and the scheduler is asked again as jobs
+               finish and periodically while jobs wait.
+
+    """
+    dependencies = dependencies or {}
+    by_name = {job.name: job for job in jobs}
+    sorter = _get_sorter([job.name for job in jobs], dependencies)
+
+    if scheduler:
+        max_jobs = scheduler.max_jobs
+        can_launch = scheduler.can_launch
+    else:
+        max_jobs = max(1, max_jobs)
+        can_launch = lambda running: True
+
+    output_lock = threading.Lock()
+    stopped = False
+
+    with ThreadPoolExecutor(max_workers=max_jobs) as executor:
+        running = {}
+        # Jobs whose dependencies are done, waiting for capacity.
+        pending = []
+        while sorter.is_active():
+            skipped_any = False
+            if not stopped:
+                for name in sorter.get_ready():
+                    job = by_name[name]
+                    if job.up_to_date and all(by_name[dep].skipped for dep in
+                                              dependencies.get(name, ())):
+                        job.skip(output_lock)
+                        sorter.done(name)
+                        skipped_any = True
+                    else:
+                        pending.append(name)
+
+            if skipped_any:
+                # Skipping may have made more jobs ready.
+                continue
+
+            while (pending and not stopped and len(running) < max_jobs and
+                   can_launch(len(running))):
+                name = pending.pop(0)
+                running[executor.submit(by_name[name].run, output_lock)] = name
+
+            if not running:
+                break
+
+            timeout = _LOAD_POLL_SECONDS if pending and scheduler else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                if future.result() == 0:
+                    sorter.done(name)
+                elif not keep_going:
+                    stopped = True
+
+    if dependencies:
+        path = get_critical_path([job for job in jobs if job.returncode == 0],
+                                 dependencies)
+        if path:
+            chain = ' -> '.join(f'{job.name} ({job.duration():.1f}s)'
+                                for job in path)
+            total = sum(job.duration() for job in path)
+            print(f'Critical path: {chain} = {total:.1f}s')
+
+    failed = [job for job in jobs if job.returncode not in (None, 0)]
+    for job in failed:
+        print(f'{job.name} failed with exit status {job.returncode}',
+              file=sys.stderr)
+        job.print_tail()
+
+    skipped = [job.name for job in jobs if job.returncode is None]
+    if skipped:
+        print(f'Not run: {" ".join(skipped)}', file=sys.stderr)
+
+    return failed[0].returncode if failed else 0
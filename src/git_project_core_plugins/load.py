@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+"""Decide how many jobs the machine can take right now.
+
+The CPUs available to us are the fewest of those we may be scheduled on and
+those our cgroup's CPU quota pays for.  Other users' work shows up in the load
+average and in memory pressure stall information (PSI), both of which are
+checked before each new job starts.
+
+"""
+
+import math
+import os
+from pathlib import Path
+
+def _read_cgroup_quota(directory):
+    """Return the number of CPUs allowed by the cgroup quota in directory, or None
+    if it has no quota.
+
+    """
+    try:
+        # cgroup v2
+        quota, period = (directory / 'cpu.max').read_text().split()
+        if quota == 'max':
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        # cgroup v1
+        quota = int((directory / 'cpu.cfs_quota_us').read_text())
+        period = int((directory / 'cpu.cfs_period_us').read_text())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+def get_cgroup_cpu_quota(root=Path('/sys/fs/cgroup'), proc=Path('/proc/self')):
+    """Return the number of CPUs our cgroup and its ancestors allow, or None if
+    there is no limit.
+
+    root: Where the cgroup filesystem is mounted.
+
+    proc: The /proc directory of the process to check.
+
+    """
+    quotas = []
+    try:
+        lines = (proc / 'cgroup').read_text().splitlines()
+    except OSError:
+        lines = []
+
+    for line in lines:
+        _hierarchy, controllers, path = line.split(':', 2)
+        if controllers and 'cpu' not in controllers.split(','):
+            continue
+        base = root if not controllers else root / 'cpu'
+        directory = base / path.lstrip('/')
+        while True:
+            quota = _read_cgroup_quota(directory)
+            if quota is not None:
+                quotas.append(quota)
+            if directory == base or directory.parent == directory:
+                break
+            directory = directory.parent
+
+    return min(quotas) if quotas else None
+
+def get_cpu_limit():
+    """Return the number of CPUs we may use, at least one."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    quota = get_cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+
+    return max(1, cpus)
+
+def get_memory_pressure(path=Path('/proc/pressure/memory')):
+    """Return the share of the last ten seconds, as a percentage, during which
+    some task stalled waiting for memory, or None if the kernel does not
+    report it.
+
+    path: The PSI file to read.
+
+    """
+    try:
+        for line in path.read_text().splitlines():
+            fields = line.split()
+            if fields and fields[0] == 'some':
+                for field in fields[1:]:
+                    key, _, value = field.partition('=')
+                    if key == 'avg10':
+                        return float(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+class LoadScheduler:
+    """Decide whether another job may start, based on the CPUs available to us,
+    the load other processes put on them and memory pressure.
+
+    """
+
+    def __init__(self, pressure_limit=10.0):
+        """LoadScheduler construction.
+
+        pressure_limit: The memory pressure percentage above which no new job is
+                        started while another is running.
+
+        """
+        self.max_jobs = get_cpu_limit()
+        self._pressure_limit = pressure_limit
+
+    def can_launch(self, running):
+        """Return whether a job may start while running jobs are running.  A job may
+        always start when none are running, so that work always progresses.
+
+        running: The number of our jobs currently running.
+
+        """
+        if running == 0:
+            return True
+        if running >= self.max_jobs:
+            return False
+
+        pressure = get_memory_pressure()
+        if pressure is not None and pressure > self._pressure_limit:
+            return False
+
+        # Our own jobs contribute to the load average, so only count the rest
+        # against the CPUs we have.
+        others = max(0.0, os.getloadavg()[0] - running)
+        return running < self.max_jobs - others
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Performance measurements tied to commits.
+
+Measurements of tracked runs are kept in git notes on the commit that was
+checked out when the run executed, under a notes ref for the project.  Notes
+can be pushed and fetched like any other ref, so the measurements travel with
+the repository.  Each note is a JSON object mapping <alias>.<name> to a list
+of the latest samples, each holding the wall time and any metrics the command
+printed.
+
+A command reports a metric by printing a line of the form:
+
+  git-project-metric: <name>=<number>
+
+Counters reported by profilers wrapped around a command, such as perf stat -x
+and /usr/bin/time -v, are parsed from its output the same way, one line at a
+time.
+
+"""
+
+from git_project import GitProjectException
+
+import json
+import re
+import statistics
+import subprocess
+import time
+
+# The number of samples kept per run and commit.
+_MAX_SAMPLES = 10
+
+# The number of earlier commits whose median is the baseline for a commit.
+_BASELINE_COMMITS = 5
+
+_METRIC_RE = re.compile(rb'^git-project-metric:\s*([A-Za-z0-9_.-]+)\s*=\s*([-+0-9.eE]+)\s*$')
+
+def parse_metric(line):
+    """Return the name and value of a metric reported on a line of output, or None
+    if the line does not report one.
+
+    line: A line of output as bytes.
+
+    """
+    match = _METRIC_RE.match(line.rstrip(b'\r\n'))
+    if not match:
+        return None
+    try:
+        return match.group(1).decode(), float(match.group(2))
+    except ValueError:
+        return None
+
+# perf stat -x, prints <value>,<unit>,<event>,<run time>,<percentage>,...
+_PERF_STAT_RE = re.compile(r'^([0-9.]+|<not counted>|<not supported>),([^,]*),([A-Za-z][^,]*),')
+
+def _parse_counter_value(text):
+    """Return the number in a profiler's counter value, which may be a percentage
+    or a time in [h:]m:s form, or None if it is not a number."""
+    text = text.strip().rstrip('%')
+    seconds = 0.0
+    try:
+        for part in text.split(':'):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return None
+    return seconds
+
+def parse_counter(line):
+    """Return the name and value of a counter reported by perf stat -x or
+    /usr/bin/time -v on a line of output, or None if the line does not report
+    one.
+
+    line: A line of output as bytes.
+
+    """
+    text = line.decode(errors='replace').rstrip('\r\n')
+
+    match = _PERF_STAT_RE.match(text)
+    if match:
+        try:
+            return match.group(3), float(match.group(1))
+        except ValueError:
+            # The event was not counted.
+            return None
+
+    # time -v prints tab-indented "<description>: <value>" lines, where the
+    # description may itself contain colons.
+    if text.startswith('\t'):
+        name, separator, value = text.strip().rpartition(': ')
+        if separator:
+            value = _parse_counter_value(value)
+            if value is not None:
+                return re.sub('[^a-z0-9]+', '_', name.lower()).strip('_'), value
+
+    return None
+
+class PerfNotes:
+    """Measurements of runs stored in git notes."""
+
+    def __init__(self, git, project):
+        """PerfNotes construction.
+
+        git: An object to query the repository.
+
+        project: The currently active Project.
+
+        """
+        self._git_dir = git.get_git_common_dir()
+        self.ref = f'refs/notes/{project.get_section()}/perf'
+
+    def _git(self, *args, input=None, check=True):
+        """Run a git command on the repository and return its standard output.
+        Raise GitProjectException with git's message if check is set and the
+        command fails.
+
+        """
+        result = subprocess.run(['git', '--git-dir', self._git_dir, *args],
+                                input=input,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        if check and result.returncode != 0:
+            message = result.stderr.decode(errors='replace').strip()
+            raise GitProjectException(f'git {" ".join(args)} failed: {message}')
+        return result.stdout
+
+    def _read(self, commit):
+        """Return the measurements recorded for a commit."""
+        text = self._git('notes', '--ref', self.ref, 'show', commit, check=False)
+        try:
+            return json.loads(text) if text else {}
+        except ValueError:
+            return {}
+
+    def record(self, commit, key, wall, metrics, dirty):
+        """Add a sample to the note of a commit.
+
+        commit: The commit that was checked out.
+
+        key: The run, as <alias>.<name>.
+
+        wall: The wall time of the run in seconds.
+
+        metrics: A dict mapping metric names reported by the run to values.
+
+        dirty: Whether the workarea had uncommitted changes.
+
+        """
+        entries = self._read(commit)
+        sample = {'time': round(time.time(), 3), 'wall': round(wall, 3)}
+        if metrics:
+            sample['metrics'] = metrics
+        if dirty:
+            sample['dirty'] = True
+        samples = entries.setdefault(key, [])
+        samples.append(sample)
+        del samples[:-_MAX_SAMPLES]
+
+        self._git('notes', '--ref', self.ref, 'add', '-f', '-F', '-', commit,
+                  input=json.dumps(entries, sort_keys=True).encode())
+
+    def iter_commits(self, revisions):
+        """Iterate over the commits of a revision range, oldest first, yielding the
+        short id, subject and the measurements recorded for each.
+
+        revisions: A revision range such as HEAD~20..HEAD, or None for the most
+                   recent commits reachable from HEAD.
+
+        """
+        args = [revisions] if revisions else ['-n', '50', 'HEAD']
+        log = self._git('log', '--reverse', '--format=%H%x00%h%x00%s', *args)
+
+        # Read all notes at once rather than one process per commit.
+        notes = {}
+        listing = self._git('notes', '--ref', self.ref, 'list', check=False)
+        for line in listing.decode().splitlines():
+            blob, commit = line.split()
+            notes[commit] = blob
+
+        contents = {}
+        if notes:
+            output = self._git('cat-file', '--batch',
+                               input='\n'.join(notes.values()).encode() + b'\n')
+            offset = 0
+            while offset < len(output):
+                end = output.index(b'\n', offset)
+                blob, _kind, size = output[offset:end].split()
+                start = end + 1
+                contents[blob.decode()] = output[start:start + int(size)]
+                offset = start + int(size) + 1
+
+        for line in log.decode(errors='replace').splitlines():
+            commit, short, subject = line.split('\0', 2)
+            entries = {}
+            if commit in notes:
+                try:
+                    entries = json.loads(contents[notes[commit]])
+                except ValueError:
+                    pass
+            yield short, subject, entries
+
+def _change(value, baseline):
+    """Return the relative change of value from baseline as a percentage."""
+    return (value - baseline) / baseline * 100 if baseline else 0.0
+
+def print_perf_log(commits, key, threshold):
+    """Print a table of the measurements of a run across commits, flagging commits
+    where the run became slower than the median of the commits before it by
+    more than threshold percent.
+
+    commits: The tuples yielded by PerfNotes.iter_commits.
+
+    key: The run, as <alias>.<name>.
+
+    threshold: The percentage slowdown to flag.
+
+    """
+    print(key)
+    print(f'{"commit":<10}  {"wall":>9}  {"change":>7}  {"":<10}  {"subject":<40}  metrics')
+
+    history = []
+    metric_history = {}
+    regressions = 0
+    for short, subject, entries in commits:
+        samples = entries.get(key)
+        if not samples:
+            continue
+
+        wall = statistics.median(sample['wall'] for sample in samples)
+        dirty = '*' if any(sample.get('dirty') for sample in samples) else ' '
+
+        change = ''
+        flag = ''
+        if history:
+            baseline = statistics.median(history[-_BASELINE_COMMITS:])
+            percent = _change(wall, baseline)
+            change = f'{percent:+.0f}%'
+            if percent > threshold:
+                flag = 'REGRESSION'
+                regressions += 1
+        history.append(wall)
+
+        metrics = {}
+        for sample in samples:
+            for name, value in sample.get('metrics', {}).items():
+                metrics.setdefault(name, []).append(value)
+        described = []
+        for name, values in sorted(metrics.items()):
+            value = statistics.median(values)
+            earlier = metric_history.setdefault(name, [])
+            text = f'{name}={value:g}'
+            if earlier:
+                text += f' ({_change(value, statistics.median(earlier[-_BASELINE_COMMITS:])):+.0f}%)'
+            earlier.append(value)
+            described.append(text)
+
+        print(f'{short:<10}{dirty} {wall:>8.1f}s  {change:>7}  {flag:<10}  '
+              f'{subject[:40]:<40}  {" ".join(described)}'.rstrip())
+
+    if not history:
+        print('  no measurements')
+    elif regressions:
+        print(f'{regressions} regressions beyond {threshold:g}%')
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""A pool of checked-out worktrees kept ready for worktree add.
+
+A full checkout of a large repository can take minutes.  The pool keeps
+detached worktrees checked out in advance, in the project's state directory.
+worktree add claims one by moving it into place, renaming its administrative
+directory under the git common directory to the new worktree's name and
+checking out the requested branch, which only touches the files that differ.
+
+Each pool entry is a worktree directory <name> with a marker file <name>.ready
+beside it, created once the checkout is complete.  Removing the marker claims
+the entry, so two claims never get the same worktree.  The number of
+worktrees to keep ready is kept in the pool's size file.
+
+"""
+
+from git_project import GitProjectException
+
+from git_project_core_plugins.common import get_state_dir
+
+import fcntl
+import os
+from pathlib import Path
+import secrets
+import subprocess
+import sys
+
+class WorktreePool:
+    """A set of ready worktrees for one project."""
+
+    def __init__(self, root, git_common_dir):
+        """WorktreePool construction.
+
+        root: The directory holding the pool's worktrees.
+
+        git_common_dir: The common git directory of the repository.
+
+        """
+        self._root = Path(root)
+        self._git_common_dir = str(git_common_dir)
+
+    def _git(self, *args, cwd=None):
+        """Run a git command on the repository, or in cwd if given, and return its
+        standard output.
+
+        """
+        if cwd is None:
+            args = ('-C', self._git_common_dir) + args
+        result = subprocess.run(['git', *args],
+                                cwd=cwd,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            message = result.stderr.decode(errors='replace').strip()
+            raise GitProjectException(f'git {" ".join(args)} failed: {message}')
+        return result.stdout
+
+    def _lock(self, operation):
+        """Open and lock the pool's lock file, returning the file to close to
+        unlock.
+
+        """
+        self._root.mkdir(parents=True, exist_ok=True)
+        lockfile = open(self._root / '.lock', 'w')
+        fcntl.flock(lockfile, operation)
+        return lockfile
+
+    def iter_ready(self):
+        """Iterate over the paths of the worktrees ready to be claimed."""
+        try:
+            markers = sorted(self._root.glob('*.ready'))
+        except FileNotFoundError:
+            return
+        for marker in markers:
+            yield marker.with_suffix('')
+
+    def get_size(self):
+        """Return the number of worktrees the pool keeps ready."""
+        try:
+            return int((self._root / 'size').read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def list(self):
+        """Return the paths of the ready worktrees, waiting for any fill in progress
+        to finish.
+
+        """
+        with self._lock(fcntl.LOCK_SH):
+            return list(self.iter_ready())
+
+    def fill(self, size=None):
+        """Add or remove worktrees until size of them are ready.  New worktrees check
+        out the commit at the repository's HEAD.
+
+        size: The number of worktrees to keep ready from now on, or None to keep
+              the current size.
+
+        """
+        with self._lock(fcntl.LOCK_EX):
+            if size is None:
+                size = self.get_size()
+            else:
+                (self._root / 'size').write_text(f'{size}\n')
+
+            ready = list(self.iter_ready())
+
+            for path in ready[size:]:
+                try:
+                    path.with_suffix('.ready').unlink()
+                except FileNotFoundError:
+                    # Claimed in the meantime.
+                    continue
+                self._git('worktree', 'remove', '--force', str(path))
+
+            if len(ready) >= size:
+                return
+
+            commit = self._git('rev-parse', 'HEAD').decode().strip()
+            for _index in range(size - len(ready)):
+                path = self._root / f'pool-{secrets.token_hex(4)}'
+                print(f'Checking out {path}', flush=True)
+                self._git('worktree', 'add', '--detach', '--quiet', str(path), commit)
+                path.with_suffix('.ready').touch()
+
+    def fill_in_background(self):
+        """Start a detached process to fill the pool, logging to a file in the pool
+        directory.
+
+        """
+        self._root.mkdir(parents=True, exist_ok=True)
+        with open(self._root / 'fill.log', 'ab') as logfile:
+            subprocess.Popen([sys.executable,
+                              '-c',
+                              'from git_project_core_plugins.pool import main; main()',
+                              str(self._root),
+                              self._git_common_dir],
+                             stdin=subprocess.DEVNULL,
+                             stdout=logfile,
+                             stderr=logfile,
+                             start_new_session=True)
+
+    def _move(self, path, admin, new_path, new_admin):
+        """Move a worktree and its administrative directory, updating the links
+        between them.
+
+        path: The worktree directory.
+
+        admin: The worktree's administrative directory.
+
+        new_path: Where to move the worktree directory.
+
+        new_admin: Where to move the administrative directory.
+
+        """
+        os.rename(path, new_path)
+        try:
+            os.rename(admin, new_admin)
+        except OSError:
+            os.rename(new_path, path)
+            raise
+        (Path(new_path) / '.git').write_text(f'gitdir: {new_admin}\n')
+        (Path(new_admin) / 'gitdir').write_text(f'{Path(new_path) / ".git"}\n')
+
+    def claim(self, name, path, committish):
+        """Move a ready worktree to path, register it as worktree name and check out
+        committish in it.  Return whether a worktree was claimed.
+
+        name: The name of the new worktree.
+
+        path: The path of the new worktree, which must not exist.
+
+        committish: The branch or commit to check out.
+
+        """
+        admin_root = Path(self._git_common_dir) / 'worktrees'
+        if (admin_root / name).exists():
+            raise GitProjectException(f'Worktree {name} already exists')
+        if os.path.lexists(path):
+            return False
+
+        for entry in self.iter_ready():
+            try:
+                entry.with_suffix('.ready').unlink()
+            except FileNotFoundError:
+                # Another worktree add claimed it first.
+                continue
+
+            # The administrative directory is usually, but not always, named
+            # after the worktree directory.
+            gitfile = (entry / '.git').read_text()
+            admin = Path(gitfile.removeprefix('gitdir:').strip())
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            try:
+                self._move(entry, admin, path, admin_root / name)
+            except OSError:
+                # Most likely path is on another filesystem.
+                entry.with_suffix('.ready').touch()
+                return False
+
+            try:
+                self._git('checkout', '--quiet', committish, '--', cwd=path)
+            except GitProjectException:
+                # Put the worktree back and drop it, so that worktree add
+                # creates one the usual way and reports any error itself.
+                self._move(path, admin_root / name, entry, admin)
+                self._git('worktree', 'remove', '--force', str(entry))
+                return False
+            return True
+
+        return False
+
+def get_pool(git, project):
+    """Return the WorktreePool of a project.
+
+    git: An object to query the repository.
+
+    project: The currently active Project.
+
+    """
+    return WorktreePool(get_state_dir(git, project) / 'pool',
+                        git.get_git_common_dir())
+
+def main():
+    """Fill a pool, taking its directory and the common git directory from the
+    command line.
+
+    """
+    root, git_common_dir = sys.argv[1:3]
+    WorktreePool(root, git_common_dir).fill()
@@ -32,10 +32,317 @@ git-project run <name>
 
 from git_project import ConfigObject, RunnableConfigObject, Plugin, Project
 from git_project import get_or_add_top_level_command, GitProjectException
+from git_project import capture_command
 
+from git_project_core_plugins.artifact import Artifact
+from git_project_core_plugins.bench import Benchmark, print_results
+from git_project_core_plugins.cache import OutputCache, RunFingerprints
 from git_project_core_plugins.common import add_plugin_version_argument
+from git_project_core_plugins.common import get_config_snapshot
+from git_project_core_plugins.common import get_startup_cache
+from git_project_core_plugins.common import invalidate_config
+from git_project_core_plugins.common import is_command_selected
+from git_project_core_plugins.common import parse_size
+from git_project_core_plugins.history import RunHistory, print_stats
+from git_project_core_plugins.jobs import Cancellation, Job, get_max_ready
+from git_project_core_plugins.jobs import print_summary, run_jobs
+from git_project_core_plugins.load import LoadScheduler
+from git_project_core_plugins.perf import PerfNotes, print_perf_log
+from git_project_core_plugins.runlog import RotatingLog
+from git_project_core_plugins.watch import get_watcher
+from git_project_core_plugins.worktree import get_cache_dir
+from git_project_core_plugins.worktree import iter_worktrees
 
 import argparse
+import hashlib
+import itertools
+import os
+from pathlib import Path
+import subprocess
+import threading
+
+def _parse_jobs(value):
+    """Convert a --jobs argument to a job count, with zero meaning ``auto''.
+
+    value: The argument string.
+
+    """
+    if value == 'auto':
+        return 0
+    try:
+        jobs = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid job count: {value}')
+    if jobs < 1:
+        raise argparse.ArgumentTypeError(f'invalid job count: {value}')
+    return jobs
+
+def _parse_tail(value):
+    """Convert a --tail argument to a line count.
+
+    value: The argument string.
+
+    """
+    try:
+        lines = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid line count: {value}')
+    if lines < 0:
+        raise argparse.ArgumentTypeError(f'invalid line count: {value}')
+    return lines
+
+def _get_scheduler(jobs):
+    """Return a LoadScheduler if jobs asks for ``auto'', otherwise None.
+
+    jobs: The job count from _parse_jobs.
+
+    """
+    return LoadScheduler() if jobs == 0 else None
+
+def _get_option_formats(options):
+    """Return the substitution formats derived from extra command-line options.
+
+    options: A list of extra option strings given to a run.
+
+    """
+    translation_table = dict.fromkeys(map(ord, '{}'), None)
+
+    option_names = ' '.join(options)
+    option_names = option_names.translate(translation_table)
+    option_key = '-'.join(options)
+    option_key = option_key.translate(translation_table)
+
+    return {
+        'options': ' '.join(options),
+        'option_names': option_names,
+        'option_key': option_key,
+        'option_keysep': '-' if len(options) > 0 else ''
+    }
+
+def _get_base_formats(git, project):
+    """Return the substitution formats every run sees, which a config key of the
+    same name overrides.
+
+    """
+    return {'cachedir': str(get_cache_dir(git, project))}
+
+def _get_matrix(options):
+    """Return the combinations of options described by a matrix: groups of
+    comma-separated values with groups separated by ``x''.  For example
+    ``asan,ubsan x clang,gcc'' yields four combinations of two options each.
+
+    options: A list of extra option strings given to a run.
+
+    """
+    groups = [[]]
+    for option in options:
+        if option == 'x':
+            groups.append([])
+        else:
+            groups[-1].extend(value for value in option.split(',') if value)
+
+    if not all(groups):
+        raise GitProjectException(f'Empty group in matrix "{" ".join(options)}"')
+
+    return [list(combination) for combination in itertools.product(*groups)]
+
+def _expand_matrix(targets, dependencies, combinations, base_formats=None):
+    """Return a copy of a run graph for each combination of options, along with
+    the substitution formats for each run.  With a single combination the
+    graph is unchanged, otherwise each run's key is suffixed with the
+    combination's option key.
+
+    targets: A dict mapping target keys to runs.
+
+    dependencies: A dict mapping target keys to the keys they depend on.
+
+    combinations: A list of lists of extra option strings.
+
+    base_formats: Substitution formats common to every combination, or None.
+
+    """
+    base_formats = base_formats or {}
+    if len(combinations) == 1:
+        formats = dict(base_formats, **_get_option_formats(combinations[0]))
+        return targets, dependencies, {key: formats for key in targets}
+
+    expanded_targets = {}
+    expanded_dependencies = {}
+    expanded_formats = {}
+    for combination in combinations:
+        formats = dict(base_formats, **_get_option_formats(combination))
+
+        def expand(key):
+            return f'{key}:{formats["option_key"]}'
+
+        for key, run in targets.items():
+            expanded_targets[expand(key)] = run
+            expanded_formats[expand(key)] = formats
+        for key, keys in dependencies.items():
+            expanded_dependencies[expand(key)] = {expand(dep) for dep in keys}
+
+    return expanded_targets, expanded_dependencies, expanded_formats
+
+def _get_inputs_digest(git):
+    """Return a digest of the inputs of the current worktree: the tree of HEAD and
+    the path, status, size and modification time of each dirty file.
+
+    """
+    digest = hashlib.sha256()
+    digest.update(str(git.get_committish_commit('HEAD').tree_id).encode())
+
+    if git.is_bare_repository():
+        return digest.hexdigest()
+
+    root = Path(git.get_working_copy_root())
+    status = capture_command(['git', '-C', str(root), 'status',
+                              '--porcelain=v1', '-z', '--untracked-files=all'])
+
+    # Entries look like "XY path", with an extra original path entry following
+    # renames and copies.
+    entries = iter(status.decode(errors='surrogateescape').split('\0'))
+    for entry in entries:
+        if not entry:
+            continue
+        code, path = entry[:2], entry[3:]
+        if 'R' in code or 'C' in code:
+            next(entries, None)
+        digest.update(f'{code} {path}\0'.encode(errors='surrogateescape'))
+        try:
+            stat = os.lstat(root / path)
+            digest.update(f'{stat.st_size} {stat.st_mtime_ns}\0'.encode())
+        except FileNotFoundError:
+            digest.update(b'deleted\0')
+
+    return digest.hexdigest()
+
+def _get_fingerprint(inputs, command):
+    """Combine an inputs digest with a substituted command to form a run
+    fingerprint.
+
+    """
+    digest = hashlib.sha256()
+    digest.update(inputs.encode())
+    digest.update(b'\0')
+    digest.update(command.encode())
+    return digest.hexdigest()
+
+def _get_cache_key(git, command, outputs):
+    """Return the output cache key for a run: the tree of HEAD and the substituted
+    command.  The current worktree's root and the output paths are replaced by
+    placeholders so that the same run in another worktree has the same key.
+
+    """
+    replacements = [(output, f'<output{index}>')
+                    for index, output in enumerate(outputs)]
+    if not git.is_bare_repository():
+        replacements.append((str(git.get_working_copy_root()), '<worktree>'))
+
+    # Replace longer paths first as outputs are often under the worktree.
+    for text, placeholder in sorted(replacements,
+                                    key=lambda item: len(item[0]),
+                                    reverse=True):
+        command = command.replace(text, placeholder)
+
+    digest = hashlib.sha256()
+    digest.update(str(git.get_committish_commit('HEAD').tree_id).encode())
+    digest.update(b'\0')
+    digest.update(command.encode())
+    return digest.hexdigest()
+
+def _get_fingerprints(git, project):
+    """Return the RunFingerprints of the active worktree if there is one,
+    otherwise of the project.
+
+    """
+    scope = project.get_scope('worktree')
+    return RunFingerprints(git, project, scope.get_ident() if scope else None)
+
+def _get_fingerprint_key(run, formats):
+    """Return the key of the fingerprint of a run with the given substitution
+    formats, so that each combination of options is tracked separately.
+
+    """
+    key = f'{run.get_subsection()}.{run.get_ident()}'
+    if formats['option_key']:
+        key += f':{formats["option_key"]}'
+    return key
+
+def _get_perf_key(run, key):
+    """Return the key under which the measurements of a tracked run are noted:
+    <alias>.<name>, followed by :<option key> for a combination of a matrix.
+
+    run: The run that was measured.
+
+    key: The run's target key, which names a run of another alias by
+         <alias>.<name>.
+
+    """
+    name = f'{run.get_subsection()}.{run.get_ident()}'
+    for prefix in (name, run.get_ident()):
+        if key == prefix or key.startswith(f'{prefix}:'):
+            return name + key[len(prefix):]
+    return name
+
+def _is_set(run, key):
+    """Return whether a run's boolean config key is set to a true value."""
+    value = getattr(run, key, None)
+    return bool(value) and value.lower() in ('true', 'yes', 'on', '1')
+
+def _is_direct(run):
+    """Return whether a run's command may be executed without a shell when it has
+    no shell syntax.  Setting the run's ``shell'' key to true always uses a
+    shell.
+
+    """
+    return not _is_set(run, 'shell')
+
+def _is_tracked(run):
+    """Return whether a run's measurements are recorded in the perf notes, which
+    setting its ``track'' key to true requests.
+
+    """
+    return _is_set(run, 'track')
+
+def _get_job_options(project, run, output):
+    """Return the keyword arguments for a Job running a run.
+
+    output: Keyword arguments controlling where each Job's output goes, along
+            with ``profile'', whether to wrap the command in its profiler.
+
+    """
+    options = dict(output)
+    profiler = None
+    if options.pop('profile', False):
+        profiler = getattr(run, 'profiler', None) or getattr(project, 'profiler', None)
+        if not profiler:
+            raise GitProjectException(f'No profiler configured for {run.get_ident()}')
+    return dict(options,
+                direct=_is_direct(run),
+                track=_is_tracked(run),
+                profiler=profiler)
+
+def _is_dirty(git, job):
+    """Return whether the workarea a Job ran in has uncommitted changes."""
+    if job.cwd is None:
+        return not git.workarea_is_clean()
+    status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                            cwd=job.cwd,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    return bool(status.stdout.strip())
+
+def _get_head_commit(git):
+    """Return the id of the commit at HEAD, or None if there is none."""
+    try:
+        return str(git.get_committish_commit('HEAD').id)
+    except Exception:
+        return None
+
+def _get_worktree_name(project):
+    """Return the name of the active worktree scope, or None."""
+    scope = project.get_scope('worktree')
+    return scope.get_ident() if scope else None
 
 class RunConfig(ConfigObject):
     """A ConfigObject to manage run aliases."""
@@ -98,10 +405,30 @@ class RunPlugin(Plugin):
       git <project> add run <name> <command>
       git <project> run --make-alias <name>
       git <project> run <name>
+      git <project> run [--jobs N] <name> <name>...
+      git <project> run --incremental <name>
+      git <project> run --cache <name>
+      git <project> run --all-worktrees [--jobs N] <name>
+      git <project> run --stats <name>
+      git <project> run --perf-log <name> [<range>]
+      git <project> run --bench [--warmup W] [--runs N] [--worktree NAME]... <name>...
+      git <project> run --log <file> --tail N <name>
+      git <project> run --profile <name>
+      git <project> run --watch <name>
+      git <project> run --matrix <name> -- <value>,<value> x <value>,<value>
 
     Full shell substitution is supported, as well as config {key} substitution,
     where the text ``{key}'' is replaced by key's value.
 
+    A command that contains no shell syntax (no quotes, variables, globs,
+    redirections, pipes or the like) and names a program on the PATH is executed
+    directly rather than through the shell, which saves starting a shell for
+    short commands that run often.  To always use the shell, for example for a
+    command that relies on the shell's startup files, set the run's
+    ``shell'' key:
+
+      git <project> config build.lint.shell true
+
     The add run command associates a command string with a name.  The run
     command itself invokes the command string via a shell.  With --make-alias,
     the run comand instead registers an alternative name for ``run.''  For
@@ -147,6 +474,158 @@ class RunPlugin(Plugin):
     For example the worktree plugin adds a ``worktree'' scope.  The worktree may
     contain key values that override similar keys in the project config.
 
+    Several names may be given to run more than one command:
+
+      git <project> build --jobs 3 debug release check
+
+    Leading arguments that name registered commands are all run, the rest are
+    passed as options to each of them.  With --jobs N, up to N commands run at
+    once and each line of output is prefixed with the name of the command that
+    produced it.  The exit status is that of the first command (in command-line
+    order) that failed, or zero if all succeeded.  Without --jobs, commands run
+    one after another, stopping at the first failure.
+
+    A run may depend on other runs via its ``depends'' key, which holds either
+    a run name of the same alias or <alias>.<name>:
+
+      git <project> config --add build.check.depends build.release
+      git <project> config --add build.release.depends configure.release
+      git <project> build --jobs 4 check
+
+    Invoking a run first runs everything it depends on, directly or
+    indirectly.  Runs whose dependencies have completed are started together,
+    up to the --jobs limit, and a run is not started if anything it depends on
+    failed.  Dependency cycles are reported before anything runs.  When all is
+    done, the chain of dependent runs that took the longest (the critical path)
+    is printed.  Without --jobs, a graph of runs is run as with --jobs auto if
+    any of its runs could run at the same time, and one run at a time
+    otherwise.
+
+    With --jobs auto, the number of commands run at once follows the machine.
+    At most as many run as there are CPUs this process may be scheduled on,
+    further limited by any CPU quota of its cgroup.  Before each command
+    starts, the load average left by other processes is subtracted from that,
+    and no command starts while the kernel reports memory pressure above 10%.
+    One command is always allowed to run so that work never stalls.
+
+    With --matrix, the options after the run names describe a set of
+    combinations rather than a single set of options.  Values separated by
+    commas form a group, groups are separated by ``x'' and the run is executed
+    once for each combination of one value from each group:
+
+      git <project> build --matrix release -- asan,ubsan x clang,gcc
+
+    runs release four times, with options ``asan clang'', ``asan gcc'', ``ubsan
+    clang'' and ``ubsan gcc''.  Each combination gets its own {options},
+    {option_names} and {option_key}, so a builddir such as
+    {path}/build{option_keysep}{option_key} is distinct for each.  Runs are
+    named <name>:<option_key> in output and everything a run depends on is run
+    once per combination.  Unless --jobs is given, combinations run as with
+    --jobs auto.
+
+    With --incremental, a run is skipped if nothing it could depend on has
+    changed since it last succeeded in the current worktree.  A run's
+    fingerprint covers the tree of HEAD, the names and timestamps of all
+    modified and untracked files and the fully-substituted command.  Fingerprints
+    are recorded in the project's state directory, separately for each
+    worktree, each time a run succeeds.  A run that depends on another run
+    which was not skipped is never skipped.
+
+    With --cache, the outputs of a run are kept in a cache shared by all
+    worktrees.  A run's outputs are the artifacts registered for it:
+
+      git <project> artifact add build.release "{builddir}"
+
+    When the workarea is clean and the cache holds outputs produced from the
+    same tree by the same command, they are copied into place instead of
+    running the command.  Paths under the worktree and the output paths
+    themselves are ignored when comparing commands, so a new worktree of an
+    already-built commit gets its outputs from the cache on its first run.  The
+    cache is limited to the size in the project's ``outputcachesize'' key
+    (10G by default), evicting the least-recently-used outputs first.
+
+    With --all-worktrees, the command runs in each registered worktree.  Each
+    worktree's command is substituted with that worktree's scope, so {path},
+    {worktree}, {branch} and any keys the worktree overrides refer to it, and
+    runs with the worktree as its current directory.  Up to --jobs worktrees
+    run at once.  A failure in one worktree does not stop the others.  A table
+    of each worktree's exit status and run time is printed at the end.
+
+    Every run that executes is recorded in a history file in the project's
+    state directory (under the git common directory, not in the git config):
+    its wall time, user and system CPU time, peak memory, exit status,
+    worktree and commit.  With --stats, the run is not executed; instead the
+    percentiles of its recorded times and memory, the trend of recent runs
+    against earlier ones and its latest runs are shown:
+
+      git <project> build --stats all
+
+    A run's peak memory counts the memory of git-project itself, which the run
+    inherits before it starts its command, so the memory line also shows that
+    floor.  A peak at or below the floor says nothing about the run.
+
+    A run whose ``track'' key is true also records its measurements with the
+    commit it ran on, in git notes under refs/notes/<project>/perf.  Each time
+    it succeeds, its wall time is added to the note of the commit at HEAD,
+    along with any metrics the command printed as lines of the form:
+
+      git-project-metric: <name>=<number>
+
+    Runs in a workarea with uncommitted changes are marked as dirty.  Because
+    the notes are an ordinary ref, they can be pushed and fetched to share
+    measurements.  A tracked run's output is read through a pipe to find its
+    metrics.  With --perf-log, the run is not executed; instead its median
+    wall time and metrics for each commit in a revision range (the latest 50
+    commits by default) are tabulated, oldest first, with the change from the
+    median of the commits before it.  A commit where the run became slower by
+    more than the project's ``perfthreshold'' key (10 percent by default) is
+    flagged as a regression:
+
+      git <project> config build.all.track true
+      git <project> build --perf-log all v1.0..HEAD
+
+    With --bench, the run's substituted command is timed instead of run once.
+    It is run W times (--warmup, zero by default) to warm caches and then N
+    times (--runs, ten by default) with its output discarded.  The mean,
+    standard deviation, median, minimum and maximum wall and CPU times are
+    printed, along with any runs far slower or faster than the rest, which
+    usually means something else was using the machine.  Several names are
+    timed one after the other and compared with the fastest; anything they
+    depend on is not run.  With --worktree, the command is substituted for and
+    timed in each named worktree, comparing the same run across worktrees:
+
+      git <project> build --bench --runs 5 debug release
+      git <project> build --bench --worktree main --worktree topic check
+
+    With --profile, each run's command is wrapped in its ``profiler'' key, or
+    the project's if the run has none, in which {cmd} is replaced by the
+    command.  Counters the profiler prints in the format of perf stat -x or
+    /usr/bin/time -v are stored in the run's history record, and --stats shows
+    their medians, so that runs can be compared across worktrees and over time:
+
+      git <project> config profiler "perf stat -x, {cmd}"
+      git <project> config build.all.profiler "/usr/bin/time -v {cmd}"
+      git <project> build --profile all
+
+    With --log FILE, each run's output is copied to FILE as it streams to the
+    terminal.  When FILE grows beyond the project's ``logsize'' key (100M by
+    default) it is renamed to FILE.1, older logs shift to FILE.2 and FILE.3,
+    and a new FILE is started.  With --tail N, the last N lines of each run's
+    output are kept and, if the run fails, printed after it and saved in its
+    history record:
+
+      git <project> build --log build.log --tail 50 all
+
+    With --watch, the run is started and then started again each time files
+    in the current worktree change, until interrupted.  Changes are noticed via
+    inotify where available and by polling file timestamps otherwise.  Files
+    that git ignores, such as build directories, and the --log file do not
+    count as changes.  Changes arriving close together are gathered into one
+    restart, and a run still in progress is stopped, along with everything it
+    started, before the next one begins:
+
+      git <project> build --watch debug
+
     See also:
 
       config
@@ -227,8 +706,44 @@ class RunPlugin(Plugin):
                                          name,
                                          **kwargs)
 
+        def run(self, git, project, formats=None):
+            """Do variable substitution, print the command and run it, via the
+            shell only if it needs one.  Return the exit status.
+
+            git: An object to query the repository and make config changes.
+
+            project: The currently active Project.
+
+            formats: Additional substitution formats.
+
+            """
+            job = Job(self.get_ident(),
+                      self.substitute_command(git, project, formats),
+                      prefix_output=False,
+                      direct=_is_direct(self))
+            return job.run()
+
+        def substitute_command(self, git, project, formats=None):
+            """Do variable substitution on the command and return it, creating the
+            shared cache directory if the command names it.
+
+            git: An object to query the repository and make config changes.
+
+            project: The currently active Project.
+
+            formats: Additional substitution formats.
+
+            """
+            command = super(Class, self).substitute_command(git, project, formats)
+            cachedir = (formats or {}).get('cachedir')
+            if cachedir and cachedir in command:
+                Path(cachedir).mkdir(parents=True, exist_ok=True)
+            return command
+
         Class.__init__ = cons
         Class.get = get
+        Class.run = run
+        Class.substitute_command = substitute_command
 
         self.classes[alias] = Class
         return Class
@@ -236,101 +751,549 @@ class RunPlugin(Plugin):
     def _gen_runs_epilog(self, git, project, alias, runs):
         result = f'Available {alias}s:\n'
         run_width = 20
+        snapshot = get_config_snapshot(git)
         for run in runs:
             help_section = f'{project.get_section()}.help.{alias}.{run}'
-            help_key = 'short'
-            if git.config.has_item(help_section, help_key):
-                shorthelp = git.config.get_item(help_section, help_key)
+            shorthelp = snapshot.get_item(help_section, 'short')
+            if shorthelp is not None:
                 result += f'    {run:<{run_width}} - {shorthelp}\n'
             else:
                 result += f'    {run}\n'
 
         return result
 
-    def _add_alias_arguments(self,
-                             git,
-                             gitproject,
-                             project,
-                             parser_manager,
-                             Class):
-        alias = Class.get_managing_command()
+    def _split_dependency(self, alias, dependency):
+        """Return the alias and run name referenced by a depends value.  A value of
+        the form <alias>.<name> names a run of a registered alias, anything
+        else names a run of the given alias.
 
-        # add run
-        add_parser = get_or_add_top_level_command(parser_manager,
-                                                  'add',
-                                                  'add',
-                                                  help=f'Add config sections to {project.get_section()}')
+        """
+        parts = dependency.split('.', 1)
+        if len(parts) == 2 and parts[0] in self.classes:
+            return parts[0], parts[1]
+        return alias, dependency
+
+    def _get_run_graph(self, git, project, alias, names):
+        """Collect the named runs of alias along with every run they transitively
+        depend on.  Return a dict mapping a key for each run to its run object
+        and a dict mapping keys to the set of keys each run depends on.  Runs
+        of alias are keyed by name, others by <alias>.<name>.
 
-        add_subparser = parser_manager.get_or_add_subparser(add_parser,
-                                                            'add-command',
-                                                            help='add sections')
+        """
+        targets = {}
+        dependencies = {}
+
+        def key_for(run_alias, name):
+            return name if run_alias == alias else f'{run_alias}.{name}'
+
+        worklist = [(alias, name) for name in names]
+        while worklist:
+            run_alias, name = worklist.pop()
+            key = key_for(run_alias, name)
+            if key in targets:
+                continue
+
+            Class = self.classes[run_alias]
+            run = Class.get(git, project, name)
+            targets[key] = run
+
+            for dependency in run.iter_multival('depends'):
+                dep_alias, dep_name = self._split_dependency(run_alias,
+                                                             dependency)
+                if not dep_name in project.iter_multival(dep_alias):
+                    raise GitProjectException(f'Unknown {dep_alias} "{dep_name}" in depends of {key}')
+                dependencies.setdefault(key, set()).add(key_for(dep_alias,
+                                                                dep_name))
+                worklist.append((dep_alias, dep_name))
+
+        # Keep the command-line order for the requested runs.
+        ordered = {key_for(alias, name): targets[key_for(alias, name)]
+                   for name in names}
+        ordered.update(targets)
+
+        return ordered, dependencies
+
+    def _get_outputs(self, git, project, run, formats):
+        """Return the substituted paths of the artifacts registered for a run, either
+        under <alias>.<name> or under <alias>.
 
-        add_run_parser = parser_manager.add_parser(add_subparser,
-                                                   alias,
-                                                   'add-' + alias,
-                                                   help=f'Add a {alias} to {project.get_section()}')
+        """
+        artifact = Artifact.find(git,
+                                 project.get_section(),
+                                 (f'{run.get_subsection()}.{run.get_ident()}',
+                                  run.get_subsection()))
+        if not artifact:
+            return []
+        return sorted(run.substitute_value(git, project, path, formats)
+                      for path in artifact.iter_multival('path'))
+
+    def _get_worktree_jobs(self,
+                           git,
+                           project,
+                           targets,
+                           dependencies,
+                           formats,
+                           output):
+        """Return a list of Jobs running each target in every registered worktree,
+        along with the dependencies among them.  Each command is substituted
+        with the worktree's scope pushed and with a Git object for the
+        worktree, so that {path}, {worktree}, {branch} and the like refer to
+        that worktree.
+
+        """
+        jobs = []
+        worktree_dependencies = {}
+        sources = {}
+        for path, worktree, worktree_git in iter_worktrees(git, project):
+            commit = _get_head_commit(worktree_git)
+
+            def job_name(key):
+                if len(targets) == 1:
+                    return worktree.get_ident()
+                return f'{worktree.get_ident()}/{key}'
+
+            for key, run in targets.items():
+                command = run.substitute_command(worktree_git,
+                                                 project,
+                                                 formats[key])
+                jobs.append(Job(job_name(key),
+                                command,
+                                cwd=path,
+                                **_get_job_options(project, run, output)))
+                sources[job_name(key)] = (run, key, worktree.get_ident(), commit)
+                if key in dependencies:
+                    worktree_dependencies[job_name(key)] = {
+                        job_name(dep) for dep in dependencies[key]
+                    }
+
+        return jobs, worktree_dependencies, sources
+
+    def _get_sources(self, git, project, targets):
+        """Return a dict mapping each target key to its run, the key itself, the
+        active worktree name and the commit at HEAD, for recording in the run
+        history.
+
+        """
+        worktree = _get_worktree_name(project)
+        commit = _get_head_commit(git)
+        return {key: (run, key, worktree, commit) for key, run in targets.items()}
+
+    def _record_history(self, git, project, jobs, sources):
+        """Add each job that actually ran to the run history, and the measurements
+        of tracked runs that succeeded to the perf notes of their commit.
+
+        sources: A dict mapping job names to a tuple of the run, its target key,
+                 the worktree name and the commit the job ran.
+
+        """
+        history = RunHistory(git, project)
+        notes = None
+        for job in jobs:
+            if job.start_time is None:
+                continue
+            run, key, worktree, commit = sources[job.name]
+            history.record(job,
+                           run.get_subsection(),
+                           run.get_ident(),
+                           worktree,
+                           commit)
+            if job.track and job.returncode == 0 and commit:
+                notes = notes or PerfNotes(git, project)
+                notes.record(commit,
+                             _get_perf_key(run, key),
+                             job.duration(),
+                             job.metrics,
+                             _is_dirty(git, job))
+
+    def _run_checked(self,
+                     git,
+                     project,
+                     targets,
+                     dependencies,
+                     formats,
+                     max_jobs,
+                     incremental,
+                     cache,
+                     output):
+        """Run targets, skipping those whose fingerprint matches the fingerprint
+        recorded when they last succeeded in the current worktree (with
+        incremental) and restoring the outputs of those found in the output
+        cache (with cache).  Record fingerprints and cache outputs for runs that
+        succeed and return the aggregate exit status.
 
-        def command_add_run(git, gitproject, project, clargs):
-            f"""Implement git-project add {alias}"""
-            run = Class.get(git,
-                            project,
-                            clargs.name,
-                            command=clargs.command)
-            project.add_item(alias, clargs.name)
-            return run
+        """
+        if incremental:
+            recorded_fingerprints = _get_fingerprints(git, project)
+            inputs = _get_inputs_digest(git)
+
+        # Outputs are only cached for a clean workarea, where HEAD's tree
+        # describes all of the sources.
+        output_cache = None
+        if cache and git.workarea_is_clean():
+            limit = parse_size(getattr(project, 'outputcachesize', None) or '10G')
+            output_cache = OutputCache(git, project, limit)
+
+        jobs = []
+        fingerprints = {}
+        outputs = {}
+        cache_keys = {}
+        for key, run in targets.items():
+            command = run.substitute_command(git, project, formats[key])
+            up_to_date = False
+            if incremental:
+                fingerprints[key] = _get_fingerprint(inputs, command)
+                recorded = recorded_fingerprints.get(_get_fingerprint_key(run, formats[key]))
+                up_to_date = recorded == fingerprints[key]
+
+            if output_cache:
+                outputs[key] = self._get_outputs(git, project, run, formats[key])
+                if outputs[key]:
+                    cache_keys[key] = _get_cache_key(git, command, outputs[key])
+                    if (not up_to_date and
+                        output_cache.contains(cache_keys[key])):
+                        output_cache.restore(cache_keys[key], outputs[key])
+                        print(f'{key} restored from cache')
+                        up_to_date = True
+
+            jobs.append(Job(key,
+                            command,
+                            up_to_date=up_to_date,
+                            **_get_job_options(project, run, output)))
+
+        if len(jobs) == 1:
+            job = jobs[0]
+            if job.up_to_date:
+                print(f'{job.name} is up to date')
+                return 0
+            job.prefix_output = False
+            status = job.run()
+            if status != 0:
+                job.print_tail()
+        else:
+            status = run_jobs(jobs,
+                              max_jobs,
+                              dependencies,
+                              scheduler=_get_scheduler(max_jobs))
+
+        self._record_history(git,
+                             project,
+                             jobs,
+                             self._get_sources(git, project, targets))
 
+        for job in jobs:
+            if job.returncode == 0 and not job.skipped:
+                if incremental:
+                    recorded_fingerprints.set(
+                        _get_fingerprint_key(targets[job.name],
+                                             formats[job.name]),
+                        fingerprints[job.name])
+                if job.name in cache_keys:
+                    output_cache.store(cache_keys[job.name], outputs[job.name])
 
-        add_run_parser.set_defaults(func=command_add_run)
+        if incremental:
+            recorded_fingerprints.save()
 
-        add_run_parser.add_argument('name',
-                                    help='Name for the run')
+        return status
 
-        add_run_parser.add_argument('command',
-                                    help='Command to run')
+    def _execute(self,
+                 git,
+                 project,
+                 clargs,
+                 targets,
+                 dependencies,
+                 formats,
+                 output):
+        """Run targets as the command-line options direct and return the aggregate
+        exit status.
 
-        runs = []
-        if hasattr(project, alias):
-            runs = [run for run in project.iter_multival(alias)]
+        formats: A dict mapping each target key to the substitution formats of
+                 its command.
 
-        # rm run
-        rm_parser = get_or_add_top_level_command(parser_manager,
-                                                 'rm',
-                                                 'rm',
-                                                 help=f'Remove config sections from {project.get_section()}')
+        output: Options for each Job, controlling where its output goes and
+                whether it is profiled, as taken by _get_job_options.
 
-        rm_subparser = parser_manager.get_or_add_subparser(rm_parser,
-                                                           'rm-command',
-                                                           help='rm sections')
+        """
+        if clargs.all_worktrees:
+            if clargs.incremental or clargs.cache:
+                raise GitProjectException('--all-worktrees cannot be combined with --incremental or --cache')
+            jobs, dependencies, sources = self._get_worktree_jobs(git,
+                                                                  project,
+                                                                  targets,
+                                                                  dependencies,
+                                                                  formats,
+                                                                  output)
+            if not jobs:
+                raise GitProjectException('No registered worktrees')
+            status = run_jobs(jobs,
+                              clargs.jobs,
+                              dependencies,
+                              keep_going=True,
+                              scheduler=_get_scheduler(clargs.jobs))
+            self._record_history(git, project, jobs, sources)
+            print_summary(jobs, 'Worktree')
+            return status
+
+        if clargs.incremental or clargs.cache:
+            return self._run_checked(git,
+                                     project,
+                                     targets,
+                                     dependencies,
+                                     formats,
+                                     clargs.jobs,
+                                     clargs.incremental,
+                                     clargs.cache,
+                                     output)
+
+        sources = self._get_sources(git, project, targets)
+
+        if len(targets) == 1 or (clargs.jobs == 1 and not dependencies):
+            # Run one after another with output going straight to the
+            # terminal.
+            status = 0
+            jobs = []
+            for key, run in targets.items():
+                job = Job(key,
+                          run.substitute_command(git, project, formats[key]),
+                          prefix_output=False,
+                          **_get_job_options(project, run, output))
+                jobs.append(job)
+                status = job.run()
+                if status != 0:
+                    job.print_tail()
+                    break
+
+            self._record_history(git, project, jobs, sources)
+
+            if len(targets) == 1:
+                # A single run's status has never been the exit status.
+                return
+            return status
+
+        jobs = [Job(key,
+                    run.substitute_command(git, project, formats[key]),
+                    **_get_job_options(project, run, output))
+                for key, run in targets.items()]
+        status = run_jobs(jobs,
+                          clargs.jobs,
+                          dependencies,
+                          scheduler=_get_scheduler(clargs.jobs))
+        self._record_history(git, project, jobs, sources)
+        return status
+
+    def _watch(self,
+               git,
+               project,
+               clargs,
+               targets,
+               dependencies,
+               formats,
+               output):
+        """Run targets, then run them again each time files in the current
+        worktree change, until interrupted.  A run still in progress when files
+        change is cancelled first.
+
+        output: Options for each Job, controlling where its output goes and
+                whether it is profiled, as taken by _get_job_options.
 
-        rm_run_parser = parser_manager.add_parser(rm_subparser,
-                                                  alias,
-                                                  'rm-' + alias,
-                                                  help=f'Remove a {alias} from {project.get_section()}')
+        """
+        if git.is_bare_repository():
+            raise GitProjectException('--watch needs a worktree to watch')
+
+        exclude = [clargs.log] if clargs.log else []
+        watcher = get_watcher(git.get_working_copy_root(), exclude)
+
+        cancellation = None
+        thread = None
+        try:
+            while True:
+                cancellation = Cancellation()
+                errors = []
+
+                def execute(cancellation=cancellation, errors=errors):
+                    try:
+                        self._execute(git,
+                                      project,
+                                      clargs,
+                                      targets,
+                                      dependencies,
+                                      formats,
+                                      dict(output, cancellation=cancellation))
+                    except Exception as exception:
+                        # Report the failure from the watching thread.
+                        errors.append(exception)
+
+                thread = threading.Thread(target=execute, daemon=True)
+                thread.start()
+
+                changes = set()
+                announced = False
+                while not changes:
+                    changes = watcher.wait(0.5 if thread.is_alive() else None)
+                    if not thread.is_alive() and not announced:
+                        if errors:
+                            raise errors[0]
+                        print('Waiting for changes...', flush=True)
+                        announced = True
+
+                if thread.is_alive():
+                    print('Files changed, cancelling the running command', flush=True)
+                    cancellation.cancel()
+                    thread.join()
+                print(f'{len(changes)} changed paths, running again', flush=True)
+        finally:
+            if thread and thread.is_alive():
+                cancellation.cancel()
+                thread.join()
+            watcher.close()
+
+    def _bench(self, git, project, clargs, alias, names, combinations):
+        """Time the named runs, in the current directory or in each worktree given
+        with --worktree, and print a summary comparing them.
+
+        combinations: A list of lists of extra option strings, one for each
+                      variant of every run.
 
-        def command_rm_run(git, gitproject, project, clargs):
-            f"""Implement git-project rm {alias}"""
-            run = Run.get(git, project, alias, clargs.name, command=clargs.command)
-            run.rm()
-            print(f'Removing project {alias} {clargs.name}')
-            project.rm_item(alias, clargs.name)
+        """
+        if clargs.runs < 1:
+            raise GitProjectException('--runs must be at least 1')
+
+        Class = self.classes[alias]
+        targets = {name: Class.get(git, project, name) for name in names}
+        targets, _dependencies, formats = _expand_matrix(targets,
+                                                         {},
+                                                         combinations,
+                                                         _get_base_formats(git, project))
+
+        benchmarks = []
+        if clargs.worktree:
+            found = set()
+            for path, worktree, worktree_git in iter_worktrees(git, project):
+                ident = worktree.get_ident()
+                if ident not in clargs.worktree:
+                    continue
+                found.add(ident)
+                for key, run in targets.items():
+                    name = ident if len(targets) == 1 else f'{ident}/{key}'
+                    command = run.substitute_command(worktree_git,
+                                                     project,
+                                                     formats[key])
+                    benchmarks.append(Benchmark(name,
+                                                command,
+                                                cwd=path,
+                                                direct=_is_direct(run)))
+            for ident in clargs.worktree:
+                if ident not in found:
+                    raise GitProjectException(f'Unknown worktree "{ident}"')
+        else:
+            for key, run in targets.items():
+                command = run.substitute_command(git, project, formats[key])
+                benchmarks.append(Benchmark(key, command, direct=_is_direct(run)))
+
+        for benchmark in benchmarks:
+            benchmark.run(clargs.warmup, clargs.runs)
+
+        print_results(benchmarks)
+        return 0
 
-        rm_run_parser.set_defaults(func=command_rm_run)
+    def _add_alias_arguments(self,
+                             git,
+                             gitproject,
+                             project,
+                             parser_manager,
+                             Class,
+                             startup_cache):
+        alias = Class.get_managing_command()
 
-        if runs:
-            rm_run_parser.add_argument('name', choices=runs,
-                                       help='Command name')
+        if is_command_selected('add'):
+            # add run
+            add_parser = get_or_add_top_level_command(parser_manager,
+                                                      'add',
+                                                      'add',
+                                                      help=f'Add config sections to {project.get_section()}')
+
+            add_subparser = parser_manager.get_or_add_subparser(add_parser,
+                                                                'add-command',
+                                                                help='add sections')
+
+            add_run_parser = parser_manager.add_parser(add_subparser,
+                                                       alias,
+                                                       'add-' + alias,
+                                                       help=f'Add a {alias} to {project.get_section()}')
+
+            def command_add_run(git, gitproject, project, clargs):
+                f"""Implement git-project add {alias}"""
+                run = Class.get(git,
+                                project,
+                                clargs.name,
+                                command=clargs.command)
+                project.add_item(alias, clargs.name)
+                invalidate_config(git, run.get_section())
+                invalidate_config(git, project.get_section())
+                return run
+
+
+            add_run_parser.set_defaults(func=command_add_run)
+
+            add_run_parser.add_argument('name',
+                                        help='Name for the run')
+
+            add_run_parser.add_argument('command',
+                                        help='Command to run')
+
+        runs = startup_cache.get(f'runs.{alias}')
+        if runs is None:
+            runs = []
+            if hasattr(project, alias):
+                runs = [run for run in project.iter_multival(alias)]
+            startup_cache.set(f'runs.{alias}', runs)
+
+        if is_command_selected('rm'):
+            # rm run
+            rm_parser = get_or_add_top_level_command(parser_manager,
+                                                     'rm',
+                                                     'rm',
+                                                     help=f'Remove config sections from {project.get_section()}')
+
+            rm_subparser = parser_manager.get_or_add_subparser(rm_parser,
+                                                               'rm-command',
+                                                               help='rm sections')
+
+            rm_run_parser = parser_manager.add_parser(rm_subparser,
+                                                      alias,
+                                                      'rm-' + alias,
+                                                      help=f'Remove a {alias} from {project.get_section()}')
+
+            def command_rm_run(git, gitproject, project, clargs):
+                f"""Implement git-project rm {alias}"""
+                run = Run.get(git, project, alias, clargs.name, command=clargs.command)
+                run.rm()
+                print(f'Removing project {alias} {clargs.name}')
+                project.rm_item(alias, clargs.name)
+                invalidate_config(git, run.get_section())
+                invalidate_config(git, project.get_section())
+
+            rm_run_parser.set_defaults(func=command_rm_run)
+
+            if runs:
+                rm_run_parser.add_argument('name', choices=runs,
+                                           help='Command name')
+
+        if not is_command_selected(alias):
+            return
 
         # run
+        epilog = startup_cache.get(f'epilog.{alias}')
+        if epilog is None:
+            epilog = self._gen_runs_epilog(git, project, alias, runs)
+            startup_cache.set(f'epilog.{alias}', epilog)
+
         command_subparser = parser_manager.find_subparser('command')
 
         run_parser = parser_manager.add_parser(command_subparser,
                                                alias,
                                                alias,
                                                help=f'Invoke {alias}',
-                                               epilog=self._gen_runs_epilog(git,
-                                                                            project,
-                                                                            alias,
-                                                                            runs),
+                                               epilog=epilog,
                                                formatter_class=
                                                argparse.RawDescriptionHelpFormatter)
 
@@ -339,26 +1302,98 @@ class RunPlugin(Plugin):
             if clargs.make_alias:
                 run_config = RunConfig.get(git, project)
                 run_config.add_item('alias', clargs.name)
+                invalidate_config(git, run_config.get_section())
             else:
-                if not clargs.name in runs:
-                    raise GitProjectException(f'Unknown {alias} "{clargs.name}," choose one of: {{ {runs} }}')
-                run = Class.get(git, project, clargs.name)
-
-                translation_table = dict.fromkeys(map(ord, '{}'), None)
-
-                option_names = ' '.join(clargs.options)
-                option_names = option_names.translate(translation_table)
-                option_key = '-'.join(clargs.options)
-                option_key = option_key.translate(translation_table)
-
-                formats = {
-                    'options': ' '.join(clargs.options),
-                    'option_names': option_names,
-                    'option_key': option_key,
-                    'option_keysep': '-' if len(clargs.options) > 0 else ''
-                }
-
-                run.run(git, project, formats)
+                # Leading options that name other runs are additional targets.
+                names = [clargs.name]
+                options = list(clargs.options)
+                while options and options[0] in runs:
+                    names.append(options.pop(0))
+
+                for name in names:
+                    if not name in runs:
+                        raise GitProjectException(f'Unknown {alias} "{name}," choose one of: {{ {runs} }}')
+
+                if clargs.stats:
+                    history = RunHistory(git, project)
+                    for name in names:
+                        print_stats(list(history.iter_records(alias, name)),
+                                    f'{alias} {name}')
+                    return 0
+
+                if clargs.perf_log:
+                    if len(options) > 1:
+                        raise GitProjectException('--perf-log takes a single revision range')
+                    commits = list(PerfNotes(git, project).iter_commits(
+                        options[0] if options else None))
+                    threshold = float(getattr(project, 'perfthreshold', None) or '10')
+                    for name in names:
+                        # Each matrix combination is tracked under its own key.
+                        keys = sorted({key for _short, _subject, entries in commits
+                                       for key in entries
+                                       if key.startswith(f'{alias}.{name}:')})
+                        for key in [f'{alias}.{name}'] + keys:
+                            print_perf_log(commits, key, threshold)
+                    return 0
+
+                combinations = [options]
+                if clargs.matrix:
+                    combinations = _get_matrix(options)
+                if clargs.bench:
+                    if clargs.profile:
+                        raise GitProjectException('--profile cannot be combined with --bench')
+                    return self._bench(git,
+                                       project,
+                                       clargs,
+                                       alias,
+                                       names,
+                                       combinations)
+                if clargs.worktree:
+                    raise GitProjectException('--worktree is only used with --bench')
+
+                targets, dependencies = self._get_run_graph(git,
+                                                            project,
+                                                            alias,
+                                                            names)
+                targets, dependencies, formats = _expand_matrix(targets,
+                                                                dependencies,
+                                                                combinations,
+                                                                _get_base_formats(git, project))
+                if clargs.jobs is None:
+                    # A matrix is meant to be run in parallel, as are runs
+                    # that depend on runs independent of each other.
+                    parallel = (len(combinations) > 1 or
+                                (dependencies and
+                                 get_max_ready(targets, dependencies) > 1))
+                    clargs.jobs = 0 if parallel else 1
+
+                log = None
+                if clargs.log:
+                    limit = parse_size(getattr(project, 'logsize', None) or '100M')
+                    log = RotatingLog(clargs.log, limit)
+                output = {'log': log,
+                          'tail': clargs.tail,
+                          'profile': clargs.profile}
+
+                try:
+                    if clargs.watch:
+                        return self._watch(git,
+                                           project,
+                                           clargs,
+                                           targets,
+                                           dependencies,
+                                           formats,
+                                           output)
+                    return self._execute(git,
+                                         project,
+                                         clargs,
+                                         targets,
+                                         dependencies,
+                                         formats,
+                                         output)
+                finally:
+                    if log:
+                        log.close()
 
         run_parser.set_defaults(func=command_run)
 
@@ -367,6 +1402,53 @@ class RunPlugin(Plugin):
         run_parser.add_argument('--make-alias', action='store_true',
                                 help=f'Alias "{alias}" to another command')
 
+        run_parser.add_argument('-j', '--jobs', type=_parse_jobs, default=None,
+                                metavar='N',
+                                help=f'Run up to N {alias}s at once, or "auto" to fit the machine\'s load')
+
+        run_parser.add_argument('--incremental', action='store_true',
+                                help=f'Skip a {alias} whose inputs are unchanged since it last succeeded')
+
+        run_parser.add_argument('--cache', action='store_true',
+                                help=f'Restore {alias} outputs from the output cache')
+
+        run_parser.add_argument('--all-worktrees', action='store_true',
+                                help=f'Run the {alias} in every registered worktree')
+
+        run_parser.add_argument('--log', metavar='FILE',
+                                help=f'Also write {alias} output to FILE, rotating it when it grows too large')
+
+        run_parser.add_argument('--tail', type=_parse_tail, default=0, metavar='N',
+                                help=f'Show the last N lines of output of a failed {alias}')
+
+        run_parser.add_argument('--watch', action='store_true',
+                                help=f'Run the {alias} again whenever files in the worktree change')
+
+        run_parser.add_argument('--matrix', action='store_true',
+                                help=f'Run the {alias} once for each combination of options, given as groups of comma-separated values separated by "x"')
+
+        run_parser.add_argument('--bench', action='store_true',
+                                help=f'Time the {alias} repeatedly instead of running it once')
+
+        run_parser.add_argument('--warmup', type=int, default=0, metavar='W',
+                                help='With --bench, run W times before timing')
+
+        run_parser.add_argument('--runs', type=int, default=10, metavar='N',
+                                help='With --bench, time N runs')
+
+        run_parser.add_argument('--worktree', action='append', default=[],
+                                metavar='NAME',
+                                help=f'With --bench, time the {alias} in worktree NAME, which may be given more than once')
+
+        run_parser.add_argument('--stats', action='store_true',
+                                help=f'Show timing history for the {alias} instead of running it; peak memory includes that of git-project itself')
+
+        run_parser.add_argument('--perf-log', action='store_true',
+                                help=f'Show the tracked measurements of the {alias} across a commit range instead of running it')
+
+        run_parser.add_argument('--profile', action='store_true',
+                                help=f'Run the {alias} under its profiler and record the counters it reports')
+
         run_parser.add_argument('name', help='Command name or alias')
 
         run_parser.add_argument('options',
@@ -381,10 +1463,16 @@ class RunPlugin(Plugin):
                       plugin_manage):
         """Add arguments for 'git-project run.'"""
         if git.has_repo():
-            # Get the global run ConfigObject and add any aliases.
-            run_config = RunConfig.get(git, project)
-            for alias in run_config.iter_multival('alias'):
-
+            # Add any aliases registered in the global run config.
+            startup_cache = get_startup_cache(git, project)
+            aliases = startup_cache.get('aliases')
+            if aliases is None:
+                run_section = f'{project.get_section()}.{RunConfig.subsection()}'
+                snapshot = get_config_snapshot(git)
+                aliases = list(snapshot.iter_multival(run_section, 'alias'))
+                startup_cache.set('aliases', aliases)
+
+            for alias in aliases:
                 Class = self._make_alias_class(alias)
 
             for Class in self.iterclasses():
@@ -392,7 +1480,10 @@ class RunPlugin(Plugin):
                                           gitproject,
                                           project,
                                           parser_manager,
-                                          Class)
+                                          Class,
+                                          startup_cache)
+
+            startup_cache.save()
 
     def get_class_for(self, alias):
         return self.classes[alias]
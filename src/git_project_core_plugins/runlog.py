@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+"""A size-limited log of run output.
+
+Output is appended to a log file until it reaches its size limit, at which
+point the file is renamed to <file>.1 (shifting older logs to <file>.2 and so
+on) and a new file is started.  Writers share one RotatingLog so that lines
+from concurrent runs are never interleaved mid-line.
+
+"""
+
+import os
+from pathlib import Path
+import threading
+
+class RotatingLog:
+    """An append-only log file that rotates when it grows too large."""
+
+    def __init__(self, path, max_bytes, backups=3):
+        """RotatingLog construction.
+
+        path: The log file to write.
+
+        max_bytes: The size at which the log file is rotated.
+
+        backups: The number of rotated log files to keep.
+
+        """
+        self._path = Path(path)
+        self._max_bytes = max_bytes
+        self._backups = backups
+        self._lock = threading.Lock()
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self._path, 'ab')
+        self._size = self._file.tell()
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self._backups - 1, 0, -1):
+            older = self._path.with_name(f'{self._path.name}.{index}')
+            if older.exists():
+                os.replace(older,
+                           self._path.with_name(f'{self._path.name}.{index + 1}'))
+        if self._backups > 0:
+            os.replace(self._path, self._path.with_name(f'{self._path.name}.1'))
+        else:
+            self._path.unlink()
+        self._file = open(self._path, 'ab')
+        self._size = 0
+
+    def write(self, data):
+        """Append bytes to the log, rotating first if they would not fit.
+
+        data: The bytes to write, normally one or more complete lines.
+
+        """
+        with self._lock:
+            if self._size and self._size + len(data) > self._max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._size += len(data)
+
+    def close(self):
+        """Flush and close the log file."""
+        with self._lock:
+            self._file.close()
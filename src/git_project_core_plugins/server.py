@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""A plugin to add a 'server' command to git-project.  The server keeps the
+repository, project, plugins and git config loaded in a background process
+and runs commands sent to it by git-project-client.
+
+Summary:
+
+git-project server start [--idle-timeout SECONDS]
+git-project server stop
+git-project server status
+
+"""
+
+from git_project import Git, GitProject, GitProjectException, PluginManager
+from git_project import Plugin, Project, add_top_level_command, parse_arguments
+
+from git_project_core_plugins.client import HEADER, connect, get_project_name
+from git_project_core_plugins.client import get_socket_path, iter_replies
+from git_project_core_plugins.client import send_request
+from git_project_core_plugins.common import add_plugin_version_argument
+from git_project_core_plugins.common import get_config_stamp
+from git_project_core_plugins.common import get_state_dir, is_command_selected
+
+import array
+import json
+import os
+from pathlib import Path
+import signal
+import socket
+import subprocess
+import sys
+import time
+import traceback
+
+import pygit2
+
+def _get_refs_stamp(git):
+    """Return a value that changes whenever a ref or HEAD changes.
+
+    git: An object to query the repository.
+
+    """
+    common_dir = Path(git.get_git_common_dir())
+    paths = [Path(git.get_gitdir()) / 'HEAD', common_dir / 'packed-refs']
+    # Updating a loose ref renames a lock file over it, which changes the
+    # modification time of its directory.
+    for directory, _subdirectories, _files in os.walk(common_dir / 'refs'):
+        paths.append(Path(directory))
+
+    stamp = []
+    for path in paths:
+        try:
+            stat = path.stat()
+            stamp.append([str(path), stat.st_ino, stat.st_mtime_ns, stat.st_size])
+        except OSError:
+            stamp.append([str(path), None, None, None])
+    return stamp
+
+def _receive_request(conn):
+    """Read a request and the file descriptors sent with it from a client.
+
+    conn: The connection to the client.
+
+    """
+    fds = array.array('i')
+    data, ancillary, _flags, _address = conn.recvmsg(HEADER.size,
+                                                     socket.CMSG_SPACE(3 * fds.itemsize))
+    for level, kind, payload in ancillary:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(payload[:len(payload) - (len(payload) % fds.itemsize)])
+
+    while len(data) < HEADER.size:
+        chunk = conn.recv(HEADER.size - len(data))
+        if not chunk:
+            raise EOFError('Truncated request')
+        data += chunk
+
+    (length,) = HEADER.unpack(data)
+    body = b''
+    while len(body) < length:
+        chunk = conn.recv(length - len(body))
+        if not chunk:
+            raise EOFError('Truncated request')
+        body += chunk
+
+    return json.loads(body), list(fds)
+
+def _reply(conn, reply):
+    """Send one reply line to a client, ignoring clients that went away."""
+    try:
+        conn.sendall(json.dumps(reply).encode() + b'\n')
+    except OSError:
+        pass
+
+class Server:
+    """A process that runs git-project commands for clients of one project in one
+    repository, keeping what it loads between commands.
+
+    """
+
+    def __init__(self, project_name, socket_path, idle_timeout):
+        """Server construction.
+
+        project_name: The name of the project to run commands for.
+
+        socket_path: The path of the Unix socket to listen on.
+
+        idle_timeout: The number of seconds without a request after which the
+                      server exits, or zero to run until stopped.
+
+        """
+        self._project_name = project_name
+        self._socket_path = Path(socket_path)
+        self._idle_timeout = idle_timeout
+        self._plugin_manager = None
+        # Map each git directory to its Git, Project, GitProject and the stamp
+        # of the config and refs they were loaded from.
+        self._contexts = {}
+        self._started = time.time()
+        self._requests = 0
+        # The processes running commands.
+        self._children = set()
+
+    def _get_context(self):
+        """Return the Git, Project and GitProject for the current directory, loading
+        them again if the config or refs changed since they were loaded.
+
+        """
+        gitdir = pygit2.discover_repository(os.getcwd())
+        if not gitdir:
+            raise GitProjectException(f'No git repository at {os.getcwd()}')
+
+        context = self._contexts.get(gitdir)
+        if context:
+            git, project, gitproject, stamp = context
+            if stamp == [get_config_stamp(git), _get_refs_stamp(git)]:
+                return git, project, gitproject
+
+        git = Git()
+        project = Project.get(git, self._project_name)
+
+        if self._plugin_manager is None:
+            # Class hooks modify classes, so they are added only once.
+            self._plugin_manager = PluginManager()
+            self._plugin_manager.load_plugins(git, project)
+
+        gitproject = GitProject.get(git)
+        stamp = [get_config_stamp(git), _get_refs_stamp(git)]
+        self._contexts[gitdir] = (git, project, gitproject, stamp)
+        return git, project, gitproject
+
+    def _run(self, argv):
+        """Run a command line as git-project's main would and return its exit
+        status.
+
+        argv: The command line, including the program name.
+
+        """
+        if get_project_name(argv[0]) != self._project_name:
+            print(f'This server runs commands for {self._project_name}', file=sys.stderr)
+            return 1
+
+        project = None
+        try:
+            git, project, gitproject = self._get_context()
+            git.validate_config()
+            clargs = parse_arguments(git, gitproject, project, self._plugin_manager, argv[1:])
+            self._plugin_manager.initialize_plugins(git, gitproject, project)
+            status = clargs.func(git, gitproject, project, clargs)
+            git.validate_config()
+            return status if isinstance(status, int) else 0
+        except GitProjectException as exception:
+            print(f'{exception.message}')
+            return -1
+        except SystemExit as exception:
+            if exception.code is None or isinstance(exception.code, int):
+                return exception.code or 0
+            print(exception.code, file=sys.stderr)
+            return 1
+        except KeyboardInterrupt:
+            return 130
+        except Exception:
+            traceback.print_exc()
+            return 1
+        finally:
+            # Drop the scopes, such as the current worktree, that this command
+            # pushed.
+            if project is not None:
+                while project.pop_scope():
+                    pass
+
+    def _load(self, request):
+        """Load the repository and project a command will run in, so that they stay
+        loaded in the server for later commands.  Any error is left for the
+        command itself to report.
+
+        request: The command request from a client.
+
+        """
+        saved_environ = dict(os.environ)
+        try:
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request['env'])
+            self._get_context()
+        except Exception:
+            pass
+        finally:
+            os.environ.clear()
+            os.environ.update(saved_environ)
+            os.chdir('/')
+
+    def _serve_command(self, conn, request, fds):
+        """Run a command for a client in a process forked for it and exit.
+
+        conn: The connection to the client.
+
+        request: The command request from the client.
+
+        fds: The client's standard input, output and error.
+
+        """
+        try:
+            # The client passes signals on to this process group, leaving the
+            # server alone.
+            os.setpgid(0, 0)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            _reply(conn, {'pid': os.getpid()})
+
+            for fd, received in zip((0, 1, 2), fds):
+                os.dup2(received, fd)
+                os.close(received)
+            os.chdir(request['cwd'])
+            os.environ.clear()
+            os.environ.update(request['env'])
+            sys.argv = request['argv']
+            status = self._run(request['argv'])
+            sys.stdout.flush()
+            sys.stderr.flush()
+            _reply(conn, {'status': status})
+        except BaseException:
+            traceback.print_exc()
+            _reply(conn, {'status': 1})
+        finally:
+            # Never return to the server's loop.
+            os._exit(0)
+
+    def _reap(self):
+        """Collect the processes whose commands have finished."""
+        for pid in list(self._children):
+            try:
+                finished, _status = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                finished = pid
+            if finished:
+                self._children.discard(pid)
+
+    def _handle(self, conn):
+        """Serve one client connection.  Return False if the server should stop."""
+        request, fds = _receive_request(conn)
+
+        control = request.get('control')
+        if control == 'stop':
+            _reply(conn, {'status': 0})
+            return False
+        if control == 'status':
+            _reply(conn, {'pid': os.getpid(),
+                          'uptime': round(time.time() - self._started),
+                          'requests': self._requests,
+                          'running': len(self._children),
+                          'worktrees': len(self._contexts),
+                          'status': 0})
+            return True
+
+        self._requests += 1
+        self._load(request)
+
+        # Commands change the directory, environment and standard streams of
+        # the process running them, so each runs in a process of its own.
+        # It starts with everything the server has loaded and a long command
+        # does not hold up the others.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            self._serve_command(conn, request, fds)
+
+        self._children.add(pid)
+        for received in fds:
+            os.close(received)
+        return True
+
+    def serve(self):
+        """Accept and run commands until stopped or idle for too long."""
+        self._socket_path.parent.mkdir(parents=True, exist_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        previous_umask = os.umask(0o077)
+        try:
+            listener.bind(os.fsencode(self._socket_path))
+        finally:
+            os.umask(previous_umask)
+        listener.listen()
+        inode = self._socket_path.stat().st_ino
+        # Wake up regularly to collect finished commands.
+        listener.settimeout(1)
+
+        def terminate(_signum, _frame):
+            sys.exit(0)
+
+        # Exit cleanly, removing the socket, when asked to.
+        signal.signal(signal.SIGTERM, terminate)
+
+        try:
+            running = True
+            last_request = time.monotonic()
+            while running:
+                try:
+                    conn, _address = listener.accept()
+                except socket.timeout:
+                    self._reap()
+                    if (self._idle_timeout and
+                        not self._children and
+                        time.monotonic() - last_request >= self._idle_timeout):
+                        break
+                    continue
+                except KeyboardInterrupt:
+                    continue
+                last_request = time.monotonic()
+                with conn:
+                    conn.settimeout(None)
+                    try:
+                        running = self._handle(conn)
+                    except (OSError, EOFError, ValueError, KeyError):
+                        traceback.print_exc()
+                    except KeyboardInterrupt:
+                        continue
+                self._reap()
+        finally:
+            listener.close()
+            try:
+                if self._socket_path.stat().st_ino == inode:
+                    self._socket_path.unlink()
+            except OSError:
+                pass
+
+def main():
+    """Run a server in this process, taking the project name, socket path and idle
+    timeout from the command line.
+
+    """
+    project_name, socket_path, idle_timeout = sys.argv[1:4]
+    os.chdir('/')
+    Server(project_name, socket_path, float(idle_timeout)).serve()
+
+def _get_socket_path(git, project_name):
+    """Return the socket path of the server for a project in the repository."""
+    return get_socket_path(git.get_git_common_dir(), project_name)
+
+def _query_status(socket_path):
+    """Return the status reply of the server at socket_path, or None if none is
+    running.
+
+    """
+    sock = connect(socket_path)
+    if sock is None:
+        return None
+    with sock:
+        send_request(sock, {'control': 'status'})
+        for reply in iter_replies(sock):
+            return reply
+    return None
+
+def command_server_start(git, gitproject, project, clargs):
+    """Implement git-project server start."""
+    project_name = get_project_name(sys.argv[0])
+    socket_path = _get_socket_path(git, project_name)
+
+    status = _query_status(socket_path)
+    if status:
+        print(f'Server already running (pid {status["pid"]})')
+        return 0
+
+    try:
+        # Nothing answered, so any socket there is left over from a server
+        # that did not exit cleanly.
+        socket_path.unlink()
+    except FileNotFoundError:
+        pass
+
+    logpath = get_state_dir(git, project) / 'server.log'
+    with open(logpath, 'ab') as logfile:
+        subprocess.Popen([sys.executable,
+                          '-c',
+                          'from git_project_core_plugins.server import main; main()',
+                          project_name,
+                          str(socket_path),
+                          str(clargs.idle_timeout)],
+                         stdin=subprocess.DEVNULL,
+                         stdout=logfile,
+                         stderr=logfile,
+                         start_new_session=True)
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        status = _query_status(socket_path)
+        if status:
+            print(f'Server started (pid {status["pid"]})')
+            return 0
+        time.sleep(0.05)
+
+    raise GitProjectException(f'Server did not start, see {logpath}')
+
+def command_server_stop(git, gitproject, project, clargs):
+    """Implement git-project server stop."""
+    sock = connect(_get_socket_path(git, get_project_name(sys.argv[0])))
+    if sock is None:
+        print('No server running')
+        return 0
+    with sock:
+        send_request(sock, {'control': 'stop'})
+        for _status in iter_replies(sock):
+            pass
+    print('Server stopped')
+    return 0
+
+def command_server_status(git, gitproject, project, clargs):
+    """Implement git-project server status."""
+    status = _query_status(_get_socket_path(git, get_project_name(sys.argv[0])))
+    if not status:
+        print('No server running')
+        return 1
+    print(f'Server running (pid {status["pid"]}), up {status["uptime"]}s, '
+          f'{status["requests"]} commands run for {status["worktrees"]} worktrees, '
+          f'{status["running"]} running')
+    return 0
+
+class ServerPlugin(Plugin):
+    """
+    The server command keeps git-project loaded in a background process so that
+    commands start quickly.
+
+    Summary:
+
+      git <project> server start [--idle-timeout SECONDS]
+      git <project> server stop
+      git <project> server status
+
+    Most of the time taken by a quick command such as ``worktree config'' goes
+    to starting Python, importing pygit2 and the plugins and reading the git
+    config.  The server does that once and then runs commands sent by
+    git-project-client, a small program that forwards its command line,
+    current directory, environment and standard input, output and error to
+    the server.  To use it, link git-<project> to git-project-client instead
+    of git-project and start the server:
+
+      ln -s $(which git-project-client) ~/bin/git-<project>
+      git <project> server start
+
+    When no server is running for the repository, git-project-client runs
+    the command itself, so the link is always safe to use.  The server
+    listens on a socket in the git common directory and only accepts commands
+    from its own user.  Each command runs in a process forked from the
+    server, so that it starts with everything already loaded and a long
+    command such as ``run --watch'' does not hold up others.  The server
+    reloads the repository and config when a git config file, HEAD or any
+    ref changes.  An interrupt or termination of the client is passed on to
+    the command, not to the server.
+
+    With --idle-timeout, the server exits after that many seconds without a
+    command (one hour by default, zero to never exit).  The server's output
+    goes to server.log in the project's state directory.
+
+    See also:
+
+      run
+      worktree
+
+    """
+    def __init__(self):
+        super().__init__('server')
+
+    def add_arguments(self,
+                      git,
+                      gitproject,
+                      project,
+                      parser_manager,
+                      plugin_manager):
+        """Add arguments for 'git-project server.'"""
+        if not is_command_selected('server'):
+            return
+
+        # server
+        server_parser = add_top_level_command(parser_manager,
+                                              'server',
+                                              'server',
+                                              help='Manage a background git-project server')
+
+        add_plugin_version_argument(server_parser)
+
+        server_subparser = parser_manager.add_subparser(server_parser,
+                                                        'server_command',
+                                                        help='server commands')
+
+        # server start
+        server_start_parser = parser_manager.add_parser(server_subparser,
+                                                        'start',
+                                                        'server-start',
+                                                        help='Start a server')
+
+        server_start_parser.set_defaults(func=command_server_start)
+
+        server_start_parser.add_argument('--idle-timeout', type=float, default=3600,
+                                         metavar='SECONDS',
+                                         help='Exit after SECONDS without a command, or never if 0')
+
+        # server stop
+        server_stop_parser = parser_manager.add_parser(server_subparser,
+                                                       'stop',
+                                                       'server-stop',
+                                                       help='Stop the server')
+
+        server_stop_parser.set_defaults(func=command_server_stop)
+
+        # server status
+        server_status_parser = parser_manager.add_parser(server_subparser,
+                                                         'status',
+                                                         'server-status',
+                                                         help='Show whether a server is running')
+
+        server_status_parser.set_defaults(func=command_server_status)
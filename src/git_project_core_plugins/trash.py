@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""A trash area for directories that are slow to delete.
+
+Removing a multi-gigabyte build tree takes a long time.  Renaming it into a
+trash directory on the same filesystem is instant, after which it can be
+deleted in the background.  Each filesystem gets its own trash directory: the
+project's trash in the state directory, or a .git-project-trash directory
+beside the removed path when that is on another filesystem.  Those other trash
+directories are listed in the project trash's roots file so that they can be
+found again.
+
+"""
+
+from git_project_core_plugins.common import get_state_dir
+from git_project_core_plugins.runlog import RotatingLog
+
+from concurrent.futures import ThreadPoolExecutor
+import errno
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+import time
+import traceback
+
+# The size at which the log of failures to empty the trash is rotated.
+_MAX_LOG_BYTES = 1 << 20
+
+class Trash:
+    """Directories waiting to be deleted."""
+
+    def __init__(self, root):
+        """Trash construction.
+
+        root: The project's trash directory.
+
+        """
+        self._root = Path(root)
+
+    def _add_root(self, root):
+        """Record another trash directory in the roots file."""
+        roots = self._root / 'roots'
+        if str(root) in self.iter_roots():
+            return
+        with open(roots, 'a') as rootsfile:
+            rootsfile.write(f'{root}\n')
+
+    def iter_roots(self):
+        """Iterate over the paths of every trash directory."""
+        yield str(self._root)
+        try:
+            with open(self._root / 'roots') as rootsfile:
+                for line in rootsfile:
+                    if line.strip():
+                        yield line.strip()
+        except FileNotFoundError:
+            return
+
+    def move(self, path, name):
+        """Rename a path into the trash and return its new path, or None if it does
+        not exist.
+
+        path: The file or directory to remove.
+
+        name: A name identifying the path in the trash.
+
+        """
+        if not os.path.lexists(path):
+            return None
+
+        self._root.mkdir(parents=True, exist_ok=True)
+        entry = f'{time.time_ns()}-{name}'
+        try:
+            destination = self._root / entry
+            os.rename(path, destination)
+            return destination
+        except OSError as exception:
+            if exception.errno != errno.EXDEV:
+                raise
+
+        # Use a trash directory on the path's own filesystem.
+        root = Path(path).resolve().parent / '.git-project-trash'
+        root.mkdir(exist_ok=True)
+        self._add_root(root)
+        destination = root / entry
+        os.rename(path, destination)
+        return destination
+
+    def _iter_entries(self):
+        """Iterate over the paths of everything in the trash."""
+        for root in self.iter_roots():
+            try:
+                with os.scandir(root) as entries:
+                    for entry in entries:
+                        if entry.name != 'roots':
+                            yield Path(entry.path)
+            except FileNotFoundError:
+                continue
+
+    def empty(self, workers=None):
+        """Delete everything in the trash, deleting separate directory trees in
+        parallel.  Return a list of (path, error) pairs for what could not be
+        deleted.
+
+        workers: The number of threads deleting at once, or None for one per
+                 CPU.
+
+        """
+        failures = []
+
+        def onexc(_function, path, exception):
+            # Something else emptying the trash may get there first.
+            if not isinstance(exception, FileNotFoundError):
+                failures.append((path, exception))
+
+        def remove(path):
+            if path.is_dir() and not path.is_symlink():
+                if sys.version_info >= (3, 12):
+                    shutil.rmtree(path, onexc=onexc)
+                else:
+                    shutil.rmtree(path,
+                                  onerror=lambda function, path, exc_info:
+                                  onexc(function, path, exc_info[1]))
+            else:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+                except OSError as exception:
+                    failures.append((str(path), exception))
+
+        # Delete the top level of each trashed tree in parallel, so that large
+        # trees are walked by several threads, then what is left of them.
+        entries = list(self._iter_entries())
+        children = []
+        for entry in entries:
+            if entry.is_dir() and not entry.is_symlink():
+                try:
+                    with os.scandir(entry) as scan:
+                        children.extend(Path(child.path) for child in scan)
+                except OSError as exception:
+                    failures.append((str(entry), exception))
+
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            list(executor.map(remove, children))
+        for entry in entries:
+            remove(entry)
+
+        return failures
+
+    def get_log_path(self):
+        """Return the path of the log of failures to empty the trash in the
+        background.
+
+        """
+        return self._root.parent / 'trash.log'
+
+    def empty_in_background(self):
+        """Start a detached process to empty the trash, logging failures to a
+        size-limited log beside the trash directory.
+
+        """
+        self._root.mkdir(parents=True, exist_ok=True)
+        subprocess.Popen([sys.executable,
+                          '-c',
+                          'from git_project_core_plugins.trash import main; main()',
+                          str(self._root)],
+                         stdin=subprocess.DEVNULL,
+                         stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL,
+                         start_new_session=True)
+
+def get_trash(git, project):
+    """Return the Trash of a project.
+
+    git: An object to query the repository.
+
+    project: The currently active Project.
+
+    """
+    return Trash(get_state_dir(git, project) / 'trash')
+
+def main():
+    """Empty a trash, taking its directory from the command line, and log what
+    could not be deleted.
+
+    """
+    trash = Trash(sys.argv[1])
+    log = RotatingLog(trash.get_log_path(), _MAX_LOG_BYTES, backups=1)
+    try:
+        for path, error in trash.empty():
+            log.write(f'{path}: {error}\n'.encode())
+    except Exception:
+        log.write(traceback.format_exc().encode())
+    finally:
+        log.close()
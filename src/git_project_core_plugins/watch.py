@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+
+"""Notice when the files of a worktree change.
+
+Changes are reported by inotify where the kernel provides it and found by
+periodically comparing file timestamps otherwise.  Paths that git ignores
+(build directories, for example) and the git directory itself are never
+reported, so a command writing its outputs into the worktree does not trigger
+itself.
+
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+from pathlib import Path
+import select
+import struct
+import subprocess
+import time
+
+# How long the worktree must be quiet before a burst of changes is reported.
+DEBOUNCE_SECONDS = 0.2
+
+# How often the polling watcher looks for changes.
+_POLL_SECONDS = 1.0
+
+def _get_ignored(root, paths):
+    """Return the subset of paths that git ignores.
+
+    root: The worktree containing the paths.
+
+    paths: Paths relative to root.
+
+    """
+    if not paths:
+        return set()
+    result = subprocess.run(['git', '-C', str(root), 'check-ignore', '-z', '--stdin'],
+                            input=b'\0'.join(os.fsencode(path) for path in paths),
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    # check-ignore exits with 1 when nothing is ignored.
+    return {os.fsdecode(path) for path in result.stdout.split(b'\0') if path}
+
+def _iter_directories(root, excluded):
+    """Iterate over the directories of a worktree, relative to root, skipping the
+    git directory and directories git ignores.  Ignore rules are checked once
+    per level of the tree rather than once per directory.
+
+    root: The top of the worktree.
+
+    excluded: A set of relative paths not to descend into.
+
+    """
+    level = ['']
+    while level:
+        children = []
+        for directory in level:
+            yield directory
+            try:
+                with os.scandir(root / directory) as entries:
+                    for entry in entries:
+                        path = os.path.join(directory, entry.name)
+                        if (entry.name != '.git' and path not in excluded and
+                            entry.is_dir(follow_symlinks=False)):
+                            children.append(path)
+            except OSError:
+                continue
+        ignored = _get_ignored(root, children)
+        level = [path for path in children if path not in ignored]
+
+class _Watcher:
+    """The common part of watchers over a worktree."""
+
+    def __init__(self, root, exclude=()):
+        """_Watcher construction.
+
+        root: The top of the worktree to watch.
+
+        exclude: Paths that are never reported as changed.
+
+        """
+        self.root = Path(root).resolve()
+        self._excluded = set()
+        for path in exclude:
+            try:
+                self._excluded.add(str(Path(path).resolve().relative_to(self.root)))
+            except ValueError:
+                pass
+
+    def _filter(self, changes):
+        """Remove ignored and excluded paths from a set of relative paths."""
+        changes = {path for path in changes
+                   if path not in self._excluded and
+                   path != '.git' and not path.startswith('.git' + os.sep)}
+        return changes - _get_ignored(self.root, sorted(changes))
+
+    def wait(self, timeout=None):
+        """Wait for files to change and return the set of changed paths, relative
+        to the root, once the worktree has been quiet for DEBOUNCE_SECONDS.
+        Return an empty set if nothing changed within timeout seconds.
+
+        timeout: How long to wait for a change, or None to wait indefinitely.
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            changes = self._read(remaining)
+            if not changes:
+                return set()
+
+            # Collect the rest of the burst.
+            while True:
+                more = self._read(DEBOUNCE_SECONDS)
+                if not more:
+                    break
+                changes |= more
+
+            changes = self._filter(changes)
+            if changes or (deadline is not None and time.monotonic() >= deadline):
+                return changes
+
+    def close(self):
+        """Release the watcher's resources."""
+
+class _InotifyWatcher(_Watcher):
+    """A watcher notified of changes by the kernel."""
+
+    _IN_MODIFY = 0x00000002
+    _IN_ATTRIB = 0x00000004
+    _IN_CLOSE_WRITE = 0x00000008
+    _IN_MOVED_FROM = 0x00000040
+    _IN_MOVED_TO = 0x00000080
+    _IN_CREATE = 0x00000100
+    _IN_DELETE = 0x00000200
+    _IN_Q_OVERFLOW = 0x00004000
+    _IN_IGNORED = 0x00008000
+    _IN_ONLYDIR = 0x01000000
+    _IN_ISDIR = 0x40000000
+
+    _IN_NONBLOCK = 0o4000
+    _IN_CLOEXEC = 0o2000000
+
+    _MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+             _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR)
+
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, root, exclude=()):
+        """_InotifyWatcher construction.  Raise OSError if inotify is not
+        available.
+
+        root: The top of the worktree to watch.
+
+        exclude: Paths that are never reported as changed.
+
+        """
+        super().__init__(root, exclude)
+        name = ctypes.util.find_library('c')
+        self._libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, 'inotify is not available')
+
+        self._fd = self._libc.inotify_init1(self._IN_NONBLOCK | self._IN_CLOEXEC)
+        if self._fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+
+        self._directories = {}
+        try:
+            for directory in _iter_directories(self.root, self._excluded):
+                self._add_watch(directory)
+        except OSError:
+            os.close(self._fd)
+            raise
+
+    def _add_watch(self, directory):
+        """Start watching a directory, relative to the root."""
+        path = os.fsencode(self.root / directory)
+        descriptor = self._libc.inotify_add_watch(self._fd, path, self._MASK)
+        if descriptor < 0:
+            code = ctypes.get_errno()
+            if code in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                # The directory went away or cannot be watched.
+                return
+            raise OSError(code, os.strerror(code))
+        self._directories[descriptor] = directory
+
+    def _read(self, timeout):
+        """Return the set of paths changed within timeout seconds, without
+        filtering.
+
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changes = set()
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return changes
+
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _cookie, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & self._IN_Q_OVERFLOW:
+                # Events were lost, so treat everything as changed.
+                changes.add('.')
+                continue
+            if mask & self._IN_IGNORED:
+                self._directories.pop(descriptor, None)
+                continue
+
+            directory = self._directories.get(descriptor)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory or '.'
+            changes.add(path)
+
+            if (mask & self._IN_ISDIR and mask & (self._IN_CREATE | self._IN_MOVED_TO) and
+                path not in self._excluded and name != '.git' and
+                not _get_ignored(self.root, [path])):
+                # Watch the new directory and anything created in it before the
+                # watch was in place.
+                for subdirectory in _iter_directories(self.root / path, set()):
+                    self._add_watch(os.path.join(path, subdirectory) if subdirectory else path)
+
+        return changes
+
+    def close(self):
+        """Release the inotify descriptor."""
+        os.close(self._fd)
+
+class _PollingWatcher(_Watcher):
+    """A watcher that compares file timestamps periodically."""
+
+    def __init__(self, root, exclude=()):
+        """_PollingWatcher construction.
+
+        root: The top of the worktree to watch.
+
+        exclude: Paths that are never reported as changed.
+
+        """
+        super().__init__(root, exclude)
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        """Return a mapping from each relative path to its timestamp and size."""
+        snapshot = {}
+        for directory in _iter_directories(self.root, self._excluded):
+            try:
+                with os.scandir(self.root / directory) as entries:
+                    for entry in entries:
+                        if entry.name == '.git':
+                            continue
+                        try:
+                            info = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        path = os.path.join(directory, entry.name)
+                        snapshot[path] = (info.st_mtime_ns, info.st_size)
+            except OSError:
+                continue
+        return snapshot
+
+    def _read(self, timeout):
+        """Return the set of paths changed within timeout seconds, without
+        filtering.
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changes = {path for path in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(path) != self._snapshot.get(path)}
+            self._snapshot = snapshot
+            if changes:
+                return changes
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                time.sleep(min(_POLL_SECONDS, remaining))
+            else:
+                time.sleep(_POLL_SECONDS)
+
+def get_watcher(root, exclude=()):
+    """Return an object whose wait method reports changes to the worktree at
+    root, using inotify if the kernel supports it.
+
+    root: The top of the worktree to watch.
+
+    exclude: Paths that are never reported as changed.
+
+    """
+    try:
+        return _InotifyWatcher(root, exclude)
+    except (OSError, AttributeError):
+        return _PollingWatcher(root, exclude)
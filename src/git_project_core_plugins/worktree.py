@@ -21,15 +21,35 @@
 # with git-project. If not, see <https://www.gnu.org/licenses/>.
 
 from git_project import ConfigObject, Git, GitProject, Plugin, Project
-from git_project import ScopedConfigObject
+from git_project import ScopedConfigObject, SubstitutableConfigObject
 from git_project import add_top_level_command, GitProjectException
+from git_project import capture_command
 
+from git_project_core_plugins.artifact import Artifact
+from git_project_core_plugins.cache import RunFingerprints, copy_path
+from git_project_core_plugins.cache import get_tree_size, trim_lru
 from git_project_core_plugins.common import add_plugin_version_argument
+from git_project_core_plugins.common import format_size
+from git_project_core_plugins.common import get_config_snapshot
+from git_project_core_plugins.common import get_startup_cache
+from git_project_core_plugins.common import get_state_dir
+from git_project_core_plugins.common import invalidate_config
+from git_project_core_plugins.common import is_command_selected
+from git_project_core_plugins.common import parse_size
+from git_project_core_plugins.du import get_disk_usage
+from git_project_core_plugins.history import RunHistory
+from git_project_core_plugins.pool import get_pool
+from git_project_core_plugins.trash import get_trash
 
 import argparse
+import bisect
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
 from pathlib import Path
+import re
 import shutil
+import subprocess
+import time
 import urllib
 
 # Take a path and normalize it to the current working directory.  If the current
@@ -58,6 +78,69 @@ def normalize_path(git, path):
 
     return str(path)
 
+def iter_worktree_paths(git):
+    """Iterate over the paths of every working copy of the repository, starting
+    with the main working copy.
+
+    """
+    output = capture_command(['git',
+                              '-C',
+                              str(git.get_git_common_dir()),
+                              'worktree',
+                              'list',
+                              '--porcelain'])
+    for line in output.decode().splitlines():
+        if line.startswith('worktree '):
+            yield line[len('worktree '):]
+
+def get_cache_dir(git, project):
+    """Return the cache directory shared by all worktrees of the project.  It is
+    the project's cachedir key if set, otherwise a directory in the project's
+    state directory.  It is not created until a run uses it.
+
+    git: An object to query the repository.
+
+    project: The currently active Project.
+
+    """
+    configured = getattr(project, 'cachedir', None)
+    return (Path(configured).expanduser() if configured
+            else get_state_dir(git, project) / 'cache')
+
+def get_cache_entries(path):
+    """Return a (path, size, last_used) tuple for each file under a cache
+    directory, where last_used is the later of its access and modification
+    times.
+
+    path: The cache directory.
+
+    """
+    entries = []
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            try:
+                stat = os.lstat(filepath)
+            except FileNotFoundError:
+                continue
+            entries.append((filepath,
+                            stat.st_size,
+                            max(stat.st_atime, stat.st_mtime)))
+    return entries
+
+def trim_cache_dir(git, project):
+    """Remove the least-recently-used files of the shared cache directory until it
+    fits the project's cachesize key (10G by default).  Return the number of
+    bytes removed.
+
+    git: An object to query the repository.
+
+    project: The currently active Project.
+
+    """
+    limit = parse_size(getattr(project, 'cachesize', None) or '10G')
+    return trim_lru(get_cache_entries(get_cache_dir(git, project)), limit)
+
 # Determine a path and committish from args.
 def get_name_branch_path_and_refname(git, gp, clargs):
     """Given a Project and worktree command-line arguments <name-or-path> and
@@ -90,6 +173,153 @@ def get_name_branch_path_and_refname(git, gp, clargs):
 
     return name, branch, path, refname
 
+def get_worktree_path_index(git, project):
+    """Return the sorted paths of the registered worktrees, each ending with a
+    path separator.  The list is kept in the startup cache, so the git config
+    is only searched again after it changes.
+
+    """
+    if not git.has_repo():
+        return []
+
+    startup_cache = get_startup_cache(git, project)
+    paths = startup_cache.get('worktreepaths')
+    if paths is None:
+        snapshot = get_config_snapshot(git)
+        path_section = f'{project.get_section()}.{Worktree.Path.subsection()}'
+        paths = sorted(os.path.join(path, '')
+                       for path in snapshot.iter_subsections(path_section)
+                       if snapshot.has_item(f'{path_section}.{path}', 'worktree'))
+        startup_cache.set('worktreepaths', paths)
+        startup_cache.save()
+    return paths
+
+def find_worktree_path(paths, path):
+    """Return the longest path in a sorted list from get_worktree_path_index that
+    contains path, without its trailing separator, or None if none does.
+
+    paths: The sorted list of paths.
+
+    path: The path to look up.
+
+    """
+    key = os.path.join(str(path), '')
+    while key:
+        index = bisect.bisect_right(paths, key)
+        if not index:
+            return None
+        candidate = paths[index - 1]
+        if key.startswith(candidate):
+            return candidate[:-1] or os.sep
+        # Any shorter match is a prefix of the part that candidate shares
+        # with key, up to its last separator.
+        common = os.path.commonprefix([candidate, key])
+        key = common[:common.rfind(os.sep) + 1]
+    return None
+
+def iter_worktrees(git, project):
+    """Iterate over the registered worktrees, yielding the path, the Worktree and
+    a Git object for each.  While each is yielded the worktree's scope is
+    pushed and the current directory is the worktree, so that substitution of
+    {path}, {worktree}, {branch} and the like refers to it.
+
+    """
+    snapshot = get_config_snapshot(git)
+    path_section = f'{project.get_section()}.{Worktree.Path.subsection()}'
+
+    cwd = Path.cwd()
+    for path in iter_worktree_paths(git):
+        if not snapshot.has_section(f'{path_section}.{path}'):
+            continue
+
+        # This pushes the worktree's scope.
+        worktree = Worktree.get_by_path(git, project, path)
+        if not worktree:
+            continue
+
+        try:
+            # Substitution looks at the current directory to find the working
+            # copy root.
+            os.chdir(path)
+            yield path, worktree, Git()
+        finally:
+            os.chdir(cwd)
+            project.pop_scope()
+
+class _Substitution(SubstitutableConfigObject):
+    """A SubstitutableConfigObject without items of its own, for substituting
+    project values outside of a run.
+
+    """
+
+def _substitute(git, project, worktree, value):
+    """Substitute project values into value for a worktree whose scope is pushed,
+    as by iter_worktrees.
+
+    """
+    substitution = _Substitution.get(git,
+                                     project.get_section(),
+                                     'substitution',
+                                     worktree.get_ident())
+    return substitution.substitute_value(git, project, value)
+
+def _get_distance(git, first, second):
+    """Return the number of commits reachable from one of two commits but not the
+    other.
+
+    """
+    output = capture_command(['git',
+                              '-C',
+                              str(git.get_git_common_dir()),
+                              'rev-list',
+                              '--count',
+                              f'{first}...{second}'])
+    return int(output.decode())
+
+def seed_builddir(git, project, worktree):
+    """Copy the build directory of the worktree whose commit is closest to that of
+    a new worktree into the new worktree's build directory, so that its first
+    build only rebuilds what differs.  Files are copied as reflinks where the
+    filesystem supports them.  Return the name of the worktree copied from, or
+    None if there was none to copy.
+
+    git: An object to query the repository.
+
+    project: The currently active Project.
+
+    worktree: The new Worktree.
+
+    """
+    if not getattr(project, 'builddir', None):
+        raise GitProjectException('No builddir configured to seed')
+
+    target = None
+    candidates = []
+    for _path, other, other_git in iter_worktrees(git, project):
+        builddir = _substitute(other_git, project, other, '{builddir}')
+        commit = str(other_git.get_committish_commit('HEAD').id)
+        if other.get_ident() == worktree.get_ident():
+            target = (builddir, commit)
+        elif os.path.isdir(builddir):
+            candidates.append((builddir, commit, other.get_ident()))
+
+    if not target:
+        return None
+    builddir, commit = target
+    candidates = [candidate for candidate in candidates if candidate[0] != builddir]
+    if not candidates or (os.path.lexists(builddir) and os.listdir(builddir)):
+        return None
+
+    source, _commit, name = min(candidates,
+                                key=lambda candidate: _get_distance(git,
+                                                                    commit,
+                                                                    candidate[1]))
+    if os.path.isdir(builddir):
+        os.rmdir(builddir)
+    Path(builddir).parent.mkdir(parents=True, exist_ok=True)
+    copy_path(source, builddir)
+    return name
+
 # worktree add
 def command_worktree_add(git, gitproject, project, clargs):
     """Implement git-project worktree add."""
@@ -120,6 +350,11 @@ def command_worktree_add(git, gitproject, project, clargs):
                             committish=branch)
     worktree.add()
 
+    if hasattr(clargs, 'seed_builddir') and clargs.seed_builddir:
+        seeded = seed_builddir(git, project, worktree)
+        if seeded:
+            print(f'Seeded build directory from {seeded}')
+
     return worktree
 
 def command_worktree_rm(git, gitproject, project, clargs):
@@ -132,6 +367,208 @@ def command_worktree_rm(git, gitproject, project, clargs):
 
     worktree.rm()
 
+def command_worktree_pool(git, gitproject, project, clargs):
+    """Implement git-project worktree pool."""
+    pool = get_pool(git, project)
+    if clargs.size is not None:
+        if clargs.size < 0:
+            raise GitProjectException('--size must not be negative')
+        pool.fill(clargs.size)
+
+    ready = pool.list()
+    print(f'{len(ready)} of {pool.get_size()} worktrees ready')
+    for path in ready:
+        print(f'  {path}')
+
+def command_worktree_gc(git, gitproject, project, clargs):
+    """Implement git-project worktree gc."""
+    removed = trim_cache_dir(git, project)
+    if removed:
+        print(f'Removed {format_size(removed)} from the cache')
+
+    failures = get_trash(git, project).empty()
+    for path, error in failures:
+        print(f'Could not remove {path}: {error}')
+    if failures:
+        return 1
+    print('Trash is empty')
+
+def _get_git_status(path):
+    """Return the branch, whether tracked files have changes and the commits
+    ahead of and behind the upstream branch of the worktree at path.  The
+    counts are None if the branch has no upstream.
+
+    """
+    result = subprocess.run(['git',
+                             'status',
+                             '--porcelain=v2',
+                             '--branch',
+                             '--untracked-files=no'],
+                            cwd=path,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL)
+    branch = None
+    dirty = False
+    ahead = behind = None
+    for line in result.stdout.decode(errors='replace').splitlines():
+        if line.startswith('# branch.head '):
+            branch = line[len('# branch.head '):]
+        elif line.startswith('# branch.ab '):
+            ahead, behind = (int(count[1:]) for count in line.split()[2:4])
+        elif not line.startswith('#'):
+            dirty = True
+    return branch, dirty, ahead, behind
+
+def _format_age(seconds):
+    """Format a number of seconds as a short age."""
+    for unit, length in (('d', 86400), ('h', 3600), ('m', 60)):
+        if seconds >= length:
+            return f'{seconds // length:.0f}{unit}'
+    return f'{seconds:.0f}s'
+
+def command_worktree_status(git, gitproject, project, clargs):
+    """Implement git-project worktree status."""
+    # Substitution pushes scopes and changes directory, so gather what each
+    # worktree needs first and only inspect the worktrees in parallel.
+    worktrees = []
+    has_builddir = bool(getattr(project, 'builddir', None))
+    for path, worktree, worktree_git in iter_worktrees(git, project):
+        builddir = None
+        if has_builddir:
+            builddir = _substitute(worktree_git, project, worktree, '{builddir}')
+        worktrees.append((worktree.get_ident(), path, builddir))
+
+    if not worktrees:
+        print('No registered worktrees')
+        return
+
+    latest = RunHistory(git, project).get_latest_by_worktree()
+    width = max(len(name) for name, _path, _builddir in worktrees)
+
+    def inspect(name, path, builddir):
+        branch, dirty, ahead, behind = _get_git_status(path)
+        size = (get_tree_size(builddir)
+                if builddir and os.path.isdir(builddir) else None)
+        return name, branch, dirty, ahead, behind, size
+
+    print(f'{"worktree":<{width}}  {"branch":<20}  {"state":<5}  '
+          f'{"ahead":>5} {"behind":>6}  {"builddir":>8}  last run')
+    with ThreadPoolExecutor(max_workers=min(32, len(worktrees))) as executor:
+        futures = [executor.submit(inspect, *worktree) for worktree in worktrees]
+        # Print each worktree as soon as it has been inspected.
+        for future in as_completed(futures):
+            name, branch, dirty, ahead, behind, size = future.result()
+            state = 'dirty' if dirty else 'clean'
+            counts = (f'{ahead:>5} {behind:>6}' if ahead is not None
+                      else f'{"-":>5} {"-":>6}')
+            size = format_size(size) if size is not None else '-'
+            run = '-'
+            entry = latest.get(name)
+            if entry:
+                result = 'ok' if entry['status'] == 0 else f'failed ({entry["status"]})'
+                run = (f'{entry["alias"]} {entry["name"]} {result}, '
+                       f'{_format_age(time.time() - entry["time"])} ago')
+            print(f'{name:<{width}}  {branch or "-":<20}  {state:<5}  '
+                  f'{counts}  {size:>8}  {run}', flush=True)
+
+# The directories of a worktree measured by worktree du, besides artifacts.
+_DU_KEYS = ('builddir', 'prefix', 'installdir')
+
+def _iter_other_artifact_paths(git, project):
+    """Iterate over the substituted paths of artifacts not associated with
+    worktrees.
+
+    """
+    prefix = f'{project.get_section()}.{Artifact.subsection()}.'
+    try:
+        output = capture_command(['git',
+                                  '-C',
+                                  str(git.get_git_common_dir()),
+                                  'config',
+                                  '--get-regexp',
+                                  f'^{re.escape(prefix)}.*\\.path$'],
+                                 show_error=False)
+    except Exception:
+        # There are no artifacts.
+        return
+
+    for line in output.decode().splitlines():
+        name, _separator, value = line.partition(' ')
+        ident = name[len(prefix):-len('.path')]
+        if ident == 'worktree' or ident.startswith('worktree.'):
+            continue
+        artifact = Artifact.get(git, project.get_section(), ident)
+        try:
+            yield artifact.substitute_value(git, project, value)
+        except Exception:
+            # It refers to something only defined in some other scope.
+            continue
+
+def command_worktree_du(git, gitproject, project, clargs):
+    """Implement git-project worktree du."""
+    # Substitution pushes scopes and changes directory, so find every path
+    # first and then measure them all at once.
+    worktrees = []
+    for path, worktree, worktree_git in iter_worktrees(git, project):
+        paths = {'checkout': [path]}
+        for key in _DU_KEYS:
+            if getattr(project, key, None):
+                paths[key] = [_substitute(worktree_git, project, worktree, f'{{{key}}}')]
+        artifact = Artifact.find(worktree_git,
+                                 project.get_section(),
+                                 (f'worktree.{worktree.get_ident()}', 'worktree'))
+        if artifact:
+            paths['artifacts'] = [artifact.substitute_value(worktree_git, project, value)
+                                  for value in artifact.iter_multival('path')]
+        worktrees.append((worktree.get_ident(), paths))
+
+    others = list(_iter_other_artifact_paths(git, project))
+
+    measured = {path for _name, paths in worktrees
+                for kind_paths in paths.values() for path in kind_paths}
+    measured.update(others)
+
+    disk_usage = get_disk_usage(git, project, not clargs.refresh)
+    sizes = disk_usage.measure(sorted(measured))
+    disk_usage.save()
+
+    columns = ('checkout',) + _DU_KEYS + ('artifacts',)
+    rows = []
+    for name, paths in worktrees:
+        used = {kind: sum(sizes[path] for path in kind_paths)
+                for kind, kind_paths in paths.items()}
+        rows.append((sum(used.values()), name, used))
+    rows.sort(key=lambda row: row[0], reverse=True)
+
+    width = max([len(name) for _total, name, _used in rows] + [len('worktree')])
+    print(f'{"worktree":<{width}}' +
+          ''.join(f'  {column:>10}' for column in columns) +
+          f'  {"total":>10}')
+    for total, name, used in rows:
+        print(f'{name:<{width}}' +
+              ''.join(f'  {format_size(used[column]) if column in used else "-":>10}'
+                      for column in columns) +
+              f'  {format_size(total):>10}')
+
+    for path in others:
+        print(f'{format_size(sizes[path]):>10}  {path}')
+
+    # Paths inside other paths were not counted with them, so each byte counts
+    # once as long as each path does.
+    distinct = {os.path.abspath(path): size for path, size in sizes.items()}
+    print(f'Total {format_size(sum(distinct.values()))}')
+
+def command_worktree_cache(git, gitproject, project, clargs):
+    """Implement git-project worktree cache."""
+    path = get_cache_dir(git, project)
+    limit = parse_size(getattr(project, 'cachesize', None) or '10G')
+    if clargs.trim:
+        removed = trim_lru(get_cache_entries(path), limit)
+        print(f'Removed {format_size(removed)}')
+    entries = get_cache_entries(path)
+    size = sum(size for _path, size, _last_used in entries)
+    print(f'{path}: {format_size(size)} of {format_size(limit)} in {len(entries)} files')
+
 class Worktree(ScopedConfigObject):
     """A ScopedConfigObject to manage worktree git configs."""
     class Path(ConfigObject):
@@ -264,36 +701,70 @@ class Worktree(ScopedConfigObject):
         return None
 
     def add(self):
-        """Create a new worktree"""
+        """Create a new worktree, taking one from the worktree pool if one is ready
+        and refilling the pool in the background."""
+        # Constructing this Worktree wrote its sections.
+        invalidate_config(self._git, self.get_section())
+        invalidate_config(self._git, self._pathsection.get_section())
+
+        project = Project.get(self._git, self._project_section)
+        pool = get_pool(self._git, project)
+        if pool.claim(self.get_ident(), self.path, self.committish):
+            pool.fill_in_background()
+            return
+
         self._git.add_worktree(self.get_ident(), self.path, self.committish)
 
     def rm(self):
-        """Remove a worktree, deleting its workarea, builds and installs."""
-        # TODO: Use python utils.
+        """Remove a worktree, deleting its workarea, builds and installs.  The shared
+        cache directory is kept for the other worktrees.  Directories are moved
+        to the project's trash at once and deleted in the background."""
+        project = Project.get(self._git, self._project_section)
+        trash = get_trash(self._git, project)
         try:
-            shutil.rmtree(self.path)
-            shutil.rmtree(self.builddir)
-            shutil.rmtree(self.prefix)
-            shutil.rmtree(self.installdir)
-        except:
-            pass
+            self._move_to_trash(trash)
+
+            self._git.prune_worktree(self.get_ident())
+            RunFingerprints(self._git, project, self.get_ident()).remove()
+
+            for branch in project.iterbranches():
+                if branch not in self._git.iterbranches():
+                    continue
+                branch_name = self._git.committish_to_refname(branch)
+                committish_name = self._git.committish_to_refname(self.committish)
+                if branch_name == committish_name:
+                    break
+            else:
+                project.prune_branch(self.committish)
 
-        self._git.prune_worktree(self.get_ident())
+            self._pathsection.rm()
+            super().rm()
+            invalidate_config(self._git, self._pathsection.get_section())
+            invalidate_config(self._git, self.get_section())
+        finally:
+            trash.empty_in_background()
 
-        project = Project.get(self._git, self._project_section)
+    def _move_to_trash(self, trash):
+        """Move the worktree's workarea, builds and installs to the trash.  If any of
+        them cannot be moved, move back those already moved and raise
+        GitProjectException, leaving the worktree as it was.
 
-        for branch in project.iterbranches():
-            if branch not in self._git.iterbranches():
-                continue
-            branch_name = self._git.committish_to_refname(branch)
-            committish_name = self._git.committish_to_refname(self.committish)
-            if branch_name == committish_name:
-                break
-        else:
-            project.prune_branch(self.committish)
+        trash: The project's Trash.
 
-        self._pathsection.rm()
-        super().rm()
+        """
+        moved = []
+        for key in ('path', 'builddir', 'prefix', 'installdir'):
+            value = getattr(self, key, None)
+            if not value:
+                continue
+            try:
+                destination = trash.move(value, f'{self.get_ident()}-{key}')
+            except OSError as exception:
+                for original, trashed in reversed(moved):
+                    os.rename(trashed, original)
+                raise GitProjectException(f'Could not remove {value}: {exception}')
+            if destination:
+                moved.append((value, destination))
 
 class WorktreePlugin(Plugin):
     """
@@ -301,10 +772,15 @@ class WorktreePlugin(Plugin):
 
     Summary:
 
-      git <project> worktree add [-b <branch>] <name-or-path> [<committish>]
+      git <project> worktree add [-b <branch>] [--seed-builddir] <name-or-path> [<committish>]
       git <project> worktree rm <name-or-path>
       git <project> worktree config <key> [<value>]
       git <project> worktree config [--unset] <key> [<value>]
+      git <project> worktree status
+      git <project> worktree du [--refresh]
+      git <project> worktree gc
+      git <project> worktree pool [--size N]
+      git <project> worktree cache [--trim]
 
     ``worktree add'' creates a new git worktree named via <name-or-path> with
     <committish> checked out.  If we pass -b <branch> we'll get a new branch at
@@ -363,6 +839,76 @@ class WorktreePlugin(Plugin):
     worktree without a buildwidth configured), then {buildwidth} will be
     substituted with 16.
 
+    ``worktree status'' shows a line for each registered worktree: its
+    branch, whether tracked files have uncommitted changes, how many commits
+    it is ahead of and behind its upstream branch, the size of its build
+    directory and the result of the last run in it.  Worktrees are inspected
+    in parallel and each line is printed as soon as its worktree has been
+    inspected, so the order varies.
+
+    ``worktree du'' shows the disk space used by each worktree's checkout, its
+    builddir, prefix and installdir and the artifacts associated with it,
+    largest first, followed by the space used by artifacts associated with
+    anything else.  A directory's space does not include the other directories
+    shown that are inside it, such as a builddir inside the checkout, so
+    nothing is counted twice.  Directories are read in parallel.  The space
+    used by the files directly in each directory is cached in the project's
+    state directory along with the directory's modification time, and a
+    directory whose modification time has not changed is not read again, so
+    measuring again after a build only reads the directories the build
+    changed.  Files rewritten in place do not change their directory's
+    modification time; --refresh reads every directory again.
+
+    ``worktree rm'' moves the worktree's directory and its builddir, prefix
+    and installdir, if the worktree sets them, into a trash directory on the
+    same filesystem, which is instant however large they are, and deletes
+    them in a background process.  ``worktree gc'' deletes whatever is still
+    in the trash, for example after the background process was interrupted,
+    and reports anything that could not be deleted.  It also trims the shared
+    cache directory described below.
+
+    A new worktree starts with an empty build directory, so its first build
+    rebuilds everything.  With --seed-builddir, worktree add instead copies
+    the build directory, the substitution of the builddir key, of the
+    worktree whose commit is closest to the new one, counting the commits
+    reachable from one but not the other.  Files are copied as reflinks on
+    filesystems that support them, which takes almost no time or space, and
+    copied normally elsewhere.  This helps build systems whose build
+    directories do not record their own location and that decide what to
+    rebuild from file contents or, with a compiler cache, cache hits rather
+    than timestamps alone:
+
+      git <project> worktree add --seed-builddir topic
+
+    Checking out a large repository can take a long time.  ``worktree pool
+    --size N'' keeps N detached worktrees checked out in advance, at the commit
+    of the repository's HEAD, under the project's state directory.  worktree
+    add then moves one of them into place and checks out the requested branch,
+    which only updates the files that differ, and refills the pool in the
+    background.  When no pooled worktree is ready, or the new worktree is on
+    another filesystem, worktree add checks out a new one as usual.  Without
+    --size, ``worktree pool'' lists the ready worktrees.  --size 0 empties the
+    pool:
+
+      git <project> worktree pool --size 2
+      git <project> worktree add topic
+
+    Build caches such as compiler caches are most useful when all worktrees
+    share them, since worktrees usually build much the same sources.  The
+    {cachedir} substitution names a cache directory shared by every worktree
+    of the project, by default in the project's state directory under the git
+    common directory.  Setting the project's cachedir key moves it elsewhere.
+    Unlike build and install directories, the cache directory is not removed
+    along with a worktree:
+
+      git <project> add build release "CCACHE_DIR={cachedir} {make}"
+
+    ``worktree cache'' shows the size of the cache directory and its quota,
+    the project's cachesize key (10G by default).  With --trim, the
+    least-recently-used files are removed until the cache fits its quota.
+    ``worktree gc'' trims the cache too.  The cache directory is created the
+    first time a run's command names it.
+
     See also:
 
       artifact
@@ -388,19 +934,11 @@ class WorktreePlugin(Plugin):
         plugin_manager: The active  PluginManager.
 
         """
-        path = Path.cwd()
-        path.resolve()
-        while True:
-            if ConfigObject.exists(git,
-                                   project.get_section(),
-                                   Worktree.Path.subsection(),
-                                   str(path)):
-                worktree = Worktree.get_by_path(git, project, str(path))
-                break
-            parent = path.parent
-            if parent == path:
-                break
-            path = parent
+        path = find_worktree_path(get_worktree_path_index(git, project),
+                                  Path.cwd().resolve())
+        if path:
+            # This pushes the worktree's scope.
+            Worktree.get_by_path(git, project, path)
 
     def add_arguments(self,
                       git,
@@ -410,6 +948,21 @@ class WorktreePlugin(Plugin):
                       plugin_manage):
         """Add arguments for 'git-project worktree.'"""
 
+        # add a clone option to create a worktree layout.
+        clone_parser = parser_manager.find_parser('clone')
+        if clone_parser:
+            clone_parser.add_argument('--worktree', action='store_true',
+                                      help='Create a layout convenient for worktree use')
+
+        # add an init option to create a worktree layout.
+        init_parser = parser_manager.find_parser('init')
+        if init_parser:
+            init_parser.add_argument('--worktree', action='store_true',
+                                     help='Create a layout convenient for worktree use')
+
+        if not is_command_selected(Worktree.get_managing_command()):
+            return
+
         # worktree
         worktree_parser = add_top_level_command(parser_manager,
                                                 Worktree.get_managing_command(),
@@ -442,6 +995,9 @@ class WorktreePlugin(Plugin):
                                          '--branch',
                                          metavar='BRANCH',
                                          help='Create BRANCH for the worktree')
+        worktree_add_parser.add_argument('--seed-builddir',
+                                         action='store_true',
+                                         help='Copy the build directory of the closest worktree')
 
         # worktree rm
         worktree_rm_parser = parser_manager.add_parser(worktree_subparser,
@@ -456,17 +1012,54 @@ class WorktreePlugin(Plugin):
         worktree_rm_parser.add_argument('-f', '--force', action='store_true',
                                         help='Remove even if branch is not merged')
 
-        # add a clone option to create a worktree layout.
-        clone_parser = parser_manager.find_parser('clone')
-        if clone_parser:
-            clone_parser.add_argument('--worktree', action='store_true',
-                                      help='Create a layout convenient for worktree use')
+        # worktree pool
+        worktree_pool_parser = parser_manager.add_parser(worktree_subparser,
+                                                         'pool',
+                                                         'worktree-pool',
+                                                         help='Keep checked-out worktrees ready for worktree add')
 
-        # add an init option to create a worktree layout.
-        init_parser = parser_manager.find_parser('init')
-        if init_parser:
-            init_parser.add_argument('--worktree', action='store_true',
-                                     help='Create a layout convenient for worktree use')
+        worktree_pool_parser.set_defaults(func=command_worktree_pool)
+
+        worktree_pool_parser.add_argument('--size', type=int, metavar='N',
+                                          help='Keep N worktrees ready')
+
+        # worktree status
+        worktree_status_parser = parser_manager.add_parser(worktree_subparser,
+                                                           'status',
+                                                           'worktree-status',
+                                                           help='Show the state of every worktree')
+
+        worktree_status_parser.set_defaults(func=command_worktree_status)
+
+        # worktree du
+        worktree_du_parser = parser_manager.add_parser(worktree_subparser,
+                                                       'du',
+                                                       'worktree-du',
+                                                       help='Show the disk space used by each worktree')
+
+        worktree_du_parser.set_defaults(func=command_worktree_du)
+
+        worktree_du_parser.add_argument('--refresh', action='store_true',
+                                        help='Read every directory instead of using cached results')
+
+        # worktree gc
+        worktree_gc_parser = parser_manager.add_parser(worktree_subparser,
+                                                       'gc',
+                                                       'worktree-gc',
+                                                       help='Delete removed worktrees still in the trash')
+
+        worktree_gc_parser.set_defaults(func=command_worktree_gc)
+
+        # worktree cache
+        worktree_cache_parser = parser_manager.add_parser(worktree_subparser,
+                                                          'cache',
+                                                          'worktree-cache',
+                                                          help='Show the size of the shared cache directory')
+
+        worktree_cache_parser.set_defaults(func=command_worktree_cache)
+
+        worktree_cache_parser.add_argument('--trim', action='store_true',
+                                           help='Remove least-recently-used files beyond the cache quota')
 
     def _choose_main_branch(self, git):
         """Return the refname of the main branch.  Ask the user if we cannot determine a
@@ -22,6 +22,8 @@
 
 from git_project.test_support import check_config_file
 from git_project_core_plugins import ConfigPlugin
+from git_project_core_plugins.common import get_config_snapshot
+from git_project_core_plugins.common import invalidate_config
 import common
 
 import os
@@ -180,3 +182,26 @@ def test_shell_no_dup(reset_directory, git_project_runner, git):
     check_config_file('project',
                       'flavor',
                       {'devrel', 'check-devrel'})
+
+def test_config_snapshot(reset_directory, git, project):
+    section = f'{project.get_section()}.run.test'
+    git.config.set_item(section, 'command', 'make test')
+
+    snapshot = get_config_snapshot(git)
+    assert snapshot is get_config_snapshot(git)
+    assert snapshot.has_section(section)
+    assert snapshot.get_item(section, 'command') == 'make test'
+    assert not snapshot.has_section(f'{section}.missing')
+
+    # Writes through git.config are seen once the section is invalidated.
+    git.config.add_item(section, 'depends', 'a')
+    git.config.add_item(section, 'depends', 'b')
+    assert not snapshot.has_item(section, 'depends')
+    invalidate_config(git, section)
+    assert set(snapshot.iter_multival(section, 'depends')) == {'a', 'b'}
+
+    # Writes through the snapshot do too.
+    snapshot.rm_items(section, 'depends')
+    assert not snapshot.has_item(section, 'depends')
+    snapshot.set_item(section, 'command', 'make check')
+    assert snapshot.get_item(section, 'command') == 'make check'
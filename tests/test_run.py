@@ -20,12 +20,29 @@
 # You should have received a copy of the GNU Affero General Public License along
 # with git-project. If not, see <https://www.gnu.org/licenses/>.
 
+import json
 import os
+from pathlib import Path
 import re
+import subprocess
+import sys
+import threading
+import time
 
 import git_project
 from git_project.test_support import check_config_file
 from git_project_core_plugins import RunPlugin
+from git_project_core_plugins import run as run_module
+from git_project_core_plugins.bench import get_outliers
+from git_project_core_plugins.common import get_config_includes
+from git_project_core_plugins.common import get_config_stamp
+from git_project_core_plugins.jobs import Cancellation, Job, get_argv
+from git_project_core_plugins.jobs import get_max_ready
+from git_project_core_plugins.load import get_cgroup_cpu_quota
+from git_project_core_plugins.load import get_memory_pressure
+from git_project_core_plugins.perf import parse_counter, parse_metric
+from git_project_core_plugins.runlog import RotatingLog
+from git_project_core_plugins.watch import _PollingWatcher, get_watcher
 import common
 
 def test_run_add_arguments(reset_directory,
@@ -39,6 +56,80 @@ def test_run_add_arguments(reset_directory,
                            'run',
                            '--help')
 
+def test_run_add_arguments_lazy(reset_directory,
+                                monkeypatch,
+                                git,
+                                gitproject,
+                                project,
+                                parser_manager,
+                                plugin_manager):
+    monkeypatch.setattr(sys, 'argv', ['git-project', 'worktree', 'config'])
+    RunPlugin().add_arguments(git,
+                              gitproject,
+                              project,
+                              parser_manager,
+                              plugin_manager)
+
+    assert not parser_manager.find_parser('run')
+    assert not parser_manager.find_parser('add-run')
+    assert not parser_manager.find_parser('rm-run')
+
+def test_run_add_arguments_lazy_selected(reset_directory,
+                                         monkeypatch,
+                                         git,
+                                         gitproject,
+                                         project,
+                                         parser_manager,
+                                         plugin_manager):
+    monkeypatch.setattr(sys, 'argv', ['git-project', 'run', 'test'])
+    RunPlugin().add_arguments(git,
+                              gitproject,
+                              project,
+                              parser_manager,
+                              plugin_manager)
+
+    assert parser_manager.find_parser('run')
+    assert not parser_manager.find_parser('add-run')
+
+def test_run_startup_cache(reset_directory,
+                           project,
+                           git,
+                           git_project_runner):
+    project.add_item('run', 'release')
+
+    git_project_runner.run(r'\s*release', '', 'run', '--help')
+
+    cachefile = (Path(git.get_git_common_dir()) / 'git-project' /
+                 project.get_section() / 'startup.json')
+    assert cachefile.exists()
+
+    # A config change invalidates the cached run list and epilog.
+    git_project_runner.run('.*', '', 'add', 'run', 'debug', 'make debug')
+    git_project_runner.run(r'(\s*debug\s*release|\s*release\s*debug)',
+                           '',
+                           'run',
+                           '--help')
+
+def test_run_config_stamp_includes(reset_directory, git, tmp_path):
+    config = Path(git.get_git_common_dir()) / 'config'
+    with open(config, 'a') as configfile:
+        configfile.write('[include]\n'
+                         '\tpath = extra.config\n'
+                         '[includeIf "onbranch:release"]\n'
+                         f'\tpath = "{tmp_path}/release.config" ; comment\n')
+    extra = config.parent / 'extra.config'
+    extra.write_text(f'[include]\n\tpath = {tmp_path}/nested.config\n')
+
+    assert get_config_includes(config) == [(extra, ''),
+                                           (tmp_path / 'nested.config', ''),
+                                           (tmp_path / 'release.config',
+                                            'onbranch:release')]
+
+    # Changing an included file changes the stamp.
+    stamp = get_config_stamp(git)
+    (tmp_path / 'nested.config').write_text('[user]\n\tname = Nested\n')
+    assert get_config_stamp(git) != stamp
+
 def test_run_get_no_repo(reset_directory, git, project):
     plugin = RunPlugin()
     Run = plugin.get_class_for('run')
@@ -383,3 +474,758 @@ def test_run_substitute_empty_option_name_key(git_project_runner,
                            '.*',
                            'run',
                            'test')
+
+def test_run_multiple_serial(git_project_runner,
+                             git,
+                             capsys):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'first',
+                           'echo first {options}')
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'second',
+                           'echo second {options}')
+
+    git_project_runner.run(r'echo first opt\necho second opt',
+                           '.*',
+                           'run',
+                           'first',
+                           'second',
+                           'opt')
+
+def test_run_multiple_jobs(git_project_runner,
+                           git,
+                           capsys):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'first',
+                           'echo first-output')
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'second',
+                           'echo second-output')
+
+    git_project_runner.run(r'^\[first\] first-output$',
+                           '.*',
+                           'run',
+                           '--jobs',
+                           '2',
+                           'first',
+                           'second')
+
+    git_project_runner.run(r'^\[second\] second-output$',
+                           '.*',
+                           'run',
+                           'first',
+                           'second',
+                           '-j',
+                           '2')
+
+def test_run_multiple_jobs_status(git_project_runner,
+                                  git,
+                                  capsys):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'pass',
+                           'true')
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'fail',
+                           'exit 3')
+
+    git_project_runner.expect_fail = True
+
+    git_project_runner.run('.*',
+                           'fail failed with exit status 3',
+                           'run',
+                           '--jobs',
+                           '2',
+                           'pass',
+                           'fail')
+
+def test_run_jobs_auto(git_project_runner, git):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*', '', 'add', 'run', 'first', 'echo first-output')
+    git_project_runner.run('.*', '', 'add', 'run', 'second', 'echo second-output')
+
+    git_project_runner.run(r'^\[second\] second-output$',
+                           '.*',
+                           'run',
+                           '--jobs',
+                           'auto',
+                           'first',
+                           'second')
+
+def test_run_cgroup_cpu_quota(tmp_path):
+    proc = tmp_path / 'proc'
+    proc.mkdir()
+    (proc / 'cgroup').write_text('0::/user.slice/build\n')
+
+    root = tmp_path / 'cgroup'
+    leaf = root / 'user.slice' / 'build'
+    leaf.mkdir(parents=True)
+    (leaf / 'cpu.max').write_text('max 100000\n')
+    assert get_cgroup_cpu_quota(root, proc) is None
+
+    (root / 'user.slice' / 'cpu.max').write_text('250000 100000\n')
+    assert get_cgroup_cpu_quota(root, proc) == 2.5
+
+    (leaf / 'cpu.max').write_text('150000 100000\n')
+    assert get_cgroup_cpu_quota(root, proc) == 1.5
+
+def test_run_memory_pressure(tmp_path):
+    psi = tmp_path / 'memory'
+    psi.write_text('some avg10=12.50 avg60=3.00 avg300=1.00 total=100\n'
+                   'full avg10=2.00 avg60=1.00 avg300=0.50 total=50\n')
+    assert get_memory_pressure(psi) == 12.5
+    assert get_memory_pressure(tmp_path / 'missing') is None
+
+def test_run_matrix(git_project_runner, git):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*', '', 'add', 'run', 'build', 'echo build-{option_key}')
+
+    git_project_runner.run(r'^\[build:ubsan-gcc\] build-ubsan-gcc$',
+                           '.*',
+                           'run',
+                           '--matrix',
+                           'build',
+                           '--',
+                           'asan,ubsan',
+                           'x',
+                           'clang,gcc')
+
+    git_project_runner.run(r'^\[build:asan-clang\] build-asan-clang$',
+                           '.*',
+                           'run',
+                           '--matrix',
+                           '--jobs',
+                           '2',
+                           'build',
+                           '--',
+                           'asan,ubsan',
+                           'x',
+                           'clang,gcc')
+
+def test_run_matrix_expand():
+    assert run_module._get_matrix(['a,b', 'x', 'c']) == [['a', 'c'], ['b', 'c']]
+    assert run_module._get_matrix(['a', 'b']) == [['a'], ['b']]
+
+    targets, dependencies, formats = run_module._expand_matrix(
+        {'check': 'check-run', 'release': 'release-run'},
+        {'check': {'release'}},
+        [['a'], ['b']])
+    assert list(targets) == ['check:a', 'release:a', 'check:b', 'release:b']
+    assert dependencies == {'check:a': {'release:a'}, 'check:b': {'release:b'}}
+    assert formats['release:b']['options'] == 'b'
+
+def test_run_direct_argv():
+    assert get_argv('git status --short') == ['git', 'status', '--short']
+    assert get_argv('cmake -DTYPE=Release ..') == ['cmake', '-DTYPE=Release', '..']
+    assert get_argv('echo $HOME') is None
+    assert get_argv('make && make check') is None
+    assert get_argv("git log --format='%H'") is None
+    assert get_argv('ls *.py') is None
+    assert get_argv('CC=clang make') is None
+    assert get_argv('cd src') is None
+    assert get_argv('exit 3') is None
+    assert get_argv('no-such-program-anywhere') is None
+    assert get_argv('') is None
+
+def test_run_shell_opt_out(git_project_runner, git, tmp_path, monkeypatch):
+    workdir = git.get_working_copy_root()
+
+    # The shell's pwd reports the directory as named in PWD while the pwd
+    # program reports where the directory really is.
+    link = tmp_path / 'link'
+    link.symlink_to(workdir)
+    monkeypatch.setenv('PWD', str(link))
+
+    git_project_runner.chdir(link)
+
+    git_project_runner.run('.*', '', 'add', 'run', 'direct', 'pwd')
+    git_project_runner.run(f'^{re.escape(str(Path(workdir).resolve()))}$',
+                           '',
+                           'run',
+                           '--tail',
+                           '5',
+                           'direct')
+
+    git_project_runner.run('.*', '', 'config', 'run.direct.shell', 'true')
+    git_project_runner.run(f'^{re.escape(str(link))}$',
+                           '',
+                           'run',
+                           '--tail',
+                           '5',
+                           'direct')
+
+def test_run_bench(git_project_runner, git):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*', '', 'add', 'run', 'fast', 'true')
+    git_project_runner.run('.*', '', 'add', 'run', 'slow', 'sleep 0.05')
+
+    git_project_runner.run(r'^fast ran fastest\n.*times faster than slow$',
+                           '',
+                           'run',
+                           '--bench',
+                           '--warmup',
+                           '1',
+                           '--runs',
+                           '3',
+                           'fast',
+                           'slow')
+
+    git_project_runner.run('.*', '', 'add', 'run', 'broken', 'false')
+
+    git_project_runner.expect_fail = True
+
+    git_project_runner.run(r'broken failed with exit status 1',
+                           '',
+                           'run',
+                           '--bench',
+                           'broken')
+
+def test_run_bench_outliers():
+    assert get_outliers([1.0, 1.1, 1.0, 1.05, 0.95, 5.0]) == [5.0]
+    assert get_outliers([1.0, 1.1, 1.0, 1.05, 0.95, 1.02]) == []
+    assert get_outliers([1.0, 1.0, 5.0]) == []
+
+def test_run_depends(git_project_runner,
+                     git,
+                     capsys):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'run',
+                           '--make-alias',
+                           'build')
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'configure',
+                           'echo configured')
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'build',
+                           'release',
+                           'echo built')
+
+    git_project_runner.run('.*',
+                           '',
+                           'config',
+                           '--add',
+                           'build.release.depends',
+                           'run.configure')
+
+    git_project_runner.run(r'\[run.configure\] configured\n(.*\n)*\[release\] built\n(.*\n)*Critical path: run.configure \(.*\) -> release',
+                           '.*',
+                           'build',
+                           'release')
+
+def test_run_get_max_ready():
+    assert get_max_ready(['a', 'b', 'c'], {'c': {'b'}, 'b': {'a'}}) == 1
+    assert get_max_ready(['a', 'b', 'c'], {'c': {'a', 'b'}}) == 2
+    assert get_max_ready(['a', 'b', 'c', 'd'],
+                         {'b': {'a'}, 'c': {'a'}, 'd': {'a'}}) == 3
+
+def test_run_depends_parallel(git_project_runner,
+                              git,
+                              monkeypatch):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    requested = []
+    get_scheduler = run_module._get_scheduler
+    def record_scheduler(jobs):
+        requested.append(jobs)
+        return get_scheduler(jobs)
+    monkeypatch.setattr(run_module, '_get_scheduler', record_scheduler)
+
+    for name in ('left', 'right', 'both', 'last', 'chain'):
+        git_project_runner.run('.*', '', 'add', 'run', name, f'echo {name}')
+
+    for name, dependency in (('both', 'left'),
+                             ('both', 'right'),
+                             ('last', 'both'),
+                             ('chain', 'left')):
+        git_project_runner.run('.*',
+                               '',
+                               'config',
+                               '--add',
+                               f'run.{name}.depends',
+                               dependency)
+
+    git_project_runner.run(r'\[right\] right\n(.*\n)*\[both\] both',
+                           '.*',
+                           'run',
+                           'both')
+    assert requested == [0]
+
+    git_project_runner.run(r'\[both\] both\n(.*\n)*\[last\] last',
+                           '.*',
+                           'run',
+                           'last')
+    assert requested == [0, 0]
+
+    # A chain of runs gains nothing from running in parallel.
+    git_project_runner.run(r'\[left\] left\n(.*\n)*\[chain\] chain',
+                           '.*',
+                           'run',
+                           'chain')
+    assert requested == [0, 0, 1]
+
+def test_run_depends_cycle(git_project_runner,
+                           git,
+                           capsys):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'first',
+                           'echo first')
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'second',
+                           'echo second')
+
+    git_project_runner.run('.*',
+                           '',
+                           'config',
+                           '--add',
+                           'run.first.depends',
+                           'second')
+
+    git_project_runner.run('.*',
+                           '',
+                           'config',
+                           '--add',
+                           'run.second.depends',
+                           'first')
+
+    git_project_runner.expect_fail = True
+
+    git_project_runner.run('Dependency cycle',
+                           '',
+                           'run',
+                           'first')
+
+def test_run_incremental(git_project_runner,
+                         git,
+                         capsys):
+    workdir = git.get_working_copy_root()
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'test',
+                           'echo {options}')
+
+    git_project_runner.run('^echo one$',
+                           '.*',
+                           'run',
+                           '--incremental',
+                           'test',
+                           'one')
+
+    git_project_runner.run('^test is up to date$',
+                           '.*',
+                           'run',
+                           '--incremental',
+                           'test',
+                           'one')
+
+    # A different command is not up to date.
+    git_project_runner.run('^echo two$',
+                           '.*',
+                           'run',
+                           '--incremental',
+                           'test',
+                           'two')
+
+    # Nor is a changed workarea.
+    with open(os.path.join(workdir, 'newfile'), 'w') as newfile:
+        newfile.write('new\n')
+
+    git_project_runner.run('^echo two$',
+                           '.*',
+                           'run',
+                           '--incremental',
+                           'test',
+                           'two')
+
+    git_project_runner.run('^test is up to date$',
+                           '.*',
+                           'run',
+                           '--incremental',
+                           'test',
+                           'two')
+
+    # Fingerprints are not kept in the config.
+    with open(Path(git.get_git_common_dir()) / 'config') as configfile:
+        assert 'fingerprint' not in configfile.read()
+
+def test_run_cache(git_project_runner,
+                   git,
+                   capsys):
+    workdir = git.get_working_copy_root()
+    outdir = f'{workdir}-out'
+
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'gen',
+                           f'mkdir -p {outdir} && echo {{options}} > {outdir}/file')
+
+    git_project_runner.run('.*',
+                           '',
+                           'artifact',
+                           'add',
+                           'run.gen',
+                           outdir)
+
+    git_project_runner.run('^mkdir',
+                           '.*',
+                           'run',
+                           '--cache',
+                           'gen',
+                           'one')
+
+    os.remove(f'{outdir}/file')
+
+    git_project_runner.run('^gen restored from cache$',
+                           '.*',
+                           'run',
+                           '--cache',
+                           'gen',
+                           'one')
+
+    with open(f'{outdir}/file') as outfile:
+        assert outfile.read() == 'one\n'
+
+    # Different options make a different cache entry.
+    git_project_runner.run('^mkdir',
+                           '.*',
+                           'run',
+                           '--cache',
+                           'gen',
+                           'two')
+
+def test_run_all_worktrees(git_project_runner, git):
+    workdir = git.get_working_copy_root()
+    git_project_runner.chdir(workdir)
+
+    for name in ('one', 'two'):
+        git_project_runner.run('.*', '', 'worktree', 'add', f'../{name}', 'master')
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'where',
+                           'echo {worktree} {branch} {path}')
+
+    parent = Path(workdir).parent.resolve()
+    git_project_runner.run(re.escape(f'[one] one one {parent}/one') + '(.|\n)*' +
+                           r'Worktree\s+Status\s+Time(.|\n)*one\s+0(.|\n)*two\s+0',
+                           '',
+                           'run',
+                           '--all-worktrees',
+                           '-j',
+                           '2',
+                           'where')
+
+def test_run_stats(git_project_runner, git):
+    workdir = git.get_working_copy_root()
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*', '', 'add', 'run', 'ok', 'true')
+    git_project_runner.run('.*', '', 'add', 'run', 'bad', 'false')
+
+    git_project_runner.run(r'No history for run ok', '', 'run', '--stats', 'ok')
+
+    git_project_runner.run('.*', '', 'run', 'ok')
+    git_project_runner.run('.*', '', 'run', 'ok')
+    git_project_runner.run('.*', '', 'run', 'bad')
+
+    git_project_runner.run(r'run ok: 2 runs, 0 failed\n\s+wall\s+p50(.|\n)*memory.*floor',
+                           '',
+                           'run',
+                           '--stats',
+                           'ok')
+
+    git_project_runner.run(r'run bad: 1 runs, 1 failed(.|\n)*status 1',
+                           '',
+                           'run',
+                           '--stats',
+                           'bad')
+
+def test_run_parse_metric():
+    assert parse_metric(b'git-project-metric: size=1024\n') == ('size', 1024.0)
+    assert parse_metric(b'git-project-metric: tests.rate = 2.5e3\r\n') == ('tests.rate', 2500.0)
+    assert parse_metric(b'size=1024\n') is None
+    assert parse_metric(b'git-project-metric: size=big\n') is None
+
+def test_run_parse_counter():
+    assert parse_counter(b'1234.5,msec,task-clock,1234500,100.00,0.998,CPUs utilized\n') == ('task-clock', 1234.5)
+    assert parse_counter(b'<not counted>,,cycles,0,100.00,,\n') is None
+    assert parse_counter(b'\tMaximum resident set size (kbytes): 2048\n') == ('maximum_resident_set_size_kbytes', 2048.0)
+    assert parse_counter(b'\tElapsed (wall clock) time (h:mm:ss or m:ss): 1:02.50\n')[1] == 62.5
+    assert parse_counter(b'\tCommand being timed: "make"\n') is None
+    assert parse_counter(b'1,2,3\n') is None
+
+def test_run_profile(git_project_runner, git, tmp_path):
+    workdir = git.get_working_copy_root()
+    git_project_runner.chdir(workdir)
+
+    profiler = tmp_path / 'profiler'
+    profiler.write_text('#!/bin/sh\n'
+                        '"$@"\n'
+                        'status=$?\n'
+                        'printf "\\tVoluntary context switches: 7\\n" >&2\n'
+                        'exit $status\n')
+    profiler.chmod(0o755)
+
+    git_project_runner.run('.*', '', 'add', 'run', 'measured', 'echo "quoted"')
+
+    git_project_runner.expect_fail = True
+    git_project_runner.run('No profiler configured for measured', '',
+                           'run', '--profile', 'measured')
+    git_project_runner.expect_fail = False
+
+    git_project_runner.run('.*', '', 'config', 'profiler', f'{profiler} {{cmd}}')
+
+    git_project_runner.run(rf"^{profiler} sh -c .*\n.*quoted\n.*Voluntary",
+                           '',
+                           'run',
+                           '--profile',
+                           '--tail',
+                           '5',
+                           'measured')
+
+    git_project_runner.run(r'counters(.|\n)*voluntary_context_switches\s+7$',
+                           '',
+                           'run',
+                           '--stats',
+                           'measured')
+
+def test_run_perf_log(git_project_runner, git, monkeypatch):
+    # Notes are commits, which need an identity.
+    for variable in ('AUTHOR', 'COMMITTER'):
+        monkeypatch.setenv(f'GIT_{variable}_NAME', 'Tester')
+        monkeypatch.setenv(f'GIT_{variable}_EMAIL', 'tester@example.com')
+
+    workdir = git.get_working_copy_root()
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'measure',
+                           'echo git-project-metric: size=42')
+    git_project_runner.run('.*', '', 'config', 'run.measure.track', 'true')
+
+    git_project_runner.run(r'run.measure\n.*\n\s+no measurements',
+                           '',
+                           'run',
+                           '--perf-log',
+                           'measure')
+
+    git_project_runner.run('.*', '', 'run', 'measure')
+    git_project_runner.run('.*', '', 'run', 'measure')
+
+    notes = subprocess.run(['git', 'notes', '--ref', 'refs/notes/project/perf',
+                            'show', 'HEAD'],
+                           cwd=workdir,
+                           stdout=subprocess.PIPE,
+                           check=True).stdout
+    samples = json.loads(notes)['run.measure']
+    assert len(samples) == 2
+    assert samples[0]['metrics'] == {'size': 42.0}
+
+    head = str(git.get_committish_commit('HEAD').id)[:7]
+    git_project_runner.run(rf'^{head}\S*\s+\S+.*size=42$',
+                           '',
+                           'run',
+                           '--perf-log',
+                           'measure')
+
+def test_run_perf_log_bad_range(git_project_runner, git):
+    workdir = git.get_working_copy_root()
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*', '', 'add', 'run', 'measure', 'echo measured')
+
+    git_project_runner.expect_fail = True
+    git_project_runner.run(r'git log .* failed: .*nosuchrev',
+                           '',
+                           'run',
+                           '--perf-log',
+                           'measure',
+                           'nosuchrev..HEAD')
+    git_project_runner.expect_fail = False
+
+def test_run_perf_log_dependency(git_project_runner, git, monkeypatch):
+    for variable in ('AUTHOR', 'COMMITTER'):
+        monkeypatch.setenv(f'GIT_{variable}_NAME', 'Tester')
+        monkeypatch.setenv(f'GIT_{variable}_EMAIL', 'tester@example.com')
+
+    workdir = git.get_working_copy_root()
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*', '', 'run', '--make-alias', 'build')
+    git_project_runner.run('.*', '', 'add', 'run', 'configure', 'echo configured')
+    git_project_runner.run('.*', '', 'config', 'run.configure.track', 'true')
+    git_project_runner.run('.*', '', 'add', 'build', 'release', 'echo built')
+    git_project_runner.run('.*', '', 'config', '--add', 'build.release.depends', 'run.configure')
+
+    # A tracked run is noted under its own alias however it came to run.
+    git_project_runner.run('.*', '.*', 'build', 'release')
+    git_project_runner.run('.*', '.*', 'build', '--matrix', 'release', '--', 'a,b')
+
+    notes = subprocess.run(['git', 'notes', '--ref', 'refs/notes/project/perf',
+                            'show', 'HEAD'],
+                           cwd=workdir,
+                           stdout=subprocess.PIPE,
+                           check=True).stdout
+    assert sorted(json.loads(notes)) == ['run.configure',
+                                         'run.configure:a',
+                                         'run.configure:b']
+
+    head = str(git.get_committish_commit('HEAD').id)[:7]
+    git_project_runner.run(rf'^run.configure\n.*\n{head}\S*\s+\S+',
+                           '',
+                           'run',
+                           '--perf-log',
+                           'configure')
+
+def test_run_log_tail(git_project_runner, git, tmp_path):
+    workdir = git.get_working_copy_root()
+    git_project_runner.chdir(workdir)
+
+    git_project_runner.run('.*',
+                           '',
+                           'add',
+                           'run',
+                           'noisy',
+                           'for i in 1 2 3 4 5; do echo line$i; done; exit 3')
+
+    logfile = tmp_path / 'noisy.log'
+    git_project_runner.run(r'line1\nline2\nline3\nline4\nline5',
+                           r'Last 2 lines of noisy:\n  line4\n  line5',
+                           'run',
+                           '--log',
+                           str(logfile),
+                           '--tail',
+                           '2',
+                           'noisy')
+
+    assert 'line1\nline2\nline3\nline4\nline5\n' in logfile.read_text()
+
+    git_project_runner.expect_fail = True
+    git_project_runner.run('',
+                           'invalid line count: -1',
+                           'run',
+                           '--tail',
+                           '-1',
+                           'noisy')
+    git_project_runner.expect_fail = False
+
+def test_run_log_rotate(tmp_path):
+    logfile = tmp_path / 'run.log'
+    log = RotatingLog(logfile, 10, backups=2)
+    for i in range(4):
+        log.write(f'line {i}\n'.encode())
+    log.close()
+
+    assert logfile.read_text() == 'line 3\n'
+    assert (tmp_path / 'run.log.1').read_text() == 'line 2\n'
+    assert (tmp_path / 'run.log.2').read_text() == 'line 1\n'
+    assert not (tmp_path / 'run.log.3').exists()
+
+def test_run_watch_changes(tmp_path):
+    subprocess.run(['git', 'init', '-q', str(tmp_path)], check=True)
+    (tmp_path / '.gitignore').write_text('build/\n*.o\n')
+    (tmp_path / 'build').mkdir()
+    (tmp_path / 'src').mkdir()
+
+    for Watcher in (get_watcher, _PollingWatcher):
+        watcher = Watcher(tmp_path)
+        try:
+            (tmp_path / 'build' / 'out').write_text('ignored')
+            (tmp_path / 'src' / 'main.o').write_text('ignored')
+            assert watcher.wait(1.5) == set()
+
+            (tmp_path / 'src' / 'main.c').write_text(str(Watcher))
+            assert watcher.wait(5) == {os.path.join('src', 'main.c')}
+        finally:
+            watcher.close()
+
+def test_run_cancellation():
+    cancellation = Cancellation()
+    job = Job('sleep', 'sleep 30', prefix_output=False, cancellation=cancellation)
+    threading.Timer(0.5, cancellation.cancel).start()
+
+    start = time.monotonic()
+    assert job.run() != 0
+    assert time.monotonic() - start < 10
+
+    job = Job('late', 'true', prefix_output=False, cancellation=cancellation)
+    assert job.run() != 0
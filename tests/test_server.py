@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+#
+# SPDX-FileCopyrightText: 2020-present David A. Greene <dag@obbligato.org>
+
+# SPDX-License-Identifier: AGPL-3.0-or-later
+
+# Copyright 2024 David A. Greene
+
+# This file is part of git-project
+
+# git-project is free software: you can redistribute it and/or modify it under
+# the terms of the GNU Affero General Public License as published by the Free
+# Software Foundation, either version 3 of the License, or (at your option) any
+# later version.
+
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+
+# You should have received a copy of the GNU Affero General Public License along
+# with git-project. If not, see <https://www.gnu.org/licenses/>.
+
+from git_project_core_plugins.client import connect, find_git_common_dir
+from git_project_core_plugins.client import get_project_name, get_socket_path
+from git_project_core_plugins.client import iter_replies, send_request
+
+import os
+from pathlib import Path
+import signal
+import subprocess
+import sys
+import time
+
+CLIENT = 'import sys; sys.argv[0] = "git-project"; from git_project_core_plugins.client import main; main()'
+SERVER = 'from git_project_core_plugins.server import main; main()'
+
+def test_server_find_git_common_dir(tmp_path):
+    subprocess.run(['git', 'init', '-q', str(tmp_path / 'repo')], check=True)
+    (tmp_path / 'repo' / 'sub').mkdir()
+    assert find_git_common_dir(tmp_path / 'repo' / 'sub') == (tmp_path / 'repo' / '.git').resolve()
+
+    # A worktree's .git file points at its own git directory, which names the
+    # common directory.
+    gitdir = tmp_path / 'repo' / '.git' / 'worktrees' / 'wt'
+    gitdir.mkdir(parents=True)
+    (gitdir / 'commondir').write_text('../..\n')
+    (tmp_path / 'wt').mkdir()
+    (tmp_path / 'wt' / '.git').write_text(f'gitdir: {gitdir}\n')
+    assert find_git_common_dir(tmp_path / 'wt') == (tmp_path / 'repo' / '.git').resolve()
+
+def test_server_socket_path(tmp_path):
+    assert get_project_name('/usr/bin/git-fizzbin') == 'fizzbin'
+    assert get_socket_path(tmp_path, 'fizzbin') == tmp_path / 'git-project' / 'fizzbin.sock'
+
+    long_path = get_socket_path(tmp_path / ('x' * 120), 'fizzbin')
+    assert len(str(long_path)) < 100
+    assert long_path == get_socket_path(tmp_path / ('x' * 120), 'fizzbin')
+
+def test_server_run(tmp_path):
+    repo = tmp_path / 'repo'
+    subprocess.run(['git', 'init', '-q', '-b', 'master', str(repo)], check=True)
+    subprocess.run(['git', '-C', str(repo), '-c', 'user.name=test', '-c', 'user.email=test@example.com',
+                    'commit', '-q', '--allow-empty', '-m', 'Initial'], check=True)
+
+    socket_path = get_socket_path(repo / '.git', 'project')
+    server = subprocess.Popen([sys.executable, '-c', SERVER, 'project', str(socket_path), '30'])
+    try:
+        for _ in range(200):
+            if connect(socket_path):
+                break
+            time.sleep(0.05)
+
+        subprocess.run([sys.executable, '-c', CLIENT, 'config', 'mykey', 'myvalue'],
+                       cwd=repo, check=True)
+        result = subprocess.run([sys.executable, '-c', CLIENT, 'config', 'mykey'],
+                                cwd=repo, stdout=subprocess.PIPE, check=True)
+        assert result.stdout == b'myvalue\n'
+
+        # Changes made behind the server's back are seen.
+        subprocess.run(['git', '-C', str(repo), 'config', 'project.mykey', 'other'], check=True)
+        result = subprocess.run([sys.executable, '-c', CLIENT, 'config', 'mykey'],
+                                cwd=repo, stdout=subprocess.PIPE, check=True)
+        assert result.stdout == b'other\n'
+
+        result = subprocess.run([sys.executable, '-c', CLIENT, 'nosuchcommand'],
+                                cwd=repo, stderr=subprocess.PIPE)
+        assert result.returncode == 2
+        assert b'invalid choice' in result.stderr
+
+        sock = connect(socket_path)
+        send_request(sock, {'control': 'status'})
+        status = next(iter_replies(sock))
+        sock.close()
+        assert status['pid'] == server.pid
+        assert status['requests'] == 4
+    finally:
+        sock = connect(socket_path)
+        if sock:
+            send_request(sock, {'control': 'stop'})
+            list(iter_replies(sock))
+        server.wait(10)
+
+    assert not socket_path.exists()
+
+def test_server_terminate_client(tmp_path):
+    repo = tmp_path / 'repo'
+    subprocess.run(['git', 'init', '-q', '-b', 'master', str(repo)], check=True)
+    subprocess.run(['git', '-C', str(repo), '-c', 'user.name=test', '-c', 'user.email=test@example.com',
+                    'commit', '-q', '--allow-empty', '-m', 'Initial'], check=True)
+    subprocess.run(['git', '-C', str(repo), 'config', 'project.run', 'wait'], check=True)
+    subprocess.run(['git', '-C', str(repo), 'config', 'project.run.wait.command', 'sleep 60'], check=True)
+
+    socket_path = get_socket_path(repo / '.git', 'project')
+    server = subprocess.Popen([sys.executable, '-c', SERVER, 'project', str(socket_path), '30'])
+    try:
+        for _ in range(200):
+            if connect(socket_path):
+                break
+            time.sleep(0.05)
+
+        waiting = subprocess.Popen([sys.executable, '-c', CLIENT, 'run', 'wait'], cwd=repo)
+        for _ in range(200):
+            sock = connect(socket_path)
+            send_request(sock, {'control': 'status'})
+            status = next(iter_replies(sock))
+            sock.close()
+            if status['running']:
+                break
+            time.sleep(0.05)
+
+        # Other commands run while one is in progress.
+        result = subprocess.run([sys.executable, '-c', CLIENT, 'config', 'run'],
+                                cwd=repo, stdout=subprocess.PIPE, check=True, timeout=30)
+        assert result.stdout == b'wait\n'
+
+        # Terminating a client terminates its command and leaves the server
+        # running.
+        waiting.send_signal(signal.SIGTERM)
+        assert waiting.wait(30) == 128 + signal.SIGTERM
+
+        sock = connect(socket_path)
+        send_request(sock, {'control': 'status'})
+        status = next(iter_replies(sock))
+        sock.close()
+        assert status['pid'] == server.pid
+        assert server.poll() is None
+    finally:
+        sock = connect(socket_path)
+        if sock:
+            send_request(sock, {'control': 'stop'})
+            list(iter_replies(sock))
+        server.wait(10)
+
+    assert not socket_path.exists()
+
+def test_server_terminate(tmp_path):
+    repo = tmp_path / 'repo'
+    subprocess.run(['git', 'init', '-q', '-b', 'master', str(repo)], check=True)
+
+    socket_path = get_socket_path(repo / '.git', 'project')
+    server = subprocess.Popen([sys.executable, '-c', SERVER, 'project', str(socket_path), '30'])
+    for _ in range(200):
+        if connect(socket_path):
+            break
+        time.sleep(0.05)
+
+    server.terminate()
+    server.wait(10)
+    assert not socket_path.exists()
@@ -22,11 +22,18 @@
 
 import git_project
 from git_project_core_plugins import Worktree, WorktreePlugin
+from git_project_core_plugins.du import DiskUsage
+from git_project_core_plugins.pool import WorktreePool
+from git_project_core_plugins.trash import Trash
+from git_project_core_plugins.worktree import find_worktree_path
+from git_project_core_plugins.worktree import get_worktree_path_index
 import common
 
 import io
 import os
 from pathlib import Path
+import re
+import subprocess
 
 def test_worktree_add_arguments(reset_directory,
                                 git,
@@ -479,3 +486,399 @@ def test_worktree_add_subdir(git,
     os.chdir(workarea.parent / 'user' / 'test')
     git = git_project.Git()  # Reinitialize in new workarea.
     assert git.get_current_branch() == 'user/test'
+
+def test_worktree_cache(git,
+                        git_project_runner):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    cachedir = (Path(git.get_git_common_dir()) / 'git-project' / 'project' /
+                'cache')
+
+    # Runs that do not use the cache do not create it.
+    git_project_runner.run('.*', '', 'add', 'run', 'plain', 'true')
+    git_project_runner.run('.*', '', 'run', 'plain')
+    assert not cachedir.exists()
+
+    git_project_runner.run('.*', '', 'add', 'run', 'cached', 'echo {cachedir}')
+    git_project_runner.run(f'^{re.escape(str(cachedir))}$',
+                           '',
+                           'run',
+                           '--tail',
+                           '5',
+                           'cached')
+
+    (cachedir / 'ab').mkdir()
+    for index, name in enumerate(['old', 'new']):
+        path = cachedir / 'ab' / name
+        path.write_bytes(b'x' * 1024)
+        os.utime(path, (1000 + index, 1000 + index))
+
+    git_project_runner.run(r'2\.0K of 10\.0G in 2 files',
+                           '',
+                           'worktree',
+                           'cache')
+
+    git_project_runner.run('.*', '', 'config', 'cachesize', '1K')
+
+    git_project_runner.run(r'Removed 1\.0K\n.*1\.0K of 1\.0K in 1 files',
+                           '',
+                           'worktree',
+                           'cache',
+                           '--trim')
+
+    assert not (cachedir / 'ab' / 'old').exists()
+    assert (cachedir / 'ab' / 'new').exists()
+
+    # Removing a worktree keeps the shared cache.
+    git_project_runner.run('.*', '', 'worktree', 'add', '../cachetest', 'master')
+    git_project_runner.run('.*', '', 'worktree', 'rm', '-f', 'cachetest')
+
+    assert (cachedir / 'ab' / 'new').exists()
+
+    (cachedir / 'ab' / 'newer').write_bytes(b'x' * 1024)
+
+    git_project_runner.run(r'^Removed 1\.0K from the cache$',
+                           '',
+                           'worktree',
+                           'gc')
+
+    assert not (cachedir / 'ab' / 'new').exists()
+    assert (cachedir / 'ab' / 'newer').exists()
+
+def test_worktree_pool(git,
+                       git_project_runner):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run(r'Checking out .*pool-\w+\n1 of 1 worktrees ready',
+                           '',
+                           'worktree',
+                           'pool',
+                           '--size',
+                           '1')
+
+    pooled = (Path(git.get_git_common_dir()) / 'git-project' / 'project' /
+              'pool')
+    entry, = [path for path in pooled.glob('pool-*') if path.is_dir()]
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../pooled', 'master')
+
+    path = workarea.parent / 'pooled'
+    assert not entry.exists()
+    assert (path / 'MergedRemote.txt').exists()
+    assert subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
+                          cwd=path,
+                          stdout=subprocess.PIPE,
+                          check=True).stdout.decode().strip() == 'pooled'
+
+    # Wait for the background refill, then empty the pool.
+    git_project_runner.run(r'0 of 0 worktrees ready',
+                           '',
+                           'worktree',
+                           'pool',
+                           '--size',
+                           '0')
+
+    git_project_runner.run('.*', '', 'worktree', 'rm', '-f', 'pooled')
+    assert not path.exists()
+
+def test_worktree_pool_failed_checkout(git,
+                                      git_project_runner):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('.*', '', 'worktree', 'pool', '--size', '1')
+
+    pool = WorktreePool(Path(git.get_git_common_dir()) / 'git-project' /
+                        'project' / 'pool',
+                        git.get_git_common_dir())
+    entry, = pool.list()
+
+    # A claim that cannot check out the committish leaves nothing behind.
+    path = workarea.parent / 'unclaimed'
+    assert not pool.claim('unclaimed', path, 'nosuchbranch')
+    assert not path.exists()
+    assert not entry.exists()
+    assert not (Path(git.get_git_common_dir()) / 'worktrees' / 'unclaimed').exists()
+    assert str(path) not in subprocess.run(['git', 'worktree', 'list'],
+                                           cwd=workarea,
+                                           stdout=subprocess.PIPE,
+                                           check=True).stdout.decode()
+
+def test_worktree_seed_builddir(git,
+                                git_project_runner,
+                                tmp_path):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('.*',
+                           '',
+                           'config',
+                           'builddir',
+                           f'{tmp_path}/build/{{worktree}}')
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../first', 'master')
+
+    (tmp_path / 'build' / 'first' / 'obj').mkdir(parents=True)
+    (tmp_path / 'build' / 'first' / 'obj' / 'main.o').write_bytes(b'object')
+    os.utime(tmp_path / 'build' / 'first' / 'obj' / 'main.o', (1000, 1000))
+
+    git_project_runner.run(r'Seeded build directory from first',
+                           '',
+                           'worktree',
+                           'add',
+                           '--seed-builddir',
+                           '../second',
+                           'master')
+
+    seeded = tmp_path / 'build' / 'second' / 'obj' / 'main.o'
+    assert seeded.read_bytes() == b'object'
+    assert seeded.stat().st_mtime == 1000
+
+def test_worktree_trash(tmp_path):
+    trash = Trash(tmp_path / 'trash')
+
+    build = tmp_path / 'build'
+    for index in range(4):
+        (build / str(index) / 'sub').mkdir(parents=True)
+        (build / str(index) / 'sub' / 'file').write_bytes(b'x')
+    (build / 'top').write_bytes(b'x')
+
+    moved = trash.move(build, 'test-builddir')
+    assert not build.exists()
+    assert moved.parent == tmp_path / 'trash'
+    assert trash.move(build, 'test-builddir') is None
+
+    assert trash.empty() == []
+    assert list((tmp_path / 'trash').iterdir()) == []
+
+def test_worktree_rm_trash(git,
+                           git_project_runner):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../gone', 'master')
+    assert (workarea.parent / 'gone').exists()
+
+    git_project_runner.run('.*', '', 'worktree', 'rm', '-f', 'gone')
+    assert not (workarea.parent / 'gone').exists()
+
+    git_project_runner.run('Trash is empty', '', 'worktree', 'gc')
+
+    trash = (Path(git.get_git_common_dir()) / 'git-project' / 'project' /
+             'trash')
+    assert list(trash.iterdir()) == []
+
+def test_worktree_rm_trash_failure(git,
+                                   git_project_runner,
+                                   tmp_path,
+                                   monkeypatch):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../kept', 'master')
+    (tmp_path / 'build' / 'kept').mkdir(parents=True)
+
+    git_project_runner.run('.*',
+                           '',
+                           'worktree',
+                           'config',
+                           'kept',
+                           'builddir',
+                           str(tmp_path / 'build' / 'kept'))
+
+    move = Trash.move
+    def failing_move(self, path, name):
+        if name.endswith('-builddir'):
+            raise PermissionError('Permission denied')
+        return move(self, path, name)
+    monkeypatch.setattr(Trash, 'move', failing_move)
+
+    # Nothing is removed if anything cannot be.
+    git_project_runner.expect_fail = True
+    git_project_runner.run('Could not remove .*build/kept', '', 'worktree', 'rm', '-f', 'kept')
+    git_project_runner.expect_fail = False
+
+    assert (workarea.parent / 'kept' / 'MergedRemote.txt').exists()
+    assert (tmp_path / 'build' / 'kept').exists()
+
+    monkeypatch.setattr(Trash, 'move', move)
+    git_project_runner.run('.*', '', 'worktree', 'rm', '-f', 'kept')
+    assert not (workarea.parent / 'kept').exists()
+    assert not (tmp_path / 'build' / 'kept').exists()
+
+def test_worktree_find_path():
+    paths = sorted(['/a/b/', '/a/b/a/', '/a/b-c/', '/a/b/c/d/', '/x/'])
+
+    assert find_worktree_path(paths, '/a/b/c') == '/a/b'
+    assert find_worktree_path(paths, '/a/b/c/d/e') == '/a/b/c/d'
+    assert find_worktree_path(paths, '/a/b-c/z') == '/a/b-c'
+    assert find_worktree_path(paths, '/a/b/a') == '/a/b/a'
+    assert find_worktree_path(paths, '/a/bz') is None
+    assert find_worktree_path(paths, '/y') is None
+    assert find_worktree_path([], '/a') is None
+
+def test_worktree_path_index(git,
+                             git_project_runner,
+                             project):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../indexed', 'master')
+
+    # A new Git object sees the config the command wrote.
+    git = git_project.Git()
+    path = str((workarea.parent / 'indexed').resolve())
+    assert os.path.join(path, '') in get_worktree_path_index(git, project)
+
+def test_worktree_path_index_nested(git,
+                                    git_project_runner,
+                                    project,
+                                    tmp_path,
+                                    monkeypatch):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../nested', 'master')
+    git_project_runner.run('.*', '', 'add', 'run', 'where', 'echo {worktree}')
+
+    # Work in a subdirectory of the worktree, reached through a symlink.
+    (workarea.parent / 'nested' / 'sub').mkdir()
+    link = tmp_path / 'link'
+    link.symlink_to(workarea.parent / 'nested')
+
+    git_project_runner.chdir(link / 'sub')
+    monkeypatch.chdir(link / 'sub')
+
+    git = git_project.Git()
+    path = str((workarea.parent / 'nested').resolve())
+    assert find_worktree_path(get_worktree_path_index(git, project),
+                              Path.cwd().resolve()) == path
+
+    git_project_runner.run('^echo nested$', '', 'run', 'where')
+
+def test_worktree_status(git,
+                         git_project_runner,
+                         tmp_path):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('No registered worktrees', '', 'worktree', 'status')
+
+    git_project_runner.run('.*',
+                           '',
+                           'config',
+                           'builddir',
+                           f'{tmp_path}/build/{{worktree}}')
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../tidy', 'master')
+    git_project_runner.run('.*', '', 'worktree', 'add', '../messy', 'master')
+
+    (workarea.parent / 'messy' / 'MergedRemote.txt').write_text('changed\n')
+    (tmp_path / 'build' / 'tidy').mkdir(parents=True)
+    (tmp_path / 'build' / 'tidy' / 'out').write_bytes(b'x' * 2048)
+
+    git_project_runner.run('.*', '', 'add', 'run', 'ok', 'true')
+    git_project_runner.run('.*', '', 'run', '--all-worktrees', 'ok')
+
+    git_project_runner.run(r'^tidy\s+tidy\s+clean\s+-\s+-\s+2\.0K\s+run ok ok, \d+s ago$',
+                           '',
+                           'worktree',
+                           'status')
+    git_project_runner.run(r'^messy\s+messy\s+dirty\s+-\s+-\s+-\s+run ok ok',
+                           '',
+                           'worktree',
+                           'status')
+
+def test_worktree_du(git,
+                     git_project_runner,
+                     tmp_path):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('.*',
+                           '',
+                           'config',
+                           'builddir',
+                           f'{tmp_path}/build/{{worktree}}')
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../small', 'master')
+    git_project_runner.run('.*', '', 'worktree', 'add', '../large', 'master')
+
+    (tmp_path / 'build' / 'small').mkdir(parents=True)
+    (tmp_path / 'build' / 'large' / 'sub').mkdir(parents=True)
+    (tmp_path / 'build' / 'large' / 'sub' / 'out').write_bytes(b'x' * (1 << 20))
+
+    git_project_runner.run(r'^worktree\s+checkout\s+builddir\s+prefix\s+installdir\s+artifacts\s+total$\n'
+                           r'^large\s+\S+\s+1\.0M\s+-\s+-\s+-\s+\S+$\n'
+                           r'^small\s+\S+\s+0B\s+-\s+-\s+-\s+\S+$\n'
+                           r'^Total ',
+                           '',
+                           'worktree',
+                           'du')
+
+    # Cached results are used for unchanged directories, and a new file
+    # changes its directory.
+    (tmp_path / 'build' / 'small' / 'out').write_bytes(b'x' * (2 << 20))
+
+    git_project_runner.run(r'^small\s+\S+\s+2\.0M\s+-\s+-\s+-\s+\S+$\n'
+                           r'^large\s+\S+\s+1\.0M\s+-\s+-\s+-\s+\S+$',
+                           '',
+                           'worktree',
+                           'du')
+
+    git_project_runner.run(r'^small\s+\S+\s+2\.0M\s+-\s+-\s+-\s+\S+$\n'
+                           r'^large\s+\S+\s+1\.0M\s+-\s+-\s+-\s+\S+$',
+                           '',
+                           'worktree',
+                           'du',
+                           '--refresh')
+
+def test_worktree_du_nested(git,
+                            git_project_runner):
+    workarea = git.get_working_copy_root()
+
+    git_project_runner.chdir(workarea)
+
+    git_project_runner.run('.*', '', 'config', 'builddir', '{path}/build')
+
+    git_project_runner.run('.*', '', 'worktree', 'add', '../inside', 'master')
+
+    build = workarea.parent / 'inside' / 'build'
+    (build / 'sub').mkdir(parents=True)
+    (build / 'sub' / 'out').write_bytes(b'x' * (1 << 20))
+
+    # The build directory is not counted again as part of the checkout.
+    git_project_runner.run(r'^inside\s+[\d.]+[BK]\s+1\.0M\s+-\s+-\s+-\s+1\.0M$\n'
+                           r'^Total 1\.0M$',
+                           '',
+                           'worktree',
+                           'du')
+
+def test_worktree_du_measure(tmp_path):
+    (tmp_path / 'tree' / 'nested').mkdir(parents=True)
+    (tmp_path / 'tree' / 'file').write_bytes(b'x' * 8192)
+    (tmp_path / 'tree' / 'nested' / 'file').write_bytes(b'x' * 8192)
+
+    disk_usage = DiskUsage(tmp_path / 'du.json')
+    tree = str(tmp_path / 'tree')
+    nested = str(tmp_path / 'tree' / 'nested')
+    file = str(tmp_path / 'tree' / 'file')
+    alone = disk_usage.measure([tree])[tree]
+
+    sizes = disk_usage.measure([tree, nested, file, str(tmp_path / 'missing')])
+    assert sizes[nested] > 0
+    assert sizes[file] > 0
+    assert sizes[str(tmp_path / 'missing')] == 0
+    assert sizes[tree] + sizes[nested] + sizes[file] == alone